@@ -23,6 +23,14 @@ class Settings(BaseSettings):
     # 微信小程序配置
     WECHAT_APP_ID: Optional[str] = None
     WECHAT_APP_SECRET: Optional[str] = None
+    WECHAT_API_URL: str = "https://api.weixin.qq.com"  # 压测/联调时可指向本地桩服务（scripts/wechat_stub.py）
+    WECHAT_TIMEOUT: float = 3.0  # 单次请求超时（秒）
+    WECHAT_DEADLINE: float = 5.0  # 一次登录换取openid的总时限（秒），含排队和重试
+    WECHAT_RETRIES: int = 2  # 网络错误、5xx、微信系统繁忙时的重试次数
+    WECHAT_MAX_CONNECTIONS: int = 20  # 连接池大小（保持长连接，免去每次TLS握手）
+    WECHAT_MAX_CONCURRENCY: int = 50  # 同时进行的请求数，超出的排队
+    WECHAT_BREAKER_THRESHOLD: int = 5  # 连续失败这么多次后熔断
+    WECHAT_BREAKER_COOLDOWN: float = 30.0  # 熔断后多久放行一次试探请求（秒）
     
     # DeepSeek API配置
     DEEPSEEK_API_KEY: Optional[str] = None
@@ -31,6 +39,35 @@ class Settings(BaseSettings):
     # 腾讯地图配置
     TENCENT_MAP_KEY: Optional[str] = None
     
+    # 可预约时段缓存
+    AVAILABILITY_CACHE_SIZE: int = 2048  # 最多缓存的 (门店, 日期, 时长) 条目数
+    AVAILABILITY_CACHE_TTL: int = 60  # 缓存有效期（秒），多进程部署时兜底
+    LIVE_QUEUE_SIZE: int = 32  # 实时推送每个连接最多积压的消息数
+    
+    # 卡类型目录缓存
+    CARD_CATALOG_TTL: int = 300  # 快照有效期（秒），多进程部署时兜底
+    
+    # 已认证用户缓存
+    USER_CACHE_SIZE: int = 10000  # 最多缓存的用户数
+    USER_CACHE_TTL: int = 60  # 缓存有效期（秒），多进程部署时兜底
+    
+    # 登录凭证吊销
+    TOKEN_REVOCATION_REFRESH: int = 30  # 从数据库增量同步吊销记录的间隔（秒），多进程部署时其他进程的吊销最多延迟这么久
+    
+    # 幂等键（核销/扣卡重试去重）
+    IDEMPOTENCY_TTL: int = 60 * 60 * 24  # 响应保存时间（秒）
+    IDEMPOTENCY_CACHE_SIZE: int = 10000  # 进程内最多缓存的响应数
+    
+    # 卡过期扫描
+    CARD_EXPIRY_SWEEP_INTERVAL: int = 600  # 扫描间隔（秒）
+    CARD_EXPIRY_SWEEP_CHUNK: int = 2000  # 每个写事务最多标记的卡数
+    
+    # 卡流水对账
+    CARD_LEDGER_APPEND_ONLY: bool = True  # 消费记录和余额快照只能追加
+    LEDGER_RECONCILE_INTERVAL: int = 3600  # 两轮对账之间的间隔（秒）
+    LEDGER_RECONCILE_CHUNK: int = 500  # 每批对账的卡数
+    LEDGER_SNAPSHOT_EVERY: int = 20  # 快照之后累计多少条流水时写入新快照
+    
     # 员工注册密码
     STAFF_PASSWORD: str = "pytnb"
     
@@ -1,8 +1,11 @@
 """
 数据库连接配置
 """
+from typing import Callable
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
 
 from app.config import settings
 
@@ -13,6 +16,27 @@ engine = create_async_engine(
     echo=settings.DEBUG,
 )
 
+def configure_sqlite(async_engine) -> None:
+    """
+    让 SQLite 驱动的事务行为与其他数据库一致
+    
+    pysqlite/aiosqlite 默认不在 SAVEPOINT 前发出 BEGIN，
+    导致保存点释放时直接提交。这里关闭驱动自带的事务处理，由 SQLAlchemy 显式发出 BEGIN。
+    """
+    if async_engine.dialect.name != "sqlite":
+        return
+    
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(async_engine.sync_engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+configure_sqlite(engine)
+
 # 创建异步会话工厂
 async_session_maker = async_sessionmaker(
     engine,
@@ -26,6 +50,46 @@ class Base(DeclarativeBase):
     pass
 
 
+# 事务提交后回调存放在 session.info 中的键
+_AFTER_COMMIT_KEY = "after_commit_callbacks"
+_AFTER_END_KEY = "after_transaction_end_callbacks"
+
+
+def run_after_commit(session, callback: Callable[[], None]) -> None:
+    """
+    注册一个在当前事务成功提交后执行的回调
+    
+    事务回滚时回调会被丢弃。用于缓存失效等需要在数据真正落库后才做的事情。
+    """
+    sync_session = getattr(session, "sync_session", session)
+    sync_session.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+
+def run_after_transaction_end(session, callback: Callable[[], None]) -> None:
+    """
+    注册一个在当前事务结束后执行的回调（无论提交还是回滚）
+    
+    提交时在 run_after_commit 的回调之后执行。用于释放进程内的临时占用。
+    """
+    sync_session = getattr(session, "sync_session", session)
+    sync_session.info.setdefault(_AFTER_END_KEY, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_callbacks(session):
+    for callback in session.info.pop(_AFTER_COMMIT_KEY, []):
+        callback()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_after_commit_callbacks(session, transaction):
+    # 外层事务结束（提交时回调已执行，这里只会清理回滚留下的回调）
+    if transaction.parent is None:
+        session.info.pop(_AFTER_COMMIT_KEY, None)
+        for callback in session.info.pop(_AFTER_END_KEY, []):
+            callback()
+
+
 async def get_db():
     """获取数据库会话"""
     async with async_session_maker() as session:
@@ -39,7 +103,10 @@ async def get_db():
             await session.close()
 
 
-async def init_db():
-    """初始化数据库（创建表）"""
-    async with engine.begin() as conn:
+async def init_db(bind=None):
+    """初始化数据库（创建表并执行迁移）"""
+    from app.migrations import run_migrations
+    
+    async with (bind or engine).begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
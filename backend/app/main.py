@@ -6,7 +6,17 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.database import init_db
+from app.database import init_db, async_session_maker
+from app.services.availability import availability_cache
+from app.services.live import availability_broker
+from app.services.idempotency import IdempotencyService, idempotency_index
+from app.services.card_expiry import card_expiry_sweeper
+from app.services.card_catalog import card_catalog
+from app.services.customer_search import customer_name_index
+from app.services.ledger_reconciler import ledger_reconciler
+from app.services.token_revocation import token_revocations
+from app.services.user_cache import user_cache
+from app.services.wechat import wechat_client
 from app.routers import (
     auth_router,
     stores_router,
@@ -24,8 +34,30 @@ async def lifespan(app: FastAPI):
     # 启动时初始化数据库
     await init_db()
     print("数据库初始化完成")
+    async with async_session_maker() as db:
+        # 清理过期的幂等键记录
+        await IdempotencyService(db).purge_expired()
+        await db.commit()
+        # 加载卡类型目录
+        await card_catalog.load(db)
+        # 加载有效期内的登录凭证吊销记录
+        await token_revocations.load(db)
+        # 建立客户姓名搜索索引
+        await customer_name_index.refresh(db)
+    # 定期标记过期的卡
+    card_expiry_sweeper.start()
+    # 定期核对卡内次数与流水
+    ledger_reconciler.start()
+    # 同步其他进程的登录凭证吊销
+    token_revocations.start()
+    # 微信接口共享连接池
+    await wechat_client.start()
     yield
     # 关闭时的清理工作
+    await card_expiry_sweeper.stop()
+    await ledger_reconciler.stop()
+    await token_revocations.stop()
+    await wechat_client.close()
     print("应用关闭")
 
 
@@ -71,6 +103,23 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """运行指标（进程内缓存命中率等）"""
+    return {
+        "availability_cache": availability_cache.stats(),
+        "availability_broker": availability_broker.stats(),
+        "idempotency_index": idempotency_index.stats(),
+        "card_expiry_sweeper": card_expiry_sweeper.stats(),
+        "card_catalog": card_catalog.stats(),
+        "ledger_reconciler": ledger_reconciler.stats(),
+        "user_cache": user_cache.stats(),
+        "token_revocations": token_revocations.stats(),
+        "wechat_client": wechat_client.stats(),
+        "customer_name_index": customer_name_index.stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,175 @@
+"""
+数据库迁移
+
+init_db 建表之后执行。没有引入迁移框架，每一步都自行判断是否需要执行，
+可以重复运行。
+"""
+from sqlalchemy import select, insert, update, func, inspect, text, bindparam
+from sqlalchemy.engine import Connection
+
+from app.database import Base
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import UserCard
+from app.models.reservation import SlotReservation
+from app.models.schedule import Schedule
+from app.models.user import User, reverse_phone
+from app.models.time_range import time_to_minutes
+from app.services.availability import reservation_slots
+
+
+def run_migrations(conn: Connection) -> None:
+    """按顺序执行所有迁移（同步连接，通过 run_sync 调用）"""
+    _migrate_time_columns(conn)
+    _add_card_expired_column(conn)
+    _add_token_version_columns(conn)
+    _add_phone_reversed_column(conn)
+    _drop_superseded_indexes(conn)
+    _create_missing_indexes(conn)
+    _backfill_slot_reservations(conn)
+
+
+def _migrate_time_columns(conn: Connection) -> None:
+    """
+    预约和排班的时间由 "HH:MM" 字符串列改为分钟数整数列
+    
+    新增 start_minute / end_minute，按原字符串回填后删除 start_time / end_time
+    """
+    inspector = inspect(conn)
+    for table in (Appointment.__table__, Schedule.__table__):
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        if "start_time" not in columns:
+            continue
+        
+        for column in ("start_minute", "end_minute"):
+            if column not in columns:
+                # 与模型一致不允许为空（SQLite 加 NOT NULL 列需要默认值），随后按原字符串回填
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+        
+        rows = [
+            {
+                "row_id": row_id,
+                "new_start": time_to_minutes(start_time),
+                "new_end": time_to_minutes(end_time),
+            }
+            for row_id, start_time, end_time in conn.execute(
+                text(f"SELECT id, start_time, end_time FROM {table.name}")
+            )
+        ]
+        if rows:
+            conn.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .values(start_minute=bindparam("new_start"), end_minute=bindparam("new_end")),
+                rows
+            )
+        
+        conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN start_time"))
+        conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN end_time"))
+
+
+def _add_card_expired_column(conn: Connection) -> None:
+    """
+    用户持卡新增 is_expired 列
+    
+    已过期的卡由启动后的第一次过期扫描标记，这里只加列
+    """
+    table = UserCard.__table__
+    columns = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    if "is_expired" not in columns:
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN is_expired BOOLEAN NOT NULL DEFAULT FALSE"))
+
+
+def _add_token_version_columns(conn: Connection) -> None:
+    """用户新增 token_version / token_revoked_at 列（索引由 _create_missing_indexes 补建）"""
+    table = User.__table__
+    columns = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    if "token_version" not in columns:
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+    if "token_revoked_at" not in columns:
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN token_revoked_at DATETIME"))
+
+
+def _add_phone_reversed_column(conn: Connection) -> None:
+    """用户新增 phone_reversed 列并按手机号回填（索引由 _create_missing_indexes 补建）"""
+    table = User.__table__
+    columns = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    if "phone_reversed" in columns:
+        return
+    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN phone_reversed VARCHAR(20)"))
+    
+    rows = [
+        {"row_id": row_id, "new_phone_reversed": reverse_phone(phone)}
+        for row_id, phone in conn.execute(select(table.c.id, table.c.phone).where(table.c.phone.is_not(None)))
+    ]
+    if rows:
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values(phone_reversed=bindparam("new_phone_reversed")),
+            rows
+        )
+
+
+def _drop_superseded_indexes(conn: Connection) -> None:
+    """
+    删除模型中已不再声明的索引（被组合索引取代的单列索引等）
+    
+    create_all 只建不删，不删除的话升级上来的库每次写入都要多维护这些索引，
+    查询计划也可能与新建的库不同。只处理按 ix_ 命名的索引
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        declared = {index.name for index in table.indexes}
+        for index in inspector.get_indexes(table.name):
+            if index["name"].startswith("ix_") and index["name"] not in declared:
+                conn.execute(text(f"DROP INDEX {index['name']}"))
+
+
+def _create_missing_indexes(conn: Connection) -> None:
+    """create_all 不会给已存在的表补建索引，这里按模型定义补齐"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+
+
+def _backfill_slot_reservations(conn: Connection) -> None:
+    """为上线时间槽占用表之前的有效预约补写占用记录"""
+    if conn.execute(select(func.count()).select_from(SlotReservation)).scalar():
+        return
+    
+    appointments = conn.execute(
+        select(
+            Appointment.id,
+            Appointment.staff_id,
+            Appointment.appointment_date,
+            Appointment.start_minute,
+            Appointment.end_minute,
+        )
+        .where(Appointment.status.in_([AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED]))
+        .order_by(Appointment.id)
+    ).all()
+    
+    # 历史数据里可能已有重复预约，先到先占，后面重叠的不再写入
+    taken = set()
+    rows = []
+    for appointment_id, staff_id, appointment_date, start_minute, end_minute in appointments:
+        for slot_index in reservation_slots(start_minute, end_minute):
+            key = (staff_id, appointment_date, slot_index)
+            if key in taken:
+                continue
+            taken.add(key)
+            rows.append({
+                "staff_id": staff_id,
+                "appointment_id": appointment_id,
+                "slot_date": appointment_date,
+                "slot_index": slot_index,
+            })
+    
+    if rows:
+        conn.execute(insert(SlotReservation), rows)
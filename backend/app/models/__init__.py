@@ -4,9 +4,11 @@
 from app.models.user import User
 from app.models.store import Store
 from app.models.card import CardType, UserCard
-from app.models.schedule import Schedule
+from app.models.schedule import Schedule, ScheduleTemplate, ScheduleException
 from app.models.appointment import Appointment
-from app.models.transaction import Transaction
+from app.models.transaction import Transaction, CardBalanceSnapshot
+from app.models.reservation import SlotReservation
+from app.models.idempotency import IdempotencyRecord
 
 __all__ = [
     "User",
@@ -14,6 +16,11 @@ __all__ = [
     "CardType",
     "UserCard",
     "Schedule",
+    "ScheduleTemplate",
+    "ScheduleException",
     "Appointment",
     "Transaction",
+    "CardBalanceSnapshot",
+    "SlotReservation",
+    "IdempotencyRecord",
 ]
@@ -3,12 +3,13 @@
 """
 from datetime import datetime, date
 from typing import Optional
-from sqlalchemy import String, Date, DateTime, ForeignKey, Enum as SQLEnum, Text
+from sqlalchemy import Date, DateTime, ForeignKey, Index, Enum as SQLEnum, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 
 from app.database import Base
 from app.models.card import ServiceType
+from app.models.time_range import TimeRangeMixin
 
 
 class AppointmentStatus(str, enum.Enum):
@@ -19,23 +20,27 @@ class AppointmentStatus(str, enum.Enum):
     CANCELLED = "cancelled"    # 已取消
 
 
-class Appointment(Base):
-    """预约表"""
+class Appointment(TimeRangeMixin, Base):
+    """预约表（开始/结束时间见 TimeRangeMixin）"""
     __tablename__ = "appointments"
+    __table_args__ = (
+        # 查员工某天的有效预约（可预约时段、排班冲突）
+        Index("ix_appointments_staff_date_status", "staff_id", "appointment_date", "status"),
+        # 客户预约列表按 (日期, 开始时间, id) 分页
+        Index("ix_appointments_customer_date_start", "customer_id", "appointment_date", "start_minute"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
     # 关联
-    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)  # 客户
-    staff_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)     # 服务员工
+    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))  # 客户
+    staff_id: Mapped[int] = mapped_column(ForeignKey("users.id"))     # 服务员工
     store_id: Mapped[int] = mapped_column(ForeignKey("stores.id"), index=True)    # 门店
     
     # 预约信息
     service_type: Mapped[ServiceType] = mapped_column(SQLEnum(ServiceType))  # 服务类型
     service_count: Mapped[int] = mapped_column(default=1)  # 服务数量（综合卡可多选）
     appointment_date: Mapped[date] = mapped_column(Date, index=True)  # 预约日期
-    start_time: Mapped[str] = mapped_column(String(10))  # 开始时间
-    end_time: Mapped[str] = mapped_column(String(10))    # 结束时间
     
     # 状态
     status: Mapped[AppointmentStatus] = mapped_column(
@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import String, Integer, Float, Boolean, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import String, Integer, Float, Boolean, DateTime, ForeignKey, Text, Index, Enum as SQLEnum, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 
@@ -57,11 +57,21 @@ class CardType(Base):
 class UserCard(Base):
     """用户持卡表 - 用户拥有的卡"""
     __tablename__ = "user_cards"
+    __table_args__ = (
+        # 用户的卡 / 用户的有效卡（未停用、未标记过期）
+        Index("ix_user_cards_user_status", "user_id", "is_active", "is_expired"),
+        # 过期扫描：部分索引，只索引有有效期且尚未标记过期的卡
+        Index(
+            "ix_user_cards_expiring", "expire_date",
+            sqlite_where=text("is_expired = 0 AND expire_date IS NOT NULL"),
+            postgresql_where=text("NOT is_expired AND expire_date IS NOT NULL"),
+        ),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
     # 关联
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     card_type_id: Mapped[int] = mapped_column(ForeignKey("card_types.id"))
     
     # 卡状态
@@ -73,6 +83,7 @@ class UserCard(Base):
     
     # 状态
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    is_expired: Mapped[bool] = mapped_column(Boolean, default=False)  # 已过期（由后台扫描批量标记）
     
     # 时间戳
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
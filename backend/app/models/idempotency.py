@@ -0,0 +1,39 @@
+"""
+幂等键记录模型 - 保存带 Idempotency-Key 的写请求的响应，网络重试时原样返回
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Integer, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class IdempotencyRecord(Base):
+    """
+    幂等键记录表
+
+    (用户, 幂等键) 唯一，和业务写操作在同一事务中写入：
+    业务成功提交则记录和响应一起落库，失败回滚则记录也不存在，重试会重新执行。
+    """
+    __tablename__ = "idempotency_records"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_records_user_key"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    # 关联
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))  # 发起请求的用户
+
+    # 请求
+    key: Mapped[str] = mapped_column(String(64))  # 客户端生成的幂等键
+    fingerprint: Mapped[str] = mapped_column(String(64))  # 请求指纹（方法+路径+参数+请求体），防止同一个键用于不同请求
+
+    # 响应
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # NULL表示请求仍在处理中
+    response_body: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # JSON
+
+    # 时间戳
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)  # 过期后同一个键可以重新使用
@@ -0,0 +1,31 @@
+"""
+预约时间槽占用模型 - 防止同一员工同一时段被重复预约
+"""
+from datetime import date
+from sqlalchemy import Integer, Date, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class SlotReservation(Base):
+    """
+    时间槽占用表
+    
+    预约覆盖的每个5分钟时间槽对应一行，(员工, 日期, 槽位) 唯一。
+    和预约在同一事务中写入，并发预约同一时段时由数据库唯一约束裁决。
+    """
+    __tablename__ = "slot_reservations"
+    __table_args__ = (
+        UniqueConstraint("staff_id", "slot_date", "slot_index", name="uq_slot_reservations_staff_slot"),
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    
+    # 关联
+    staff_id: Mapped[int] = mapped_column(ForeignKey("users.id"))  # 员工
+    appointment_id: Mapped[int] = mapped_column(ForeignKey("appointments.id"), index=True)  # 占用该槽的预约
+    
+    # 槽位
+    slot_date: Mapped[date] = mapped_column(Date)  # 日期
+    slot_index: Mapped[int] = mapped_column(Integer)  # 当天第几个槽（0点起，每5分钟一个）
@@ -2,29 +2,34 @@
 员工排班模型
 """
 from datetime import datetime, date
-from sqlalchemy import String, Date, DateTime, ForeignKey, Boolean
+from typing import List, Optional
+from sqlalchemy import Date, DateTime, ForeignKey, Boolean, Index, Integer, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
+from app.models.time_range import TimeRangeMixin
 
 
-class Schedule(Base):
-    """员工排班表"""
+class Schedule(TimeRangeMixin, Base):
+    """员工排班表（工作时间段见 TimeRangeMixin）"""
     __tablename__ = "schedules"
+    __table_args__ = (
+        # 查门店某天的有效排班（可预约时段）
+        Index("ix_schedules_store_date_active", "store_id", "work_date", "is_active"),
+    )
+    
+    # 由排班模板展开出的排班不入库，id 为空、template_id 为模板ID
+    template_id = None
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
     # 关联
     staff_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)  # 员工ID
-    store_id: Mapped[int] = mapped_column(ForeignKey("stores.id"), index=True)  # 门店ID
+    store_id: Mapped[int] = mapped_column(ForeignKey("stores.id"))  # 门店ID
     
     # 排班日期
     work_date: Mapped[date] = mapped_column(Date, index=True)  # 工作日期
     
-    # 工作时间段
-    start_time: Mapped[str] = mapped_column(String(10))  # 开始时间，如 "09:00"
-    end_time: Mapped[str] = mapped_column(String(10))    # 结束时间，如 "18:00"
-    
     # 状态
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     
@@ -39,3 +44,76 @@ class Schedule(Base):
     # 关系
     staff = relationship("User", back_populates="schedules")
     store = relationship("Store", back_populates="schedules")
+
+
+class ScheduleTemplate(TimeRangeMixin, Base):
+    """
+    每周固定排班模板
+    
+    按星期重复，查询时只在请求的日期范围内展开，不按天写入排班表。
+    同一员工当天有排班表记录（任意门店）时以排班表为准，
+    个别日期不上班用 ScheduleException 排除。
+    """
+    __tablename__ = "schedule_templates"
+    __table_args__ = (
+        # 查门店的有效模板（可预约时段）
+        Index("ix_schedule_templates_store_active", "store_id", "is_active"),
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    
+    # 关联
+    staff_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)  # 员工ID
+    store_id: Mapped[int] = mapped_column(ForeignKey("stores.id"))  # 门店ID
+    
+    # 星期位图：第 i 位对应 date.weekday() == i（周一为0）
+    weekday_mask: Mapped[int] = mapped_column(Integer)
+    
+    # 有效期（valid_until 为空表示长期有效）
+    valid_from: Mapped[date] = mapped_column(Date)
+    valid_until: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    
+    # 状态
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    
+    # 时间戳
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, 
+        default=datetime.utcnow, 
+        onupdate=datetime.utcnow
+    )
+    
+    # 关系
+    staff = relationship("User")
+    store = relationship("Store")
+    
+    @property
+    def weekdays(self) -> List[int]:
+        """上班的星期列表，如 [0, 2, 4] 表示周一、三、五"""
+        return [day for day in range(7) if self.weekday_mask >> day & 1]
+    
+    @weekdays.setter
+    def weekdays(self, value: List[int]) -> None:
+        self.weekday_mask = sum(1 << day for day in set(value))
+    
+    def applies_to(self, work_date: date) -> bool:
+        """模板在该日期是否生效（不含例外日期）"""
+        return (
+            self.valid_from <= work_date
+            and (self.valid_until is None or work_date <= self.valid_until)
+            and bool(self.weekday_mask >> work_date.weekday() & 1)
+        )
+
+
+class ScheduleException(Base):
+    """排班模板的例外日期（该日期不按模板上班）"""
+    __tablename__ = "schedule_exceptions"
+    __table_args__ = (
+        UniqueConstraint("template_id", "exception_date", name="uq_schedule_exceptions_template_date"),
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    template_id: Mapped[int] = mapped_column(ForeignKey("schedule_templates.id"))  # 模板ID
+    exception_date: Mapped[date] = mapped_column(Date)  # 不上班的日期
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
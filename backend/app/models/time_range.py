@@ -0,0 +1,46 @@
+"""
+时间段字段 - 以当天分钟数（整数）存储，对外仍按 "HH:MM" 字符串读写
+"""
+from sqlalchemy import Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+def time_to_minutes(time_str: str) -> int:
+    """将时间字符串转换为分钟数"""
+    hours, minutes = map(int, time_str.split(':'))
+    return hours * 60 + minutes
+
+
+def minutes_to_time(minutes: int) -> str:
+    """将分钟数转换为时间字符串"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class TimeRangeMixin:
+    """
+    开始/结束时间字段
+    
+    数据库中存 start_minute / end_minute（如 540 表示 09:00），
+    查询和比较直接用整数列；start_time / end_time 属性供接口和构造函数使用。
+    """
+    
+    start_minute: Mapped[int] = mapped_column(Integer)  # 开始时间（当天第几分钟）
+    end_minute: Mapped[int] = mapped_column(Integer)    # 结束时间（当天第几分钟）
+    
+    @property
+    def start_time(self) -> str:
+        """开始时间，如 "09:00" """
+        return minutes_to_time(self.start_minute)
+    
+    @start_time.setter
+    def start_time(self, value: str) -> None:
+        self.start_minute = time_to_minutes(value)
+    
+    @property
+    def end_time(self) -> str:
+        """结束时间，如 "18:00" """
+        return minutes_to_time(self.end_minute)
+    
+    @end_time.setter
+    def end_time(self, value: str) -> None:
+        self.end_minute = time_to_minutes(value)
@@ -1,9 +1,11 @@
 """
 消费记录模型 - 记录每次服务的扣卡次数
+
+消费记录只追加不修改（见 services/ledger），配合卡余额快照可以重建任一张卡的余额
 """
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Integer, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Integer, DateTime, ForeignKey, Text, Index, Enum as SQLEnum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 
@@ -21,12 +23,19 @@ class TransactionType(str, enum.Enum):
 class Transaction(Base):
     """消费记录表"""
     __tablename__ = "transactions"
+    __table_args__ = (
+        # 卡流水 / 客户流水按时间倒序分页
+        Index("ix_transactions_card_created", "user_card_id", "created_at", "id"),
+        Index("ix_transactions_customer_created", "customer_id", "created_at", "id"),
+        # 按卡读取某个快照之后的流水（对账）
+        Index("ix_transactions_card_id", "user_card_id", "id"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
     # 关联
-    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)  # 客户
-    user_card_id: Mapped[int] = mapped_column(ForeignKey("user_cards.id"), index=True)  # 使用的卡
+    customer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))  # 客户
+    user_card_id: Mapped[int] = mapped_column(ForeignKey("user_cards.id"))  # 使用的卡
     appointment_id: Mapped[Optional[int]] = mapped_column(ForeignKey("appointments.id"), nullable=True)  # 关联预约
     
     # 交易信息
@@ -49,3 +58,24 @@ class Transaction(Base):
     customer = relationship("User", back_populates="transactions", foreign_keys=[customer_id])
     user_card = relationship("UserCard", back_populates="transactions")
     appointment = relationship("Appointment", back_populates="transaction")
+
+
+class CardBalanceSnapshot(Base):
+    """
+    卡余额快照表 - 只追加
+    
+    记录一张卡截至某条流水（含）的卡内次数，卡余额 = 最新快照 + 之后的流水变动之和。
+    开卡时写入第一个快照（last_transaction_id 为0），之后由对账任务定期追加
+    """
+    __tablename__ = "card_balance_snapshots"
+    __table_args__ = (
+        # 取一张卡的最新快照
+        Index("ix_card_balance_snapshots_card_position", "user_card_id", "last_transaction_id"),
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_card_id: Mapped[int] = mapped_column(ForeignKey("user_cards.id"))
+    last_transaction_id: Mapped[int] = mapped_column(Integer, default=0)  # 快照包含的最后一条流水，0表示开卡时
+    remaining_times: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # 卡内次数，NULL表示无限次
+    transactions: Mapped[int] = mapped_column(Integer, default=0)  # 快照包含的流水条数
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 from typing import Optional, List, TYPE_CHECKING
-from sqlalchemy import String, Boolean, DateTime, Enum as SQLEnum
+from sqlalchemy import String, Boolean, DateTime, Enum as SQLEnum, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 
@@ -30,6 +30,8 @@ class User(Base):
     # 基本信息
     nickname: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
     phone: Mapped[Optional[str]] = mapped_column(String(20), nullable=True, index=True)
+    # 倒序的手机号（写入时自动维护），按尾号搜索时走索引
+    phone_reversed: Mapped[Optional[str]] = mapped_column(String(20), nullable=True, index=True)
     avatar_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     
     # 角色和状态
@@ -38,6 +40,9 @@ class User(Base):
         default=UserRole.CUSTOMER
     )
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # 登录凭证版本：角色变化或禁用时加一，之前签发的token随之失效
+    token_version: Mapped[int] = mapped_column(default=0)
+    token_revoked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
     
     # 员工特有字段
     real_name: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # 真实姓名
@@ -49,7 +54,8 @@ class User(Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, 
         default=datetime.utcnow, 
-        onupdate=datetime.utcnow
+        onupdate=datetime.utcnow,
+        index=True  # 客户搜索索引按修改时间增量同步
     )
     
     # 关系
@@ -58,3 +64,17 @@ class User(Base):
     staff_appointments = relationship("Appointment", back_populates="staff", foreign_keys="Appointment.staff_id")
     schedules = relationship("Schedule", back_populates="staff")
     transactions = relationship("Transaction", back_populates="customer", foreign_keys="Transaction.customer_id")
+
+
+def reverse_phone(phone: Optional[str]) -> Optional[str]:
+    """倒序手机号：尾号匹配变成前缀匹配"""
+    return phone[::-1] if phone else None
+
+
+@event.listens_for(User, "before_insert")
+@event.listens_for(User, "before_update")
+def _sync_phone_reversed(mapper, connection, target: User) -> None:
+    """ORM 写入时维护 phone_reversed（Core 批量插入需自行传入）"""
+    reversed_phone = reverse_phone(target.phone)
+    if target.phone_reversed != reversed_phone:
+        target.phone_reversed = reversed_phone
@@ -3,20 +3,35 @@
 """
 from datetime import date
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.models.appointment import AppointmentStatus
 from app.schemas.appointment import (
     AppointmentCreate, AppointmentUpdate, 
-    AppointmentResponse, AppointmentDetail, AppointmentComplete
+    AppointmentResponse, AppointmentDetail, AppointmentComplete, AppointmentPage,
+    BatchCompleteRequest, BatchCompleteResult
 )
 from app.services.appointment import AppointmentService
 from app.services.auth import AuthService
+from app.services.idempotency import IdempotencyService
 
 router = APIRouter(prefix="/appointments", tags=["预约"])
 
+# 分页列表每页最多条数
+MAX_PAGE_SIZE = 100
+
+# 批量核销一次最多条数
+MAX_BATCH_COMPLETE = 200
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="分页游标无效"
+    )
+
 
 # ============ 客户端接口 ============
 
@@ -58,6 +73,31 @@ async def get_my_appointments(
     )
 
 
+@router.get("/my-appointments/page", response_model=AppointmentPage)
+async def list_my_appointments(
+    status: Optional[AppointmentStatus] = Query(None),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.get_current_user)
+):
+    """
+    分页获取我的预约（客户端，新的在前）
+    
+    列表项只含展示用的字段，门店和员工信息在 stores / staff 对照表中
+    """
+    appointment_service = AppointmentService(db)
+    page = await appointment_service.list_customer_appointments(
+        customer_id=current_user.id,
+        status=status,
+        cursor=cursor,
+        limit=limit
+    )
+    if page is None:
+        raise _invalid_cursor()
+    return page
+
+
 @router.post("/{appointment_id}/cancel")
 async def cancel_appointment(
     appointment_id: int,
@@ -96,18 +136,52 @@ async def get_staff_appointments(
     )
 
 
+@router.get("/staff-appointments/page", response_model=AppointmentPage)
+async def list_staff_appointments(
+    appointment_date: Optional[date] = Query(None),
+    status: Optional[AppointmentStatus] = Query(None),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.require_staff)
+):
+    """
+    分页获取我的预约（员工端，按时间先后）
+    
+    列表项只含展示用的字段，门店和客户信息在 stores / customers 对照表中
+    """
+    appointment_service = AppointmentService(db)
+    page = await appointment_service.list_staff_appointments(
+        staff_id=current_user.id,
+        appointment_date=appointment_date,
+        status=status,
+        cursor=cursor,
+        limit=limit
+    )
+    if page is None:
+        raise _invalid_cursor()
+    return page
+
+
 @router.post("/{appointment_id}/complete")
 async def complete_appointment(
     appointment_id: int,
     complete_data: AppointmentComplete,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user = Depends(AuthService.require_staff)
 ):
     """
     完成预约（核销）
     
-    员工核销服务，同时扣减客户的卡次
+    员工核销服务，同时扣减客户的卡次。
+    带 Idempotency-Key 请求头时，同一个键的重试直接返回第一次的结果
     """
+    idempotency = IdempotencyService(db)
+    replay = await idempotency.begin(current_user.id, idempotency_key, request)
+    if replay is not None:
+        return replay
     appointment_service = AppointmentService(db)
     result = await appointment_service.complete_appointment(
         appointment_id=appointment_id,
@@ -120,7 +194,31 @@ async def complete_appointment(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="核销失败"
         )
-    return {"success": True, "message": "核销成功"}
+    return idempotency.finish({"success": True, "message": "核销成功"})
+
+
+@router.post("/batch-complete", response_model=List[BatchCompleteResult])
+async def complete_appointments_batch(
+    batch_data: BatchCompleteRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.require_staff)
+):
+    """
+    批量核销（打烊时一次核销多个预约）
+    
+    所有预约在同一个事务中处理，返回逐项结果；
+    某一项失败不影响其他项
+    """
+    if len(batch_data.items) > MAX_BATCH_COMPLETE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一次最多核销{MAX_BATCH_COMPLETE}个预约"
+        )
+    appointment_service = AppointmentService(db)
+    return await appointment_service.complete_appointments_batch(
+        items=batch_data.items,
+        operator_id=current_user.id
+    )
 
 
 # ============ 统计接口 ============
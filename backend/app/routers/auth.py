@@ -7,6 +7,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.schemas.auth import WechatLoginRequest, NameLoginRequest, TokenResponse
 from app.services.auth import AuthService
+from app.services.user import UserService
+from app.services.wechat import WechatUnavailableError
 
 router = APIRouter(prefix="/auth", tags=["认证"])
 
@@ -59,13 +61,19 @@ async def wechat_login(
     3. 后端验证并返回 JWT token
     """
     auth_service = AuthService(db)
-    result = await auth_service.wechat_login(
-        code=request.code,
-        role=request.role,
-        staff_password=request.staff_password,
-        nickname=request.nickname,
-        avatar_url=request.avatar_url
-    )
+    try:
+        result = await auth_service.wechat_login(
+            code=request.code,
+            role=request.role,
+            staff_password=request.staff_password,
+            nickname=request.nickname,
+            avatar_url=request.avatar_url
+        )
+    except WechatUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     
     if not result:
         raise HTTPException(
@@ -85,15 +93,17 @@ async def wechat_login(
 
 @router.get("/me", response_model=dict)
 async def get_current_user_info(
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(AuthService.get_current_user)
 ):
-    """获取当前用户信息"""
+    """获取当前用户信息（认证只带基本列，资料从数据库读取）"""
+    user = await UserService(db).get_user(current_user.id)
     return {
-        "id": current_user.id,
-        "openid": current_user.openid,
-        "nickname": current_user.nickname,
-        "phone": current_user.phone,
-        "avatar_url": current_user.avatar_url,
-        "role": current_user.role.value,
-        "real_name": current_user.real_name,
+        "id": user.id,
+        "openid": user.openid,
+        "nickname": user.nickname,
+        "phone": user.phone,
+        "avatar_url": user.avatar_url,
+        "role": user.role.value,
+        "real_name": user.real_name,
     }
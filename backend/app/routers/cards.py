@@ -1,31 +1,49 @@
 """
 卡管理路由
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
+from app.models.user import UserRole
 from app.schemas.card import (
     CardTypeResponse, CardTypeCreate,
     UserCardResponse, UserCardCreate, UserCardSimple,
     NewCustomerCardCreate
 )
+from app.schemas.transaction import CardBalance, LedgerPage, MonthlyConsumption
 from app.services.card import CardService
+from app.services.card_catalog import card_catalog, etag_matches
+from app.services.card_import import CardImporter, iter_file, parse_rows, spool_upload
 from app.services.auth import AuthService
+from app.services.idempotency import IdempotencyService
+from app.services.ledger import LedgerService, stream_ledger
 
 router = APIRouter(prefix="/cards", tags=["卡管理"])
 
+# 流水分页每页最多条数
+MAX_PAGE_SIZE = 100
+
 
 # ============ 卡类型 ============
 
 @router.get("/types", response_model=List[CardTypeResponse])
 async def get_card_types(
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取所有卡类型"""
-    card_service = CardService(db)
-    return await card_service.get_card_types()
+    """
+    获取所有卡类型
+    
+    响应带 ETag，客户端带 If-None-Match 请求且卡类型没有变化时返回304
+    """
+    snapshot = await card_catalog.current(db)
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 
 @router.post("/types", response_model=CardTypeResponse)
@@ -43,23 +61,25 @@ async def create_card_type(
 
 @router.get("/my-cards", response_model=List[UserCardSimple])
 async def get_my_cards(
+    live_only: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user = Depends(AuthService.get_current_user)
 ):
-    """获取我的卡列表（客户端）"""
+    """获取我的卡列表（客户端），live_only=true 时只返回未过期的卡"""
     card_service = CardService(db)
-    return await card_service.get_user_cards(current_user.id)
+    return await card_service.get_user_cards(current_user.id, live_only=live_only)
 
 
 @router.get("/user/{user_id}", response_model=List[UserCardSimple])
 async def get_user_cards(
     user_id: int,
+    live_only: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user = Depends(AuthService.require_staff)
 ):
-    """获取指定用户的卡列表（员工端）"""
+    """获取指定用户的卡列表（员工端），live_only=true 时只返回未过期的卡"""
     card_service = CardService(db)
-    return await card_service.get_user_cards(user_id)
+    return await card_service.get_user_cards(user_id, live_only=live_only)
 
 
 @router.post("/add-card", response_model=UserCardResponse)
@@ -84,25 +104,33 @@ async def add_card_to_user(
 @router.post("/{user_card_id}/deduct")
 async def deduct_card(
     user_card_id: int,
+    request: Request,
     times: int = 1,
+    idempotency_key: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user = Depends(AuthService.require_staff)
 ):
     """
     扣减卡次（核销时调用）
+    
+    带 Idempotency-Key 请求头时，同一个键的重试直接返回第一次的结果，不会重复扣卡
     """
+    idempotency = IdempotencyService(db)
+    replay = await idempotency.begin(current_user.id, idempotency_key, request)
+    if replay is not None:
+        return replay
     card_service = CardService(db)
-    result = await card_service.deduct_card(
+    transaction = await card_service.deduct_card(
         user_card_id=user_card_id,
         times=times,
         operator_id=current_user.id
     )
-    if not result:
+    if transaction is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="扣减失败，卡不存在或次数不足"
         )
-    return {"success": True, "remaining_times": result}
+    return idempotency.finish({"success": True, "remaining_times": transaction.times_after})
 
 
 @router.post("/new-customer-card", response_model=UserCardResponse)
@@ -124,3 +152,169 @@ async def create_new_customer_card(
         card_type_id=data.card_type_id,
         created_by=current_user.id
     )
+
+
+@router.post("/import")
+async def import_cards(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$", description="csv 或 jsonl，默认按 Content-Type 判断"),
+    current_user = Depends(AuthService.require_admin)
+):
+    """
+    批量导入客户和卡（管理员，录入纸质记录）
+    
+    请求体直接是 CSV（表头 name,phone,card_type,remaining_times,expire_date）或 JSONL 文件内容，
+    如 curl --data-binary @cards.csv -H "Content-Type: text/csv"。
+    收完上传内容后逐行导入，每导入一批输出一行进度（NDJSON），最后一行 done 为 true
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "jsonl")
+    upload = await spool_upload(request.stream())
+    importer = CardImporter(operator_id=current_user.id)
+    
+    async def lines():
+        async for progress in importer.run(parse_rows(iter_file(upload), fmt)):
+            yield progress.model_dump_json() + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# ============ 卡流水 ============
+
+async def _check_card_access(user_card_id: int, current_user, ledger_service: LedgerService) -> None:
+    """员工可以查看所有卡的流水，客户只能查看自己的卡"""
+    owner_id = await ledger_service.get_card_owner(user_card_id)
+    if owner_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="卡不存在"
+        )
+    if owner_id != current_user.id and current_user.role not in [UserRole.STAFF, UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权查看此卡"
+        )
+
+
+def _check_user_access(user_id: int, current_user) -> None:
+    if user_id != current_user.id and current_user.role not in [UserRole.STAFF, UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权查看此客户的流水"
+        )
+
+
+def _ledger_page_or_400(page: Optional[LedgerPage]) -> LedgerPage:
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="分页游标无效"
+        )
+    return page
+
+
+def _ndjson_response(entries, filename: str) -> StreamingResponse:
+    """逐行输出JSON（每行一条流水）"""
+    async def lines():
+        async for entry in entries:
+            yield entry.model_dump_json() + "\n"
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/{user_card_id}/ledger", response_model=LedgerPage)
+async def get_card_ledger(
+    user_card_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.get_current_user)
+):
+    """
+    分页获取一张卡的流水（新的在前）
+    
+    每条流水带变动前后的卡内次数，可以直接对账
+    """
+    ledger_service = LedgerService(db)
+    await _check_card_access(user_card_id, current_user, ledger_service)
+    return _ledger_page_or_400(
+        await ledger_service.list_ledger(user_card_id=user_card_id, cursor=cursor, limit=limit)
+    )
+
+
+@router.get("/{user_card_id}/ledger/export")
+async def export_card_ledger(
+    user_card_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.get_current_user)
+):
+    """导出一张卡的全部流水（NDJSON 流式返回，新的在前）"""
+    await _check_card_access(user_card_id, current_user, LedgerService(db))
+    return _ndjson_response(
+        stream_ledger(user_card_id=user_card_id), f"card_{user_card_id}_ledger.ndjson"
+    )
+
+
+@router.get("/{user_card_id}/ledger/monthly", response_model=List[MonthlyConsumption])
+async def get_card_monthly_consumption(
+    user_card_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.get_current_user)
+):
+    """按月汇总一张卡的消费/充值次数"""
+    ledger_service = LedgerService(db)
+    await _check_card_access(user_card_id, current_user, ledger_service)
+    return await ledger_service.monthly_consumption(user_card_id=user_card_id)
+
+
+@router.get("/{user_card_id}/balance", response_model=CardBalance)
+async def get_card_balance(
+    user_card_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.get_current_user)
+):
+    """
+    卡余额对账
+    
+    按最新余额快照和之后的流水重建卡内次数，并与卡上记录的次数比对
+    """
+    ledger_service = LedgerService(db)
+    await _check_card_access(user_card_id, current_user, ledger_service)
+    return await ledger_service.card_balance(user_card_id)
+
+
+@router.get("/user/{user_id}/ledger", response_model=LedgerPage)
+async def get_user_ledger(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.get_current_user)
+):
+    """分页获取客户所有卡的流水（新的在前）"""
+    _check_user_access(user_id, current_user)
+    return _ledger_page_or_400(
+        await LedgerService(db).list_ledger(customer_id=user_id, cursor=cursor, limit=limit)
+    )
+
+
+@router.get("/user/{user_id}/ledger/export")
+async def export_user_ledger(
+    user_id: int,
+    current_user = Depends(AuthService.get_current_user)
+):
+    """导出客户所有卡的流水（NDJSON 流式返回，新的在前）"""
+    _check_user_access(user_id, current_user)
+    return _ndjson_response(stream_ledger(customer_id=user_id), f"user_{user_id}_ledger.ndjson")
+
+
+@router.get("/user/{user_id}/ledger/monthly", response_model=List[MonthlyConsumption])
+async def get_user_monthly_consumption(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.get_current_user)
+):
+    """按月汇总客户所有卡的消费/充值次数"""
+    _check_user_access(user_id, current_user)
+    return await LedgerService(db).monthly_consumption(customer_id=user_id)
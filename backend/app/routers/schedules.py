@@ -1,21 +1,31 @@
 """
 排班路由
 """
+import asyncio
 from datetime import date
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.schemas.schedule import (
     ScheduleCreate, ScheduleBatchCreate, ScheduleUpdate,
-    ScheduleResponse, ScheduleWithDetails, AvailableStaff
+    ScheduleResponse, ScheduleWithDetails, AvailableStaff, DayAvailability,
+    EarliestSlot, ScheduleTemplateCreate, ScheduleTemplateResponse,
+    ScheduleExceptionCreate
 )
 from app.services.schedule import ScheduleService
+from app.services.live import availability_broker
 from app.services.auth import AuthService
 
 router = APIRouter(prefix="/schedules", tags=["排班"])
 
+# 日期范围查询最多覆盖的天数
+MAX_RANGE_DAYS = 14
+
+# 可预约的天数（今天起，与预约页一致）
+BOOKING_DAYS = 7
+
 
 @router.get("/available-staff", response_model=List[AvailableStaff])
 async def get_available_staff(
@@ -38,6 +48,91 @@ async def get_available_staff(
     )
 
 
+@router.get("/available-range", response_model=List[DayAvailability])
+async def get_available_staff_range(
+    store_id: int = Query(..., description="门店ID"),
+    start_date: date = Query(..., description="开始日期"),
+    end_date: date = Query(..., description="结束日期（包含）"),
+    service_duration: int = Query(30, description="服务时长（分钟）"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取指定门店一段日期内每天的可预约员工
+    
+    预约页一次拉取整周的可用时间，切换日期时无需再请求
+    """
+    days = (end_date - start_date).days + 1
+    if days < 1 or days > MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"日期范围需在1到{MAX_RANGE_DAYS}天之间"
+        )
+    schedule_service = ScheduleService(db)
+    return await schedule_service.get_available_staff_range(
+        store_id=store_id,
+        start_date=start_date,
+        end_date=end_date,
+        service_duration=service_duration
+    )
+
+
+@router.get("/earliest", response_model=List[EarliestSlot])
+async def get_earliest_slots(
+    service_duration: int = Query(30, description="服务时长（分钟）"),
+    limit: int = Query(5, ge=1, le=20, description="返回数量"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    查找最早可预约的时段
+    
+    不限门店和员工，从现在起按时间先后返回最早的几个可预约时段
+    """
+    schedule_service = ScheduleService(db)
+    return await schedule_service.find_earliest_slots(
+        service_duration=service_duration,
+        limit=limit,
+        days=BOOKING_DAYS
+    )
+
+
+@router.websocket("/live")
+async def live_availability(websocket: WebSocket):
+    """
+    可预约时段实时推送（WebSocket）
+    
+    客户端发送 {"store_id": 1, "work_date": "2026-01-10"} 订阅，再次发送即切换。
+    服务端推送该门店当天的变化：
+    - booked：{staff_id, start_time, end_time} 被占用，客户端直接去掉重叠的可用时间
+    - released / schedule / resync：重新拉取当天的可预约员工
+    """
+    await websocket.accept()
+    with availability_broker.subscription() as subscription:
+        receive = asyncio.ensure_future(websocket.receive_json())
+        event = asyncio.ensure_future(subscription.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {receive, event}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if event in done:
+                    await websocket.send_json(event.result())
+                    event = asyncio.ensure_future(subscription.get())
+                if receive in done:
+                    try:
+                        message = receive.result()
+                        subscription.switch(
+                            int(message["store_id"]), date.fromisoformat(message["work_date"])
+                        )
+                    except (KeyError, TypeError, ValueError):
+                        await websocket.send_json({"type": "error", "detail": "订阅参数错误"})
+                    receive = asyncio.ensure_future(websocket.receive_json())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receive.cancel()
+            event.cancel()
+
+
 @router.get("/my-schedules", response_model=List[ScheduleWithDetails])
 async def get_my_schedules(
     start_date: Optional[date] = Query(None),
@@ -45,7 +140,11 @@ async def get_my_schedules(
     db: AsyncSession = Depends(get_db),
     current_user = Depends(AuthService.require_staff)
 ):
-    """获取我的排班（员工端，包含门店信息）"""
+    """
+    获取我的排班（员工端，包含门店信息）
+    
+    包含按每周模板展开的日期（id 为空、template_id 为模板ID）
+    """
     schedule_service = ScheduleService(db)
     return await schedule_service.get_staff_schedules(
         staff_id=current_user.id,
@@ -86,6 +185,88 @@ async def create_schedules_batch(
     )
 
 
+@router.post("/templates", response_model=ScheduleTemplateResponse)
+async def create_schedule_template(
+    template_data: ScheduleTemplateCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.require_staff)
+):
+    """
+    创建每周排班模板（如每周一、三、五 09:00-18:00）
+    
+    模板不按天写入排班表，查询时在请求的日期范围内展开；
+    某天单独设置的排班会覆盖模板
+    """
+    if template_data.valid_until and template_data.valid_until < template_data.valid_from:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="有效期结束日期不能早于开始日期"
+        )
+    schedule_service = ScheduleService(db)
+    template = await schedule_service.create_template(
+        staff_id=current_user.id,
+        template_data=template_data
+    )
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="与已有排班模板的日期重叠"
+        )
+    return template
+
+
+@router.get("/templates", response_model=List[ScheduleTemplateResponse])
+async def get_my_schedule_templates(
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.require_staff)
+):
+    """获取我的排班模板"""
+    schedule_service = ScheduleService(db)
+    return await schedule_service.get_templates(current_user.id)
+
+
+@router.delete("/templates/{template_id}")
+async def delete_schedule_template(
+    template_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.require_staff)
+):
+    """删除排班模板"""
+    schedule_service = ScheduleService(db)
+    result = await schedule_service.delete_template(
+        template_id=template_id,
+        staff_id=current_user.id
+    )
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="排班模板不存在或无权限删除"
+        )
+    return {"success": True}
+
+
+@router.post("/templates/{template_id}/exceptions")
+async def add_schedule_template_exception(
+    template_id: int,
+    exception_data: ScheduleExceptionCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.require_staff)
+):
+    """排除模板的某一天（该天不按模板上班）"""
+    schedule_service = ScheduleService(db)
+    result = await schedule_service.add_template_exception(
+        template_id=template_id,
+        staff_id=current_user.id,
+        exception_date=exception_data.exception_date
+    )
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="排班模板不存在或无权限修改"
+        )
+    return {"success": True}
+
+
 @router.delete("/{schedule_id}")
 async def delete_schedule(
     schedule_id: int,
@@ -7,9 +7,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from app.database import get_db
+from app.schemas.summary import CustomerSummary
 from app.schemas.user import UserUpdate, UserResponse, StaffResponse, StaffSimple
 from app.services.user import UserService
 from app.services.auth import AuthService
+from app.services.customer_summary import customer_summary
 
 router = APIRouter(prefix="/users", tags=["用户"])
 
@@ -29,6 +31,19 @@ async def update_my_info(
     return await user_service.update_user(current_user.id, user_data)
 
 
+@router.get("/me/summary", response_model=CustomerSummary)
+async def get_my_summary(
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(AuthService.get_current_user)
+):
+    """
+    “我的”页面汇总（客户端）
+    
+    一次返回我的卡、预约列表第一页和最近流水，与认证共用一个会话
+    """
+    return await customer_summary(db, current_user.id)
+
+
 @router.get("/staff", response_model=List[StaffSimple])
 async def get_staff_list(
     db: AsyncSession = Depends(get_db)
@@ -56,12 +71,12 @@ async def get_staff_detail(
 
 @router.get("/search", response_model=List[UserResponse])
 async def search_users(
-    phone: Optional[str] = Query(None, description="手机号"),
-    nickname: Optional[str] = Query(None, description="昵称"),
+    phone: Optional[str] = Query(None, description="手机号（尾号或开头几位）"),
+    nickname: Optional[str] = Query(None, description="姓名（昵称或真实姓名的一部分）"),
     db: AsyncSession = Depends(get_db),
     current_user = Depends(AuthService.require_staff)
 ):
-    """搜索用户（员工端，用于给客户加卡时搜索）"""
+    """搜索用户（员工端，用于给客户加卡时搜索，结果按匹配程度排序）"""
     user_service = UserService(db)
     return await user_service.search_users(phone=phone, nickname=nickname)
 
@@ -4,6 +4,8 @@ Pydantic Schemas - 数据验证和序列化
 from app.schemas.user import *
 from app.schemas.store import *
 from app.schemas.card import *
+from app.schemas.transaction import *
 from app.schemas.schedule import *
 from app.schemas.appointment import *
 from app.schemas.auth import *
+from app.schemas.summary import *
@@ -2,7 +2,7 @@
 预约相关的Schema
 """
 from datetime import datetime, date
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 from app.models.card import ServiceType
@@ -54,7 +54,70 @@ class AppointmentDetail(AppointmentResponse):
     store: StoreResponse
 
 
+class AppointmentListItem(BaseModel):
+    """预约列表项（只含列表展示的列，门店和人员见 AppointmentPage 中的对照表）"""
+    id: int
+    customer_id: int
+    staff_id: int
+    store_id: int
+    service_type: ServiceType
+    service_count: int = 1
+    appointment_date: date
+    start_time: str
+    end_time: str
+    status: AppointmentStatus
+    notes: Optional[str] = None
+
+
+class StoreRef(BaseModel):
+    """门店简要信息"""
+    id: int
+    name: str
+
+
+class PersonRef(BaseModel):
+    """员工/客户简要信息"""
+    id: int
+    nickname: Optional[str] = None
+    real_name: Optional[str] = None
+    phone: Optional[str] = None
+
+
+class AppointmentPage(BaseModel):
+    """
+    预约列表的一页
+    
+    stores / staff / customers 以ID为键，每个门店和人员只出现一次；
+    next_cursor 为空表示没有下一页
+    """
+    items: List[AppointmentListItem]
+    stores: Dict[int, StoreRef] = {}
+    staff: Dict[int, PersonRef] = {}
+    customers: Dict[int, PersonRef] = {}
+    next_cursor: Optional[str] = None
+
+
 class AppointmentComplete(BaseModel):
     """完成预约（核销）"""
     user_card_id: int  # 使用哪张卡
     notes: Optional[str] = None
+
+
+class BatchCompleteItem(BaseModel):
+    """批量核销中的一项"""
+    appointment_id: int
+    user_card_id: int  # 使用哪张卡
+    notes: Optional[str] = None
+
+
+class BatchCompleteRequest(BaseModel):
+    """批量核销"""
+    items: List[BatchCompleteItem]
+
+
+class BatchCompleteResult(BaseModel):
+    """批量核销每一项的结果"""
+    appointment_id: int
+    success: bool
+    remaining_times: Optional[int] = None  # 核销后卡内剩余次数（无限次卡为空）
+    detail: Optional[str] = None  # 失败原因
@@ -1,9 +1,9 @@
 """
 卡相关的Schema
 """
-from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel
+from datetime import date, datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
 
 from app.models.card import ServiceType
 
@@ -83,3 +83,37 @@ class NewCustomerCardCreate(BaseModel):
     customer_phone: str  # 手机号用于绑定
     card_type_id: int
     services: Optional[list] = None  # 选择的服务类型列表
+
+
+class CardImportRow(BaseModel):
+    """批量导入的一行：一位客户的一张卡（同一手机号多行即多张卡）"""
+    name: Optional[str] = None  # 客户姓名
+    phone: str  # 手机号，已有客户按手机号匹配
+    card_type: str  # 卡类型ID或名称
+    remaining_times: Optional[int] = Field(None, ge=0)  # 剩余次数，空为卡类型的总次数
+    expire_date: Optional[date] = None  # 到期日，空按卡类型的有效期从导入时算起
+
+    @field_validator("phone")
+    @classmethod
+    def phone_must_be_valid(cls, v: str) -> str:
+        v = v.strip().replace(" ", "").replace("-", "")
+        if not v.isdigit() or not 5 <= len(v) <= 20:
+            raise ValueError("手机号格式不正确")
+        return v
+
+
+class CardImportError(BaseModel):
+    """导入失败的行"""
+    line: int  # 行号（CSV含表头行）
+    detail: str
+
+
+class CardImportProgress(BaseModel):
+    """批量导入进度（每处理完一批输出一次，最后一次 done 为真）"""
+    processed: int  # 已处理行数
+    created_users: int  # 新建客户数
+    matched_users: int  # 按手机号匹配到已有客户的行数
+    created_cards: int  # 开卡数
+    failed: int  # 失败行数
+    errors: List[CardImportError] = []  # 本批失败的行
+    done: bool = False
@@ -3,7 +3,7 @@
 """
 from datetime import datetime, date
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 
 from app.schemas.user import StaffSimple
 from app.schemas.store import StoreResponse
@@ -40,8 +40,9 @@ class ScheduleUpdate(BaseModel):
 
 
 class ScheduleResponse(ScheduleBase):
-    """排班响应"""
-    id: int
+    """排班响应（由模板展开的排班 id 为空、template_id 为模板ID）"""
+    id: Optional[int] = None
+    template_id: Optional[int] = None
     is_active: bool
     created_at: datetime
     
@@ -55,7 +56,61 @@ class ScheduleWithDetails(ScheduleResponse):
     store: StoreResponse
 
 
+class ScheduleTemplateCreate(BaseModel):
+    """创建每周排班模板"""
+    store_id: int
+    weekdays: List[int]  # 星期几上班，0为周一，6为周日
+    start_time: str
+    end_time: str
+    valid_from: date
+    valid_until: Optional[date] = None  # 为空表示长期有效
+
+    @field_validator("weekdays")
+    @classmethod
+    def weekdays_must_be_valid(cls, v: List[int]) -> List[int]:
+        if not v or any(day < 0 or day > 6 for day in v):
+            raise ValueError("星期需为0（周一）到6（周日）")
+        return sorted(set(v))
+
+
+class ScheduleTemplateResponse(BaseModel):
+    """排班模板响应"""
+    id: int
+    staff_id: int
+    store_id: int
+    weekdays: List[int]
+    start_time: str
+    end_time: str
+    valid_from: date
+    valid_until: Optional[date] = None
+    is_active: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class ScheduleExceptionCreate(BaseModel):
+    """排班模板例外日期"""
+    exception_date: date
+
+
 class AvailableStaff(BaseModel):
     """可预约的员工"""
     staff: StaffSimple
     available_times: List[str]  # 可用时间段列表，如 ["09:00", "09:30", "10:00"]
+
+
+class DayAvailability(BaseModel):
+    """某一天的可预约员工"""
+    work_date: date
+    available_staff: List[AvailableStaff]
+
+
+class EarliestSlot(BaseModel):
+    """最早可预约时段"""
+    work_date: date
+    start_time: str
+    store_id: int
+    store_name: str
+    staff: StaffSimple
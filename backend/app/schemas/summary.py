@@ -0,0 +1,20 @@
+"""
+汇总接口的Schema
+"""
+from typing import List
+from pydantic import BaseModel
+
+from app.schemas.appointment import AppointmentPage
+from app.schemas.card import UserCardSimple
+from app.schemas.transaction import RecentTransaction
+
+
+class CustomerSummary(BaseModel):
+    """
+    客户“我的”页面需要的全部数据
+    
+    appointments 是预约列表第一页，之后的页用 next_cursor 请求 /appointments/my-appointments/page
+    """
+    cards: List[UserCardSimple]
+    appointments: AppointmentPage
+    recent_transactions: List[RecentTransaction]
@@ -0,0 +1,62 @@
+"""
+消费记录（卡流水）相关的Schema
+"""
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+from app.models.card import ServiceType
+from app.models.transaction import TransactionType
+
+
+class LedgerEntry(BaseModel):
+    """一条卡流水，times_before / times_after 为变动前后的卡内次数（无限次卡为空）"""
+    id: int
+    user_card_id: int
+    appointment_id: Optional[int] = None
+    transaction_type: TransactionType
+    service_type: ServiceType
+    times_changed: int
+    times_before: Optional[int] = None
+    times_after: Optional[int] = None
+    operator_id: int
+    notes: Optional[str] = None
+    created_at: datetime
+
+
+class LedgerPage(BaseModel):
+    """卡流水的一页（新的在前），next_cursor 为空表示没有下一页"""
+    items: List[LedgerEntry]
+    next_cursor: Optional[str] = None
+
+
+class MonthlyConsumption(BaseModel):
+    """按月汇总的卡流水"""
+    month: str  # YYYY-MM
+    transactions: int  # 流水条数
+    times_consumed: int  # 消费次数
+    times_added: int  # 充值次数
+    times_refunded: int  # 退还次数
+
+
+class CardBalance(BaseModel):
+    """卡余额对账：按最新快照加之后的流水重建的次数与卡上记录的次数（无限次卡为空）"""
+    user_card_id: int
+    remaining_times: Optional[int] = None  # 卡上记录的次数
+    ledger_times: Optional[int] = None  # 快照 + 之后的流水重建的次数
+    snapshot_transaction_id: Optional[int] = None  # 所用快照包含的最后一条流水，没有快照为空
+    tail_transactions: int  # 快照之后的流水条数
+    last_transaction_id: int  # 最后一条流水，没有流水为0
+    transactions: int  # 流水总条数
+    consistent: bool
+
+
+class RecentTransaction(BaseModel):
+    """最近的一条卡流水（“我的”页面展示用）"""
+    id: int
+    user_card_id: int
+    card_name: str
+    transaction_type: TransactionType
+    service_type: ServiceType
+    times_changed: int
+    created_at: datetime
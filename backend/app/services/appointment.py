@@ -3,14 +3,26 @@
 """
 from datetime import date, datetime
 from typing import List, Optional
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_, func, insert, delete, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models.appointment import Appointment, AppointmentStatus
-from app.models.card import CardType, ServiceType
-from app.schemas.appointment import AppointmentCreate
+from app.models.card import UserCard
+from app.models.reservation import SlotReservation
+from app.models.store import Store
+from app.models.time_range import minutes_to_time, time_to_minutes
+from app.models.user import User
+from app.schemas.appointment import (
+    AppointmentCreate, AppointmentListItem, AppointmentPage, PersonRef, StoreRef,
+    BatchCompleteItem, BatchCompleteResult
+)
+from app.services.availability import availability_cache, reservation_slots
 from app.services.card import CardService
+from app.services.card_catalog import card_catalog
+from app.services.live import availability_broker
+from app.services.pagination import after_cursor, decode_cursor, encode_cursor
 
 
 class AppointmentService:
@@ -23,20 +35,9 @@ class AppointmentService:
         appointment_data: AppointmentCreate
     ) -> Optional[Appointment]:
         """创建预约"""
-        # 获取服务时长
-        duration = await self._get_service_duration(appointment_data.service_type)
-        end_time = self._calculate_end_time(appointment_data.start_time, duration)
-        
-        # 检查时间段是否可用
-        is_available = await self._check_time_available(
-            staff_id=appointment_data.staff_id,
-            appointment_date=appointment_data.appointment_date,
-            start_time=appointment_data.start_time,
-            end_time=end_time
-        )
-        
-        if not is_available:
-            return None
+        # 获取服务时长（服务规则表）
+        duration = (await card_catalog.rules(self.db)).duration(appointment_data.service_type)
+        start_minute = time_to_minutes(appointment_data.start_time)
         
         # 创建预约
         appointment = Appointment(
@@ -46,13 +47,23 @@ class AppointmentService:
             service_type=appointment_data.service_type,
             service_count=appointment_data.service_count,  # 服务数量（综合卡扣次用）
             appointment_date=appointment_data.appointment_date,
-            start_time=appointment_data.start_time,
-            end_time=end_time,
+            start_minute=start_minute,
+            end_minute=start_minute + duration,
             notes=appointment_data.notes,
             status=AppointmentStatus.CONFIRMED  # 直接确认
         )
-        self.db.add(appointment)
-        await self.db.flush()
+        
+        # 预约和时间槽占用在同一个保存点内写入，
+        # 时段已被占用时唯一约束冲突，整体回滚到保存点
+        try:
+            async with self.db.begin_nested():
+                self.db.add(appointment)
+                await self.db.flush()
+                await self._reserve_slots(appointment)
+        except IntegrityError:
+            return None
+        
+        self._availability_changed(appointment, "booked")
         await self.db.refresh(appointment)
         return appointment
     
@@ -70,7 +81,7 @@ class AppointmentService:
         if status:
             query = query.where(Appointment.status == status)
         
-        query = query.order_by(Appointment.appointment_date.desc(), Appointment.start_time.desc())
+        query = query.order_by(Appointment.appointment_date.desc(), Appointment.start_minute.desc())
         
         result = await self.db.execute(query)
         return result.scalars().all()
@@ -92,11 +103,143 @@ class AppointmentService:
         if status:
             query = query.where(Appointment.status == status)
         
-        query = query.order_by(Appointment.appointment_date, Appointment.start_time)
+        query = query.order_by(Appointment.appointment_date, Appointment.start_minute)
         
         result = await self.db.execute(query)
         return result.scalars().all()
     
+    async def list_customer_appointments(
+        self,
+        customer_id: int,
+        status: Optional[AppointmentStatus] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Optional[AppointmentPage]:
+        """
+        分页获取客户的预约列表（新的在前）
+        
+        游标无效时返回None
+        """
+        query = self._list_query(status).where(Appointment.customer_id == customer_id)
+        page = await self._list_page(query, cursor, limit, descending=True)
+        if page is None:
+            return None
+        page.stores = await self._store_refs({item.store_id for item in page.items})
+        page.staff = await self._person_refs(
+            {item.staff_id for item in page.items}, User.real_name
+        )
+        return page
+    
+    async def list_staff_appointments(
+        self,
+        staff_id: int,
+        appointment_date: Optional[date] = None,
+        status: Optional[AppointmentStatus] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Optional[AppointmentPage]:
+        """
+        分页获取员工的预约列表（按时间先后）
+        
+        游标无效时返回None
+        """
+        query = self._list_query(status).where(Appointment.staff_id == staff_id)
+        if appointment_date:
+            query = query.where(Appointment.appointment_date == appointment_date)
+        page = await self._list_page(query, cursor, limit, descending=False)
+        if page is None:
+            return None
+        page.stores = await self._store_refs({item.store_id for item in page.items})
+        page.customers = await self._person_refs(
+            {item.customer_id for item in page.items}, User.phone
+        )
+        return page
+    
+    def _list_query(self, status: Optional[AppointmentStatus]):
+        """预约列表只查询展示用的列"""
+        query = select(
+            Appointment.id,
+            Appointment.customer_id,
+            Appointment.staff_id,
+            Appointment.store_id,
+            Appointment.service_type,
+            Appointment.service_count,
+            Appointment.appointment_date,
+            Appointment.start_minute,
+            Appointment.end_minute,
+            Appointment.status,
+            Appointment.notes
+        )
+        if status:
+            query = query.where(Appointment.status == status)
+        return query
+    
+    async def _list_page(
+        self,
+        query,
+        cursor: Optional[str],
+        limit: int,
+        descending: bool
+    ) -> Optional[AppointmentPage]:
+        """按 (日期, 开始时间, id) 做 keyset 分页，多取一行判断是否有下一页"""
+        sort_columns = (Appointment.appointment_date, Appointment.start_minute, Appointment.id)
+        if cursor:
+            values = decode_cursor(cursor, (date, int, int))
+            if values is None:
+                return None
+            query = query.where(after_cursor(sort_columns, values, descending))
+        
+        order_by = [column.desc() for column in sort_columns] if descending else sort_columns
+        result = await self.db.execute(query.order_by(*order_by).limit(limit + 1))
+        rows = result.all()
+        
+        items = [
+            AppointmentListItem(
+                id=row.id,
+                customer_id=row.customer_id,
+                staff_id=row.staff_id,
+                store_id=row.store_id,
+                service_type=row.service_type,
+                service_count=row.service_count,
+                appointment_date=row.appointment_date,
+                start_time=minutes_to_time(row.start_minute),
+                end_time=minutes_to_time(row.end_minute),
+                status=row.status,
+                notes=row.notes
+            )
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor((last.appointment_date, last.start_minute, last.id))
+        return AppointmentPage(items=items, next_cursor=next_cursor)
+    
+    async def _store_refs(self, store_ids: set) -> dict:
+        """门店对照表"""
+        if not store_ids:
+            return {}
+        result = await self.db.execute(
+            select(Store.id, Store.name).where(Store.id.in_(store_ids))
+        )
+        return {row.id: StoreRef(id=row.id, name=row.name) for row in result.all()}
+    
+    async def _person_refs(self, user_ids: set, extra_column) -> dict:
+        """
+        人员对照表
+        
+        extra_column 为除昵称外要带上的列：员工用真实姓名，客户用手机号
+        """
+        if not user_ids:
+            return {}
+        result = await self.db.execute(
+            select(User.id, User.nickname, extra_column).where(User.id.in_(user_ids))
+        )
+        return {
+            row[0]: PersonRef(id=row[0], nickname=row[1], **{extra_column.key: row[2]})
+            for row in result.all()
+        }
+    
     async def cancel_appointment(self, appointment_id: int, user_id: int) -> bool:
         """取消预约"""
         result = await self.db.execute(
@@ -112,6 +255,8 @@ class AppointmentService:
             return False
         
         appointment.status = AppointmentStatus.CANCELLED
+        await self._release_slots(appointment.id)
+        self._availability_changed(appointment, "released")
         await self.db.flush()
         return True
     
@@ -138,12 +283,14 @@ class AppointmentService:
         if not appointment:
             return False
         
-        # 获取服务需要扣减的次数（综合卡根据预约时选择的服务数量扣次）
-        deduct_times = appointment.service_count if appointment.service_count else 1
+        # 扣减次数由卡类型决定（综合卡再按预约时选择的服务数量倍数扣减），
+        # 在扣卡的 UPDATE 中按卡类型计算，不用先查询卡
+        rules = await card_catalog.rules(self.db)
+        deduct_times = rules.deduct_times_expression(appointment.service_count)
         
         # 扣减卡次
         card_service = CardService(self.db)
-        remaining = await card_service.deduct_card(
+        transaction = await card_service.deduct_card(
             user_card_id=user_card_id,
             times=deduct_times,
             operator_id=operator_id,
@@ -152,17 +299,138 @@ class AppointmentService:
             notes=notes
         )
         
-        if remaining is None:
+        if transaction is None:
             return False
         
         # 更新预约状态
         appointment.status = AppointmentStatus.COMPLETED
         appointment.completed_at = datetime.utcnow()
         appointment.completed_by = operator_id
+        await self._release_slots(appointment.id)
+        self._availability_changed(appointment, "released")
         
         await self.db.flush()
         return True
     
+    async def complete_appointments_batch(
+        self,
+        items: List[BatchCompleteItem],
+        operator_id: int
+    ) -> List[BatchCompleteResult]:
+        """
+        批量核销
+        
+        1. 两次查询载入所有预约和卡，逐项检查（同一张卡按顺序累计扣减）
+        2. 一条 UPDATE 把检查通过的预约标记为已完成（只认仍为已确认的预约）
+        3. 一条 UPDATE 扣减所有卡、一条多行 INSERT 写消费记录（见 CardService.deduct_cards）
+        4. 一条 DELETE 释放时间槽
+        
+        全部在调用方的同一个事务中完成，返回与 items 顺序一致的逐项结果
+        """
+        now = datetime.utcnow()
+        results = [
+            BatchCompleteResult(appointment_id=item.appointment_id, success=False)
+            for item in items
+        ]
+        
+        appointments_result = await self.db.execute(
+            select(Appointment).where(
+                Appointment.id.in_({item.appointment_id for item in items}),
+                Appointment.status == AppointmentStatus.CONFIRMED
+            )
+        )
+        appointments = {appointment.id: appointment for appointment in appointments_result.scalars()}
+        cards_result = await self.db.execute(
+            select(
+                UserCard.id, UserCard.card_type_id, UserCard.is_active,
+                UserCard.expire_date, UserCard.remaining_times
+            ).where(UserCard.id.in_({item.user_card_id for item in items}))
+        )
+        cards = {card.id: card for card in cards_result.all()}
+        rules = await card_catalog.rules(self.db)
+        
+        # 逐项检查，次卡按提交顺序累计扣减
+        balances = {card.id: card.remaining_times for card in cards.values()}
+        planned = []  # (序号, 预约, 扣减次数)
+        for index, item in enumerate(items):
+            appointment = appointments.pop(item.appointment_id, None)  # 同一预约重复提交时只处理第一次
+            card = cards.get(item.user_card_id)
+            if appointment is None:
+                results[index].detail = "预约不存在或已处理"
+                continue
+            if card is None or not card.is_active:
+                results[index].detail = "卡不存在或已停用"
+                continue
+            times = rules.deduct_times(appointment.service_type, card.card_type_id, appointment.service_count)
+            if card.expire_date and card.expire_date < now:
+                results[index].detail = "卡已过期"
+            elif balances[card.id] is not None and balances[card.id] < times:
+                results[index].detail = "卡内次数不足"
+            else:
+                if balances[card.id] is not None:
+                    balances[card.id] -= times
+                planned.append((index, appointment, times))
+        if not planned:
+            return results
+        
+        # 标记完成：只认仍为已确认的预约，避免与其他核销请求重复扣卡
+        claimed_result = await self.db.execute(
+            update(Appointment)
+            .where(
+                Appointment.id.in_([appointment.id for _, appointment, _ in planned]),
+                Appointment.status == AppointmentStatus.CONFIRMED
+            )
+            .values(status=AppointmentStatus.COMPLETED, completed_at=now, completed_by=operator_id)
+            .returning(Appointment.id)
+        )
+        claimed = set(claimed_result.scalars().all())
+        for index, appointment, _ in planned:
+            if appointment.id not in claimed:
+                results[index].detail = "预约不存在或已处理"
+        planned = [entry for entry in planned if entry[1].id in claimed]
+        
+        records = await CardService(self.db).deduct_cards(
+            [
+                {
+                    "user_card_id": items[index].user_card_id,
+                    "times": times,
+                    "service_type": appointment.service_type,
+                    "appointment_id": appointment.id,
+                    "notes": items[index].notes,
+                }
+                for index, appointment, times in planned
+            ],
+            operator_id=operator_id
+        )
+        
+        completed, failed = [], []
+        for (index, appointment, _), record in zip(planned, records):
+            if record is None:
+                # 检查之后卡被并发扣减或停用，这一项撤回
+                results[index].detail = "卡内次数不足"
+                failed.append(appointment.id)
+            else:
+                results[index].success = True
+                results[index].remaining_times = record["times_after"]
+                completed.append(appointment)
+        
+        if failed:
+            await self.db.execute(
+                update(Appointment)
+                .where(Appointment.id.in_(failed))
+                .values(status=AppointmentStatus.CONFIRMED, completed_at=None, completed_by=None)
+            )
+        if completed:
+            await self.db.execute(
+                delete(SlotReservation).where(
+                    SlotReservation.appointment_id.in_([appointment.id for appointment in completed])
+                )
+            )
+            for appointment in completed:
+                self._availability_changed(appointment, "released")
+        
+        return results
+    
     async def get_staff_stats(
         self,
         staff_id: int,
@@ -205,65 +473,39 @@ class AppointmentService:
         
         return stats
     
-    async def _check_time_available(
-        self,
-        staff_id: int,
-        appointment_date: date,
-        start_time: str,
-        end_time: str
-    ) -> bool:
-        """检查时间段是否可用"""
-        # 查找是否有冲突的预约
-        result = await self.db.execute(
-            select(Appointment).where(
-                Appointment.staff_id == staff_id,
-                Appointment.appointment_date == appointment_date,
-                Appointment.status.in_([AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED]),
-                # 时间段重叠检查
-                Appointment.start_time < end_time,
-                Appointment.end_time > start_time
-            )
+    def _availability_changed(self, appointment: Appointment, event_type: str) -> None:
+        """失效可预约时段缓存，并在提交后推送给订阅该门店当天的客户端"""
+        availability_cache.invalidate_on_commit(
+            self.db, appointment.store_id, appointment.appointment_date
+        )
+        availability_broker.publish_on_commit(
+            self.db, appointment.store_id, appointment.appointment_date,
+            {
+                "type": event_type,
+                "staff_id": appointment.staff_id,
+                "start_time": appointment.start_time,
+                "end_time": appointment.end_time,
+            }
         )
-        existing = result.scalar_one_or_none()
-        return existing is None
-    
-    async def _get_service_duration(self, service_type: ServiceType) -> int:
-        """获取服务时长（分钟）"""
-        duration_map = {
-            ServiceType.WASH: 30,
-            ServiceType.SOAK: 50,
-            ServiceType.CARE: 50,
-            ServiceType.COMBO: 50,
-        }
-        return duration_map.get(service_type, 30)
     
-    async def _get_deduct_times(self, service_type: ServiceType, user_card_id: int) -> int:
-        """
-        获取需要扣减的次数
-        
-        综合卡做泡头或养发扣2次，其他扣1次
-        """
-        # 查询用户卡的类型
-        from app.models.card import UserCard
-        result = await self.db.execute(
-            select(UserCard).options(selectinload(UserCard.card_type)).where(UserCard.id == user_card_id)
+    async def _reserve_slots(self, appointment: Appointment) -> None:
+        """占用预约覆盖的时间槽（冲突时抛出 IntegrityError）"""
+        slots = reservation_slots(appointment.start_minute, appointment.end_minute)
+        await self.db.execute(
+            insert(SlotReservation),
+            [
+                {
+                    "staff_id": appointment.staff_id,
+                    "appointment_id": appointment.id,
+                    "slot_date": appointment.appointment_date,
+                    "slot_index": slot_index,
+                }
+                for slot_index in slots
+            ]
         )
-        user_card = result.scalar_one_or_none()
-        
-        if not user_card:
-            return 1
-        
-        # 综合卡做泡头或养发扣2次
-        if user_card.card_type.service_type == ServiceType.COMBO:
-            if service_type in [ServiceType.SOAK, ServiceType.CARE]:
-                return 2
-        
-        return 1
     
-    def _calculate_end_time(self, start_time: str, duration: int) -> str:
-        """计算结束时间"""
-        hours, minutes = map(int, start_time.split(':'))
-        total_minutes = hours * 60 + minutes + duration
-        end_hours = total_minutes // 60
-        end_minutes = total_minutes % 60
-        return f"{end_hours:02d}:{end_minutes:02d}"
+    async def _release_slots(self, appointment_id: int) -> None:
+        """释放预约占用的时间槽"""
+        await self.db.execute(
+            delete(SlotReservation).where(SlotReservation.appointment_id == appointment_id)
+        )
@@ -3,7 +3,6 @@
 """
 from datetime import datetime, timedelta
 from typing import Optional
-import httpx
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -13,6 +12,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
 from app.database import get_db
 from app.models.user import User, UserRole
+from app.services.token_revocation import revoke_user_tokens, token_revocations
+from app.services.user_cache import CachedUser, user_cache
+from app.services.wechat import wechat_client
 
 
 security = HTTPBearer()
@@ -49,7 +51,7 @@ class AuthService:
         user = await self._get_or_create_user(openid, role, name, None)
         
         # 生成token
-        token = self._create_access_token(user.id, user.openid)
+        token = self._create_access_token(user.id, user.openid, user.role, user.token_version)
         
         return {
             "access_token": token,
@@ -87,7 +89,7 @@ class AuthService:
         user = await self._get_or_create_user(openid, role, nickname, avatar_url)
         
         # 生成token
-        token = self._create_access_token(user.id, user.openid)
+        token = self._create_access_token(user.id, user.openid, user.role, user.token_version)
         
         return {
             "access_token": token,
@@ -101,7 +103,11 @@ class AuthService:
         role: str = "customer",
         nickname: Optional[str] = None
     ) -> Optional[str]:
-        """调用微信API获取openid"""
+        """
+        调用微信API获取openid
+        
+        code 无效返回None；微信暂时不可用时抛出 WechatUnavailableError
+        """
         # 开发环境：使用固定的openid（方便测试）
         if settings.DEBUG and not settings.WECHAT_APP_ID:
             # 用姓名作为唯一标识，这样同一个名字就是同一个账号
@@ -111,22 +117,9 @@ class AuthService:
             # 如果没有姓名，用code（每次可能不同）
             return f"dev_{role}_{code}"
         
-        # 生产环境：调用微信API
-        url = "https://api.weixin.qq.com/sns/jscode2session"
-        params = {
-            "appid": settings.WECHAT_APP_ID,
-            "secret": settings.WECHAT_APP_SECRET,
-            "js_code": code,
-            "grant_type": "authorization_code"
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-            data = response.json()
-            
-            if "openid" in data:
-                return data["openid"]
-            return None
+        # 生产环境：调用微信API（共享连接池，超时重试和熔断见 WechatClient）
+        data = await wechat_client.code2session(settings.WECHAT_APP_ID, settings.WECHAT_APP_SECRET, code)
+        return data["openid"] if data else None
     
     async def _get_or_create_user(
         self, 
@@ -164,6 +157,8 @@ class AuthService:
             # 如果选择了员工角色且密码正确，升级为员工
             if role == "staff" and user.role == UserRole.CUSTOMER:
                 user.role = UserRole.STAFF
+                # 之前以客户身份签发的token失效
+                revoke_user_tokens(self.db, user)
                 if nickname:
                     user.real_name = nickname
             
@@ -172,48 +167,41 @@ class AuthService:
         
         return user
     
-    def _create_access_token(self, user_id: int, openid: str) -> str:
-        """创建JWT token"""
+    def _create_access_token(
+        self,
+        user_id: int,
+        openid: str,
+        role: Optional[UserRole] = None,
+        token_version: Optional[int] = None
+    ) -> str:
+        """
+        创建JWT token
+        
+        带上角色和凭证版本时，认证直接使用token中的声明，不查询数据库
+        """
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         to_encode = {
             "sub": str(user_id),
             "openid": openid,
             "exp": expire
         }
+        if role is not None and token_version is not None:
+            to_encode["role"] = role.value
+            to_encode["ver"] = token_version
         return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     
     @staticmethod
     async def get_current_user(
         credentials: HTTPAuthorizationCredentials = Depends(security),
         db: AsyncSession = Depends(get_db)
-    ) -> User:
-        """获取当前用户（从token解析）"""
-        token = credentials.credentials
-        
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-            user_id = int(payload.get("sub"))
-        except (JWTError, ValueError):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的认证凭证"
-            )
-        
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        
-        if not user or not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="用户不存在或已禁用"
-            )
-        
-        return user
+    ) -> CachedUser:
+        """获取当前用户（从token解析），返回认证用到的用户列"""
+        return await _authenticate(credentials.credentials, db)
     
     @staticmethod
     async def require_staff(
-        current_user: User = Depends(get_current_user)
-    ) -> User:
+        current_user: CachedUser = Depends(get_current_user)
+    ) -> CachedUser:
         """要求员工权限"""
         if current_user.role not in [UserRole.STAFF, UserRole.ADMIN]:
             raise HTTPException(
@@ -224,8 +212,8 @@ class AuthService:
     
     @staticmethod
     async def require_admin(
-        current_user: User = Depends(get_current_user)
-    ) -> User:
+        current_user: CachedUser = Depends(get_current_user)
+    ) -> CachedUser:
         """要求管理员权限"""
         if current_user.role != UserRole.ADMIN:
             raise HTTPException(
@@ -236,24 +224,41 @@ class AuthService:
 
 
 # 辅助函数（用于依赖注入）
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    """获取当前用户（从token解析）"""
-    token = credentials.credentials
+async def _authenticate(token: str, db: AsyncSession) -> CachedUser:
+    """
+    解析token并确认用户存在且未禁用
     
+    带角色和凭证版本的token只核对吊销记录，不查询数据库；
+    旧token先查已认证用户缓存，未命中才查询数据库
+    """
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id = int(payload.get("sub"))
-    except (JWTError, ValueError):
+        role = UserRole(payload["role"]) if "role" in payload else None
+        version = int(payload["ver"]) if "ver" in payload else None
+    except (JWTError, ValueError, TypeError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="无效的认证凭证"
         )
     
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    if role is not None and version is not None:
+        if token_revocations.is_revoked(user_id, version):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="登录已失效，请重新登录"
+            )
+        return CachedUser(id=user_id, openid=payload.get("openid"), role=role, is_active=True)
+    
+    user = user_cache.get(user_id)
+    if user is None:
+        generation = user_cache.generation()
+        row = (await db.execute(
+            select(User.id, User.openid, User.role, User.is_active).where(User.id == user_id)
+        )).first()
+        if row is not None:
+            user = CachedUser(*row)
+            user_cache.put(user, generation)
     
     if not user or not user.is_active:
         raise HTTPException(
@@ -264,9 +269,17 @@ async def get_current_user(
     return user
 
 
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> CachedUser:
+    """获取当前用户（从token解析），返回认证用到的用户列"""
+    return await _authenticate(credentials.credentials, db)
+
+
 async def require_staff(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CachedUser = Depends(get_current_user)
+) -> CachedUser:
     """要求员工权限"""
     if current_user.role not in [UserRole.STAFF, UserRole.ADMIN]:
         raise HTTPException(
@@ -277,8 +290,8 @@ async def require_staff(
 
 
 async def require_admin(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CachedUser = Depends(get_current_user)
+) -> CachedUser:
     """要求管理员权限"""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -0,0 +1,218 @@
+"""
+可预约时段计算
+
+以30分钟为一个时间槽，把员工一天的排班用整数位图表示：
+第 i 位代表 [排班开始 + 30*i, 排班开始 + 30*(i+1)) 这个时间槽。
+已有预约覆盖到的槽位置 1，可用开始时间通过位运算一次求出。
+"""
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.database import run_after_commit
+from app.models.time_range import minutes_to_time
+
+
+SLOT_MINUTES = 30  # 时间槽长度（分钟）
+RESERVATION_SLOT_MINUTES = 5  # 预约占用槽长度（分钟），见 SlotReservation
+
+
+def _ceil_slots(minutes: int) -> int:
+    """分钟数向上取整为槽位数"""
+    return -(-minutes // SLOT_MINUTES)
+
+
+def occupied_mask(origin: int, intervals: Iterable[Tuple[int, int]]) -> int:
+    """
+    计算已占用槽位的位图
+
+    origin 为位图第0位对应的分钟数（排班开始时间），
+    intervals 为已有预约的 (开始分钟, 结束分钟) 列表
+    """
+    mask = 0
+    for start, end in intervals:
+        if end <= origin or end <= start:
+            continue
+        first = max(start - origin, 0) // SLOT_MINUTES
+        last = _ceil_slots(end - origin)
+        mask |= ((1 << (last - first)) - 1) << first
+    return mask
+
+
+def free_start_mask(start: int, end: int, duration: int, busy: int = 0) -> int:
+    """
+    计算可作为预约开始时间的槽位位图
+
+    第 i 位为 1 表示从 start + 30*i 开始、持续 duration 分钟的服务
+    不与已占用槽位冲突且不超过排班结束时间
+    """
+    if end - start < duration:
+        return 0
+
+    span = _ceil_slots(end - start)
+    free = ((1 << span) - 1) & ~busy
+
+    # 连续 need 个空闲槽位：把空闲位图右移后逐次按位与
+    need = max(_ceil_slots(duration), 1)
+    runs = free
+    for shift in range(1, need):
+        runs &= free >> shift
+
+    last_start = (end - start - duration) // SLOT_MINUTES
+    return runs & ((1 << (last_start + 1)) - 1)
+
+
+def reservation_slots(start: int, end: int) -> range:
+    """预约 [start, end) 覆盖的占用槽序号（从0点起算）"""
+    return range(start // RESERVATION_SLOT_MINUTES, -(-end // RESERVATION_SLOT_MINUTES))
+
+
+def mask_to_minutes(origin: int, mask: int) -> List[int]:
+    """把位图展开为分钟数列表（升序）"""
+    minutes = []
+    while mask:
+        lowest = mask & -mask
+        minutes.append(origin + (lowest.bit_length() - 1) * SLOT_MINUTES)
+        mask ^= lowest
+    return minutes
+
+
+def mask_to_times(origin: int, mask: int) -> List[str]:
+    """把位图展开为时间字符串列表（升序）"""
+    return [minutes_to_time(m) for m in mask_to_minutes(origin, mask)]
+
+
+class AvailabilityCache:
+    """
+    可预约时段缓存（进程内LRU）
+    
+    键为 (门店ID, 日期, 服务时长)，按 (门店ID, 日期) 建立索引，
+    预约和排班的写操作只失效受影响那一天的条目；
+    排班模板影响门店的所有日期，按门店整体失效。
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[int, date, int], Tuple[float, Any]]" = OrderedDict()
+        self._day_keys: Dict[Tuple[int, date], Set[Tuple[int, date, int]]] = {}
+        # 失效时钟：每次失效加一，并记下每天、每个门店最后一次失效时的时钟。
+        # 计算前记下当前时钟，写入时该天或该门店在此之后失效过，说明期间有写操作，放弃写入
+        self._clock = 0
+        # 按失效先后排列，最多保留 maxsize 天，最早的记录淘汰后抬高 _floor
+        self._day_invalidated: "OrderedDict[Tuple[int, date], int]" = OrderedDict()
+        self._store_invalidated: Dict[int, int] = {}  # 门店数有限，不需要淘汰
+        self._floor = 0  # 早于它开始的计算一律不写入（淘汰掉的失效记录都不晚于它）
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def generation(self, store_id: int, work_date: date) -> int:
+        """当前失效时钟，计算前获取并在 put 时传回"""
+        return self._clock
+    
+    def get(self, store_id: int, work_date: date, service_duration: int) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回None"""
+        key = (store_id, work_date, service_duration)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def put(
+        self,
+        store_id: int,
+        work_date: date,
+        service_duration: int,
+        value: Any,
+        generation: int
+    ) -> None:
+        """写入缓存（计算期间该天被失效过则不写入）"""
+        if (
+            generation < self._floor
+            or self._store_invalidated.get(store_id, 0) > generation
+            or self._day_invalidated.get((store_id, work_date), 0) > generation
+        ):
+            return
+        key = (store_id, work_date, service_duration)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._day_keys.setdefault((store_id, work_date), set()).add(key)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    def invalidate(self, store_id: int, work_date: Optional[date] = None) -> None:
+        """失效某门店某天的所有缓存，不传日期时失效该门店所有日期"""
+        self._clock += 1
+        if work_date is None:
+            self._store_invalidated[store_id] = self._clock
+            days = [day for day in self._day_keys if day[0] == store_id]
+        else:
+            day = (store_id, work_date)
+            self._day_invalidated[day] = self._clock
+            self._day_invalidated.move_to_end(day)
+            while len(self._day_invalidated) > self.maxsize:
+                _, invalidated_at = self._day_invalidated.popitem(last=False)
+                self._floor = invalidated_at
+            days = [day]
+        for day in days:
+            for key in self._day_keys.pop(day, ()):
+                self._entries.pop(key, None)
+        self.invalidations += 1
+    
+    def invalidate_on_commit(self, db, store_id: int, work_date: Optional[date] = None) -> None:
+        """
+        写操作调用：立即失效，并在事务提交后再失效一次
+        
+        第二次失效覆盖提交前其他请求读到旧数据并回填缓存的情况
+        """
+        self.invalidate(store_id, work_date)
+        run_after_commit(db, lambda: self.invalidate(store_id, work_date))
+    
+    def clear(self) -> None:
+        """清空缓存（正在进行的计算也不再写入）"""
+        self._entries.clear()
+        self._day_keys.clear()
+        self._day_invalidated.clear()
+        self._store_invalidated.clear()
+        self._clock += 1
+        self._floor = self._clock
+    
+    def stats(self) -> dict:
+        """命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "invalidated_days": len(self._day_invalidated),
+        }
+    
+    def _remove(self, key: Tuple[int, date, int]) -> None:
+        self._entries.pop(key, None)
+        day_keys = self._day_keys.get(key[:2])
+        if day_keys is not None:
+            day_keys.discard(key)
+            if not day_keys:
+                del self._day_keys[key[:2]]
+
+
+# 全局单例
+availability_cache = AvailabilityCache(
+    maxsize=settings.AVAILABILITY_CACHE_SIZE,
+    ttl=settings.AVAILABILITY_CACHE_TTL,
+)
@@ -1,16 +1,18 @@
 """
 卡管理服务
 """
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import List, Optional
-from sqlalchemy import select
+from typing import List, Optional, Union
+from sqlalchemy import select, insert, update, or_, case, literal, Integer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.elements import ColumnElement
 
 from app.models.card import CardType, UserCard, ServiceType
 from app.models.user import User, UserRole
-from app.models.transaction import Transaction, TransactionType
-from app.schemas.card import CardTypeCreate, UserCardSimple
+from app.models.transaction import Transaction, TransactionType, CardBalanceSnapshot
+from app.schemas.card import CardTypeCreate, CardTypeResponse, UserCardResponse, UserCardSimple
+from app.services.card_catalog import card_catalog
 
 
 class CardService:
@@ -19,12 +21,9 @@ class CardService:
     
     # ============ 卡类型 ============
     
-    async def get_card_types(self) -> List[CardType]:
-        """获取所有卡类型"""
-        result = await self.db.execute(
-            select(CardType).where(CardType.is_active == True)
-        )
-        return result.scalars().all()
+    async def get_card_types(self) -> List[CardTypeResponse]:
+        """获取所有有效卡类型（读卡类型目录）"""
+        return (await card_catalog.current(self.db)).active
     
     async def create_card_type(self, card_type_data: CardTypeCreate) -> CardType:
         """创建卡类型"""
@@ -32,27 +31,37 @@ class CardService:
         self.db.add(card_type)
         await self.db.flush()
         await self.db.refresh(card_type)
+        card_catalog.invalidate_on_commit(self.db)
         return card_type
     
     # ============ 用户持卡 ============
     
-    async def get_user_cards(self, user_id: int) -> List[UserCardSimple]:
-        """获取用户的卡列表"""
-        result = await self.db.execute(
-            select(UserCard)
-            .options(selectinload(UserCard.card_type))
-            .where(UserCard.user_id == user_id, UserCard.is_active == True)
-        )
-        user_cards = result.scalars().all()
+    async def get_user_cards(self, user_id: int, live_only: bool = False) -> List[UserCardSimple]:
+        """
+        获取用户的卡列表
         
+        live_only 时只返回可用的卡（未过期），沿 ix_user_cards_user_status 组合索引查询
+        """
         now = datetime.utcnow()
+        query = select(UserCard).where(UserCard.user_id == user_id, UserCard.is_active == True)
+        if live_only:
+            # 已标记过期的卡由索引排除；上次扫描之后才到期的卡按有效期再筛一次
+            query = query.where(
+                UserCard.is_expired == False,
+                or_(UserCard.expire_date.is_(None), UserCard.expire_date >= now)
+            )
+        result = await self.db.execute(query)
+        user_cards = result.scalars().all()
+        card_types = await card_catalog.types_for(self.db, {uc.card_type_id for uc in user_cards})
+        
         card_list = []
         for uc in user_cards:
-            is_expired = uc.expire_date and uc.expire_date < now
+            is_expired = uc.is_expired or bool(uc.expire_date and uc.expire_date < now)
+            card_type = card_types[uc.card_type_id]
             card_list.append(UserCardSimple(
                 id=uc.id,
-                card_name=uc.card_type.name,
-                service_type=uc.card_type.service_type,
+                card_name=card_type.name,
+                service_type=card_type.service_type,
                 remaining_times=uc.remaining_times,
                 expire_date=uc.expire_date,
                 is_active=uc.is_active,
@@ -66,17 +75,14 @@ class CardService:
         user_id: int, 
         card_type_id: int, 
         created_by: int
-    ) -> UserCard:
+    ) -> UserCardResponse:
         """
         给用户开卡
         
         根据卡类型自动设置有效期和次数
         """
         # 获取卡类型
-        result = await self.db.execute(
-            select(CardType).where(CardType.id == card_type_id)
-        )
-        card_type = result.scalar_one_or_none()
+        card_type = await card_catalog.get(self.db, card_type_id)
         if not card_type:
             raise ValueError("卡类型不存在")
         
@@ -95,67 +101,146 @@ class CardService:
         )
         self.db.add(user_card)
         await self.db.flush()
+        # 开卡余额作为第一个快照（对账的起点）
+        self.db.add(CardBalanceSnapshot(
+            user_card_id=user_card.id,
+            last_transaction_id=0,
+            remaining_times=user_card.remaining_times
+        ))
         
-        # 加载关联的card_type
-        await self.db.refresh(user_card, ["card_type"])
-        
-        return user_card
+        return UserCardResponse(
+            id=user_card.id,
+            user_id=user_card.user_id,
+            card_type_id=user_card.card_type_id,
+            remaining_times=user_card.remaining_times,
+            expire_date=user_card.expire_date,
+            is_active=user_card.is_active,
+            created_at=user_card.created_at,
+            card_type=card_type
+        )
     
     async def deduct_card(
         self, 
         user_card_id: int, 
-        times: int, 
+        times: Union[int, ColumnElement], 
         operator_id: int,
         service_type: Optional[ServiceType] = None,
         appointment_id: Optional[int] = None,
         notes: Optional[str] = None
-    ) -> Optional[int]:
+    ) -> Optional[Transaction]:
         """
         扣减卡次
         
-        返回剩余次数，失败返回None
+        用一条带条件的 UPDATE 完成检查和扣减（卡有效、未过期、次数足够），
+        并发核销同一张卡时由数据库保证不会超扣或丢失更新。
+        times 也可以是按卡类型计算的SQL表达式（见 ServiceRules.deduct_times_expression），
+        实际扣减次数从 RETURNING 取回。
+        返回消费记录（times_after 为剩余次数，无限次卡为None），失败返回None
         """
+        now = datetime.utcnow()
         result = await self.db.execute(
-            select(UserCard)
-            .options(selectinload(UserCard.card_type))
-            .where(UserCard.id == user_card_id)
+            update(UserCard)
+            .where(UserCard.id == user_card_id, *self._deductible(times, now))
+            .values(remaining_times=UserCard.remaining_times - times)
+            .returning(
+                UserCard.user_id, UserCard.remaining_times, UserCard.card_type_id,
+                times if isinstance(times, ColumnElement) else literal(times, Integer)
+            )
         )
-        user_card = result.scalar_one_or_none()
-        
-        if not user_card or not user_card.is_active:
+        row = result.first()
+        if row is None:
             return None
         
-        # 检查是否过期
-        if user_card.expire_date and user_card.expire_date < datetime.utcnow():
-            return None
+        times_after, times = row[1], row[3]
+        if service_type is None:
+            # 未指定服务类型时取卡类型的服务类型
+            service_type = (await card_catalog.get(self.db, row[2])).service_type
         
-        # 检查次数是否足够（无限次卡不检查）
-        times_before = user_card.remaining_times
-        if user_card.remaining_times is not None:
-            if user_card.remaining_times < times:
-                return None
-            user_card.remaining_times -= times
+        # 记录交易
+        return await self.db.scalar(
+            insert(Transaction)
+            .values(
+                customer_id=row[0],
+                user_card_id=user_card_id,
+                appointment_id=appointment_id,
+                transaction_type=TransactionType.CONSUME,
+                service_type=service_type,
+                times_changed=-times,
+                times_before=None if times_after is None else times_after + times,
+                times_after=times_after,
+                operator_id=operator_id,
+                notes=notes
+            )
+            .returning(Transaction)
+        )
+    
+    async def deduct_cards(
+        self,
+        deductions: List[dict],
+        operator_id: int
+    ) -> List[Optional[dict]]:
+        """
+        批量扣减卡次（批量核销用）
+        
+        deductions 每项包含 user_card_id / times / service_type / appointment_id / notes。
+        同一张卡的多项合并扣减：一条按卡ID取 CASE 的条件 UPDATE 扣减所有卡，
+        一条多行 INSERT 写入消费记录。某张卡不满足扣减条件时，该卡的所有项都失败。
+        返回与 deductions 一一对应的消费记录字段，失败为None
+        """
+        if not deductions:
+            return []
         
-        times_after = user_card.remaining_times
+        totals = defaultdict(int)
+        for deduction in deductions:
+            totals[deduction["user_card_id"]] += deduction["times"]
+        total_times = case(totals, value=UserCard.id)
         
-        # 记录交易
-        transaction = Transaction(
-            customer_id=user_card.user_id,
-            user_card_id=user_card_id,
-            appointment_id=appointment_id,
-            transaction_type=TransactionType.CONSUME,
-            service_type=service_type or user_card.card_type.service_type,
-            times_changed=-times,
-            times_before=times_before,
-            times_after=times_after,
-            operator_id=operator_id,
-            notes=notes
+        result = await self.db.execute(
+            update(UserCard)
+            .where(UserCard.id.in_(totals), *self._deductible(total_times, datetime.utcnow()))
+            .values(remaining_times=UserCard.remaining_times - total_times)
+            .returning(UserCard.id, UserCard.user_id, UserCard.remaining_times)
         )
-        self.db.add(transaction)
+        # 扣减成功的卡：(客户ID, 扣减前次数)，逐项往后推算每条记录的前后次数
+        balances = {
+            card_id: (user_id, None if remaining is None else remaining + totals[card_id])
+            for card_id, user_id, remaining in result.all()
+        }
         
-        await self.db.flush()
+        records = []
+        for deduction in deductions:
+            card_id = deduction["user_card_id"]
+            if card_id not in balances:
+                records.append(None)
+                continue
+            user_id, times_before = balances[card_id]
+            times_after = None if times_before is None else times_before - deduction["times"]
+            balances[card_id] = (user_id, times_after)
+            records.append({
+                "customer_id": user_id,
+                "user_card_id": card_id,
+                "appointment_id": deduction.get("appointment_id"),
+                "transaction_type": TransactionType.CONSUME,
+                "service_type": deduction["service_type"],
+                "times_changed": -deduction["times"],
+                "times_before": times_before,
+                "times_after": times_after,
+                "operator_id": operator_id,
+                "notes": deduction.get("notes"),
+            })
         
-        return user_card.remaining_times
+        rows = [record for record in records if record is not None]
+        if rows:
+            await self.db.execute(insert(Transaction), rows)
+        return records
+    
+    def _deductible(self, times, now: datetime) -> list:
+        """可扣减条件：卡有效、未过期、次数够扣（无限次卡 remaining_times 为NULL，扣减后仍为NULL）"""
+        return [
+            UserCard.is_active == True,
+            or_(UserCard.expire_date.is_(None), UserCard.expire_date >= now),
+            or_(UserCard.remaining_times.is_(None), UserCard.remaining_times >= times),
+        ]
     
     async def create_new_customer_card(
         self,
@@ -163,7 +248,7 @@ class CardService:
         customer_phone: str,
         card_type_id: int,
         created_by: int
-    ) -> UserCard:
+    ) -> UserCardResponse:
         """
         新客户开卡
         
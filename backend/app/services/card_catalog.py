@@ -0,0 +1,157 @@
+"""
+卡类型目录
+
+卡类型只有管理员新建时才会变化，进程内缓存一份全部卡类型的快照，
+卡类型列表、开卡、扣卡等需要卡类型信息的地方都从快照读取，不再查询 card_types。
+
+快照的版本号（ETag）是有效卡类型列表内容的哈希，多进程部署时各进程内容相同则版本号相同，
+客户端带 If-None-Match 请求时未变化直接返回304。
+服务规则表（服务时长、扣减次数）随快照一起构建，见 service_rules。
+新建卡类型在事务提交后失效快照，下次访问时重新加载；
+其他进程的修改由 CARD_CATALOG_TTL 兜底。
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import run_after_commit
+from app.models.card import CardType
+from app.schemas.card import CardTypeResponse
+from app.services.service_rules import ServiceRules
+
+
+class CatalogSnapshot(NamedTuple):
+    """一次加载的卡类型快照（只读）"""
+    types: Dict[int, CardTypeResponse]  # 全部卡类型（含已停用，老卡仍要用）
+    active: List[CardTypeResponse]  # 有效卡类型（卡类型列表接口返回）
+    rules: ServiceRules  # 服务规则表
+    body: bytes  # active 的 JSON
+    etag: str
+    loaded_at: float  # time.monotonic()
+
+
+class CardCatalog:
+    """卡类型目录（进程内，带版本号）"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._generation = 0  # 失效代数：加载期间被失效过则加载结果不算最新
+        self._loaded_generation = -1
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    async def current(self, db: AsyncSession) -> CatalogSnapshot:
+        """当前快照，未加载、已失效或已过期时重新加载"""
+        snapshot = self._snapshot
+        if snapshot is not None and self._is_fresh(snapshot):
+            self.hits += 1
+            return snapshot
+        async with self._lock:
+            # 等锁期间其他请求可能已经加载好
+            snapshot = self._snapshot
+            if snapshot is not None and self._is_fresh(snapshot):
+                self.hits += 1
+                return snapshot
+            return await self.load(db)
+
+    async def get(self, db: AsyncSession, card_type_id: int) -> Optional[CardTypeResponse]:
+        """
+        按ID获取卡类型，不存在返回None
+        
+        快照中没有时重新加载一次（可能是其他进程刚新建的卡类型）
+        """
+        card_type = (await self.current(db)).types.get(card_type_id)
+        if card_type is None:
+            self.invalidate()
+            card_type = (await self.current(db)).types.get(card_type_id)
+        return card_type
+
+    async def types_for(self, db: AsyncSession, card_type_ids: Iterable[int]) -> Dict[int, CardTypeResponse]:
+        """
+        包含给定ID的卡类型快照（ID -> 卡类型）
+        
+        有ID不在快照中时重新加载一次（可能是其他进程刚新建的卡类型并已开卡）
+        """
+        types = (await self.current(db)).types
+        if any(card_type_id not in types for card_type_id in card_type_ids):
+            self.invalidate()
+            types = (await self.current(db)).types
+        return types
+
+    async def rules(self, db: AsyncSession) -> ServiceRules:
+        """当前的服务规则表"""
+        return (await self.current(db)).rules
+
+    async def load(self, db: AsyncSession) -> CatalogSnapshot:
+        """从数据库加载全部卡类型（启动时调用一次）"""
+        generation = self._generation
+        result = await db.execute(select(CardType).order_by(CardType.id))
+        types = {
+            card_type.id: CardTypeResponse.model_validate(card_type)
+            for card_type in result.scalars()
+        }
+        active = [card_type for card_type in types.values() if card_type.is_active]
+        body = json.dumps(jsonable_encoder(active), ensure_ascii=False, separators=(",", ":")).encode()
+        snapshot = CatalogSnapshot(
+            types=types,
+            active=active,
+            rules=ServiceRules(types.values()),
+            body=body,
+            etag=f'"{hashlib.sha1(body).hexdigest()}"',
+            loaded_at=time.monotonic(),
+        )
+        self._snapshot = snapshot
+        self._loaded_generation = generation
+        self.loads += 1
+        return snapshot
+
+    def invalidate(self) -> None:
+        """失效快照，下次访问时重新加载"""
+        self._generation += 1
+        self.invalidations += 1
+
+    def invalidate_on_commit(self, db: AsyncSession) -> None:
+        """写操作调用：事务提交后失效快照"""
+        run_after_commit(db, self.invalidate)
+
+    def stats(self) -> dict:
+        """命中统计"""
+        snapshot = self._snapshot
+        return {
+            "card_types": len(snapshot.types) if snapshot else 0,
+            "etag": snapshot.etag if snapshot else None,
+            "service_rules": snapshot.rules.stats() if snapshot else None,
+            "hits": self.hits,
+            "loads": self.loads,
+            "invalidations": self.invalidations,
+        }
+
+    def _is_fresh(self, snapshot: CatalogSnapshot) -> bool:
+        return (
+            self._loaded_generation == self._generation
+            and time.monotonic() - snapshot.loaded_at < self.ttl
+        )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否匹配（支持多个值、弱校验和 *）"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(
+        value.removeprefix("W/") == etag for value in candidates
+    )
+
+
+# 全局单例
+card_catalog = CardCatalog(ttl=settings.CARD_CATALOG_TTL)
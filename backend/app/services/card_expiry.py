@@ -0,0 +1,131 @@
+"""
+卡过期扫描
+
+进程内后台任务，定期把到期的卡批量标记为 is_expired，
+之后查询有效卡只需按 (user_id, is_active, is_expired) 索引过滤，不用逐张比较有效期；
+待扫描的卡由部分索引 ix_user_cards_expiring 定位，已标记的卡不再参与扫描。
+
+每批最多标记 CARD_EXPIRY_SWEEP_CHUNK 张卡，一批一个短事务（一条 UPDATE 后立即提交），
+批与批之间暂停片刻让等待写锁的预约和核销先执行，不会长时间持有写锁。
+扣卡仍以 expire_date 为准，两次扫描之间刚到期的卡也不能扣减。
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models.card import UserCard
+
+
+class CardExpirySweeper:
+    """卡过期扫描（进程内后台任务）"""
+
+    def __init__(
+        self,
+        interval: float,
+        chunk_size: int,
+        pause: float = 0.05,
+        session_maker: async_sessionmaker = async_session_maker
+    ):
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.pause = pause  # 批与批之间的间隔（秒），让等待写锁的请求先执行
+        self.session_maker = session_maker
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.marked = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_marked = 0
+        self.last_chunks = 0
+        self.last_duration_ms = 0.0
+        self.max_chunk_ms = 0.0  # 单批（单个写事务）最长耗时
+        self.errors = 0
+
+    async def sweep(self, now: Optional[datetime] = None) -> int:
+        """标记所有已到期的卡，返回标记数量"""
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        marked = chunks = 0
+        while True:
+            chunk_started = time.perf_counter()
+            async with self.session_maker() as db:
+                due = (
+                    select(UserCard.id)
+                    .where(
+                        UserCard.is_expired == False,
+                        UserCard.expire_date.is_not(None),
+                        UserCard.expire_date < now
+                    )
+                    .limit(self.chunk_size)
+                    .scalar_subquery()
+                )
+                result = await db.execute(
+                    update(UserCard)
+                    .where(UserCard.id.in_(due))
+                    .values(is_expired=True)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            self.max_chunk_ms = max(self.max_chunk_ms, (time.perf_counter() - chunk_started) * 1000)
+            marked += result.rowcount
+            chunks += 1
+            if result.rowcount < self.chunk_size:
+                break
+            await asyncio.sleep(self.pause)
+
+        self.runs += 1
+        self.marked += marked
+        self.last_run_at = now
+        self.last_marked = marked
+        self.last_chunks = chunks
+        self.last_duration_ms = (time.perf_counter() - started) * 1000
+        return marked
+
+    def start(self) -> None:
+        """启动后台扫描（启动时立即扫描一次）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                # 扫描失败不影响服务，下个周期重试
+                self.errors += 1
+                print(f"卡过期扫描失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        """运行统计"""
+        return {
+            "runs": self.runs,
+            "marked": self.marked,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_marked": self.last_marked,
+            "last_chunks": self.last_chunks,
+            "last_duration_ms": round(self.last_duration_ms, 2),
+            "max_chunk_ms": round(self.max_chunk_ms, 2),
+            "errors": self.errors,
+        }
+
+
+# 全局单例
+card_expiry_sweeper = CardExpirySweeper(
+    interval=settings.CARD_EXPIRY_SWEEP_INTERVAL,
+    chunk_size=settings.CARD_EXPIRY_SWEEP_CHUNK,
+)
@@ -0,0 +1,275 @@
+"""
+批量导入客户和卡
+
+把纸质记录整理成 CSV（表头 name,phone,card_type,remaining_times,expire_date）
+或 JSONL（每行一个同样字段的对象）上传，收完后边读边导入：
+
+- 开始时一次性载入所有客户的手机号索引，之后按手机号匹配已有客户不再逐行查询
+- 每 chunk_size 行一个事务：多行 INSERT 新客户、多行 INSERT 卡和开卡余额快照
+- 每批提交后输出一次进度；某一行有误只跳过该行
+"""
+import codecs
+import csv
+import json
+import tempfile
+from datetime import datetime, time as dt_time, timedelta
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import async_session_maker
+from app.models.card import UserCard
+from app.models.transaction import CardBalanceSnapshot
+from app.models.user import User, UserRole, reverse_phone
+from app.schemas.card import CardImportError, CardImportProgress, CardImportRow, CardTypeResponse
+from app.services.card_catalog import card_catalog
+
+
+# 每个事务导入的行数
+IMPORT_CHUNK_SIZE = 1000
+# 上传内容超过这个大小时转存到临时文件
+SPOOL_MAX_MEMORY = 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+ParsedRow = Tuple[int, Union[CardImportRow, str]]  # (行号, 解析结果或错误说明)
+ValidRow = Tuple[int, CardImportRow, CardTypeResponse]  # (行号, 行, 卡类型)
+
+
+async def spool_upload(chunks: AsyncIterator[bytes]) -> BinaryIO:
+    """
+    先收完上传内容（超过 SPOOL_MAX_MEMORY 转存临时文件），返回读位置在开头的文件
+
+    流式响应期间 Starlette 会同时监听客户端断开并读走请求体，所以不能边收请求体边输出进度
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    async for chunk in chunks:
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+async def iter_file(file: BinaryIO, chunk_size: int = READ_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """逐块读取文件，读完后关闭"""
+    try:
+        while chunk := file.read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """把上传的字节流切成行（UTF-8，兼容 Excel 导出的 BOM）"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def parse_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[ParsedRow]:
+    """逐行解析 CSV / JSONL（CSV 字段内不能换行），空行跳过"""
+    header: Optional[List[str]] = None
+    line_no = 0
+    async for line in read_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [value.strip() for value in values]
+                continue
+            data = dict(zip(header, values))
+        else:
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                yield line_no, "不是有效的JSON"
+                continue
+            if not isinstance(data, dict):
+                yield line_no, "不是有效的JSON对象"
+                continue
+        # 空字段视为未填写
+        data = {
+            key: value.strip() if isinstance(value, str) else value
+            for key, value in data.items()
+            if value is not None and (not isinstance(value, str) or value.strip())
+        }
+        if "card_type" in data:
+            data["card_type"] = str(data["card_type"])
+        try:
+            yield line_no, CardImportRow.model_validate(data)
+        except ValidationError as e:
+            yield line_no, "；".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+            )
+
+
+class CardImporter:
+    """批量导入客户和卡（一次导入用一个实例）"""
+
+    def __init__(
+        self,
+        operator_id: int,
+        session_maker: async_sessionmaker = async_session_maker,
+        chunk_size: int = IMPORT_CHUNK_SIZE
+    ):
+        self.operator_id = operator_id
+        self.session_maker = session_maker
+        self.chunk_size = chunk_size
+        self._phones: Dict[str, int] = {}  # 手机号 -> 客户ID
+        self._named: Set[int] = set()  # 已有姓名的客户
+        self._card_types: Dict[str, CardTypeResponse] = {}  # 卡类型ID/名称 -> 卡类型
+        self.progress = CardImportProgress(
+            processed=0, created_users=0, matched_users=0, created_cards=0, failed=0
+        )
+
+    async def run(self, rows: AsyncIterator[ParsedRow]) -> AsyncIterator[CardImportProgress]:
+        """导入全部行，每批提交后产出一次进度（errors 只含本批），最后产出 done 为真的汇总"""
+        async with self.session_maker() as db:
+            await self._load_indexes(db)
+
+        chunk: List[ParsedRow] = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield await self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield await self._import_chunk(chunk)
+        yield self.progress.model_copy(update={"errors": [], "done": True})
+
+    async def _load_indexes(self, db: AsyncSession) -> None:
+        """一次性载入手机号索引和卡类型"""
+        result = await db.execute(
+            select(User.phone, User.id, User.nickname).where(User.phone.is_not(None))
+        )
+        for phone, user_id, nickname in result:
+            self._phones.setdefault(phone, user_id)
+            if nickname:
+                self._named.add(user_id)
+        for card_type in (await card_catalog.current(db)).types.values():
+            if card_type.is_active:
+                self._card_types[card_type.name] = card_type
+                self._card_types[str(card_type.id)] = card_type
+
+    async def _import_chunk(self, chunk: List[ParsedRow]) -> CardImportProgress:
+        """导入一批行（一个事务），返回累计进度"""
+        errors: List[CardImportError] = []
+        valid: List[ValidRow] = []
+        for line_no, row in chunk:
+            if isinstance(row, str):
+                errors.append(CardImportError(line=line_no, detail=row))
+            elif row.card_type not in self._card_types:
+                errors.append(CardImportError(line=line_no, detail=f"卡类型不存在: {row.card_type}"))
+            else:
+                valid.append((line_no, row, self._card_types[row.card_type]))
+
+        try:
+            created_users, matched_users = await self._write(valid)
+        except IntegrityError:
+            # 导入期间有其他请求按同一手机号建了客户：重新载入索引后重试一次
+            async with self.session_maker() as db:
+                await self._load_indexes(db)
+            try:
+                created_users, matched_users = await self._write(valid)
+            except IntegrityError:
+                # 仍然冲突（如已有客户改过手机号，旧手机号的账号标识仍被占用），整批记为失败
+                errors.extend(
+                    CardImportError(line=line_no, detail="与已有客户账号冲突") for line_no, _, _ in valid
+                )
+                created_users, matched_users, valid = 0, 0, []
+
+        progress = self.progress
+        progress.processed += len(chunk)
+        progress.created_users += created_users
+        progress.matched_users += matched_users
+        progress.created_cards += len(valid)
+        progress.failed += len(errors)
+        return progress.model_copy(update={"errors": errors})
+
+    async def _write(self, valid: List[ValidRow]) -> Tuple[int, int]:
+        """写入一批有效行，返回 (新建客户数, 匹配已有客户的行数)"""
+        if not valid:
+            return 0, 0
+        now = datetime.utcnow()
+        new_users: Dict[str, Optional[str]] = {}  # 手机号 -> 姓名（同一手机号取第一个非空姓名）
+        named: Dict[int, str] = {}  # 已有客户没有姓名的补上
+        matched = 0
+        for _, row, _ in valid:
+            user_id = self._phones.get(row.phone)
+            if user_id is None:
+                if not new_users.get(row.phone):
+                    new_users[row.phone] = row.name
+            else:
+                matched += 1
+                if row.name and user_id not in self._named:
+                    named.setdefault(user_id, row.name)
+
+        # 多行 INSERT 直接用表（ORM 批量插入会按哪些列为空把行分成很多小批），
+        # RETURNING 不要求按参数顺序返回（否则 SQLite 只能逐行插入）：
+        # 新客户按手机号对应，快照直接取返回的次数
+        async with self.session_maker() as db:
+            created: Dict[str, int] = {}
+            if new_users:
+                result = await db.execute(
+                    insert(User.__table__).returning(User.id, User.phone),
+                    [
+                        {
+                            "openid": f"phone_{phone}",
+                            "phone": phone,
+                            "phone_reversed": reverse_phone(phone),
+                            "nickname": name,
+                            "real_name": name,
+                            "role": UserRole.CUSTOMER,
+                        }
+                        for phone, name in new_users.items()
+                    ]
+                )
+                created = {phone: user_id for user_id, phone in result.all()}
+            if named:
+                await db.execute(
+                    update(User),
+                    [{"id": user_id, "nickname": name, "real_name": name} for user_id, name in named.items()]
+                )
+
+            cards = []
+            for _, row, card_type in valid:
+                user_id = created.get(row.phone) or self._phones[row.phone]
+                if row.expire_date is not None:
+                    expire_date = datetime.combine(row.expire_date, dt_time(23, 59, 59))
+                elif card_type.validity_days:
+                    expire_date = now + timedelta(days=card_type.validity_days)
+                else:
+                    expire_date = None
+                cards.append({
+                    "user_id": user_id,
+                    "card_type_id": card_type.id,
+                    "remaining_times": (
+                        row.remaining_times if row.remaining_times is not None else card_type.total_times
+                    ),
+                    "expire_date": expire_date,
+                    "created_by": self.operator_id,
+                })
+            opened = await db.execute(
+                insert(UserCard.__table__).returning(UserCard.id, UserCard.remaining_times), cards
+            )
+            # 导入时的次数作为开卡余额快照（对账的起点）
+            await db.execute(insert(CardBalanceSnapshot.__table__), [
+                {"user_card_id": card_id, "last_transaction_id": 0, "remaining_times": remaining_times}
+                for card_id, remaining_times in opened.all()
+            ])
+            await db.commit()
+
+        self._phones.update(created)
+        self._named.update(user_id for phone, user_id in created.items() if new_users[phone])
+        self._named.update(named)
+        return len(created), matched
@@ -0,0 +1,175 @@
+"""
+客户搜索
+
+员工给客户加卡时按手机尾号或姓名找客户。原来用 LIKE '%x%'，每次都扫描整张用户表：
+
+- 手机号：尾号匹配改为 phone_reversed（倒序手机号）的前缀匹配，开头几位按 phone 的前缀匹配，
+  两者都是索引上的范围查询
+- 姓名：进程内 n-gram 倒排索引（昵称、真实姓名的单字和相邻两字 -> 用户ID），
+  一个字直接查单字，多个字取各两字组的交集后再确认包含。
+  每次搜索前按 updated_at 增量同步，本进程、其他进程的修改和批量导入都会更新 updated_at
+- 排序：完全匹配 > 前缀（姓氏、手机尾号）匹配 > 包含；同级新客户在前
+"""
+import asyncio
+import heapq
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user import User
+
+
+# 增量同步时往前多读的时间，覆盖 updated_at 早于上次同步、提交较晚的修改。
+# 每次搜索都会同步，窗口内的行每次都要重读（批量导入后尤其多），不宜太长
+REFRESH_OVERLAP = timedelta(seconds=10)
+
+# 手机号的匹配程度（越小越靠前）
+RANK_EXACT = 0
+RANK_PREFIX = 1  # 手机尾号
+RANK_CONTAINS = 2
+
+
+def _prefix_range(column, prefix: str):
+    """前缀匹配写成范围条件（SQLite 的 LIKE 默认不区分大小写，用不上普通索引）"""
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+async def search_phone(db: AsyncSession, phone: str, limit: int) -> List[int]:
+    """按手机尾号或开头几位搜索有效用户，返回排好序的用户ID"""
+    digits = re.sub(r"\D", "", phone)
+    if not digits:
+        return []
+    ranked: Dict[int, Tuple[int, int]] = {}
+    for condition in (_prefix_range(User.phone_reversed, digits[::-1]), _prefix_range(User.phone, digits)):
+        result = await db.execute(
+            select(User.id, User.phone)
+            .where(condition, User.is_active == True)
+            .order_by(User.id.desc())
+            .limit(limit)
+        )
+        for user_id, user_phone in result:
+            if user_phone == digits:
+                rank = RANK_EXACT
+            elif user_phone.endswith(digits):
+                rank = RANK_PREFIX
+            else:
+                rank = RANK_CONTAINS
+            ranked[user_id] = (rank, -user_id)
+    return sorted(ranked, key=ranked.get)[:limit]
+
+
+class CustomerNameIndex:
+    """用户姓名 n-gram 倒排索引（进程内）"""
+
+    def __init__(self):
+        self._names: Dict[int, Tuple[str, ...]] = {}  # 用户ID -> 规范化后的昵称、真实姓名
+        self._grams: Dict[str, Set[int]] = defaultdict(set)  # 单字/相邻两字 -> 用户ID
+        self._prefixes: Dict[str, Set[int]] = defaultdict(set)  # 姓名的第一个字、前两个字 -> 用户ID
+        self._exact: Dict[str, Set[int]] = defaultdict(set)  # 完整姓名 -> 用户ID
+        self._updated_at: Dict[int, datetime] = {}  # 用户ID -> 已索引的 updated_at
+        self._since: Optional[datetime] = None  # 已同步到的 updated_at
+        self._lock = asyncio.Lock()
+        self.searches = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def _normalize(name: Optional[str]) -> str:
+        return "".join((name or "").split()).lower()
+
+    def _entries(self, names: Iterable[str]) -> List[Tuple[Dict[str, Set[int]], str]]:
+        """一组姓名在各倒排表中的 (表, 键)，可能重复"""
+        entries = []
+        for name in names:
+            entries += [(self._grams, ch) for ch in name]
+            entries += [(self._grams, name[i:i + 2]) for i in range(len(name) - 1)]
+            entries += [(self._prefixes, name[:1]), (self._prefixes, name[:2]), (self._exact, name)]
+        return entries
+
+    def update(self, user_id: int, nickname: Optional[str], real_name: Optional[str], is_active: bool) -> None:
+        """更新一个用户的索引（禁用的用户移出索引）"""
+        old = self._names.pop(user_id, None)
+        if old:
+            for table, key in self._entries(old):
+                postings = table.get(key)
+                if postings is not None:
+                    postings.discard(user_id)
+                    if not postings:
+                        del table[key]
+        if not is_active:
+            return
+        names = tuple(dict.fromkeys(n for n in map(self._normalize, (nickname, real_name)) if n))
+        if names:
+            self._names[user_id] = names
+            for table, key in self._entries(names):
+                table[key].add(user_id)
+
+    async def refresh(self, db: AsyncSession) -> None:
+        """首次全量加载，之后增量同步上次之后修改过的用户"""
+        async with self._lock:
+            now = datetime.utcnow()
+            query = select(User.id, User.nickname, User.real_name, User.is_active, User.updated_at)
+            if self._since is None:
+                query = query.where(User.is_active == True)
+            else:
+                query = query.where(User.updated_at >= self._since - REFRESH_OVERLAP)
+            for user_id, nickname, real_name, is_active, updated_at in await db.execute(query):
+                # 重叠窗口内已经索引过的行跳过
+                if self._updated_at.get(user_id) != updated_at:
+                    self.update(user_id, nickname, real_name, is_active)
+                    self._updated_at[user_id] = updated_at
+            self._since = now
+            self.refreshes += 1
+
+    def search(self, text: str, limit: int) -> List[int]:
+        """按姓名片段搜索，返回排好序的用户ID（调用前先 refresh）"""
+        self.searches += 1
+        query = self._normalize(text)
+        if not query:
+            return []
+        exact = self._exact.get(query, set())
+        prefix = self._prefixes.get(query[:2], set())
+        if len(query) == 1:
+            contains = self._grams.get(query, set())
+        else:
+            postings = [self._grams.get(query[i:i + 2]) for i in range(len(query) - 1)]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            contains = postings[0].intersection(*postings[1:])
+        if len(query) > 2:
+            # 两字组都包含不代表包含整个片段，逐个确认
+            prefix = {uid for uid in prefix if any(n.startswith(query) for n in self._names[uid])}
+            contains = {uid for uid in contains if any(query in n for n in self._names[uid])}
+
+        # 按匹配程度分级，同级新客户在前
+        result: List[int] = []
+        for tier in (exact, prefix, contains):
+            if len(result) >= limit:
+                break
+            result += heapq.nlargest(limit - len(result), tier.difference(result))
+        return result
+
+    def clear(self) -> None:
+        self._names.clear()
+        self._grams.clear()
+        self._prefixes.clear()
+        self._exact.clear()
+        self._updated_at.clear()
+        self._since = None
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._names),
+            "grams": len(self._grams),
+            "searches": self.searches,
+            "refreshes": self.refreshes,
+            "synced_at": self._since.isoformat() if self._since else None,
+        }
+
+
+# 全局单例
+customer_name_index = CustomerNameIndex()
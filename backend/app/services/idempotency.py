@@ -0,0 +1,237 @@
+"""
+幂等键
+
+门店网络不稳定时，小程序会重试核销、扣卡等写请求。客户端为每次操作生成一个
+Idempotency-Key 请求头，重试时带同一个键：第一次请求的响应和业务写操作在同一事务中
+保存到 idempotency_records，之后的重试直接返回保存的响应，不再执行业务逻辑。
+
+进程内另有一个响应索引，提交后写入，重试命中时不查数据库；
+同一个键的请求还在处理时，并发的重试直接返回409。
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import run_after_commit, run_after_transaction_end
+from app.models.idempotency import IdempotencyRecord
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 64
+
+
+class StoredResponse(NamedTuple):
+    """保存的响应"""
+    fingerprint: str
+    status_code: int
+    body: str  # JSON
+    expires_at: datetime
+
+
+class IdempotencyIndex:
+    """
+    进程内响应索引（LRU）
+
+    键为 (用户ID, 幂等键)。只缓存已提交的响应，多进程部署时
+    其他进程的响应第一次重试查数据库后也会进入本进程索引。
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[int, str], StoredResponse]" = OrderedDict()
+        self._pending: Set[Tuple[int, str]] = set()  # 本进程正在处理的键
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+
+    def get(self, user_id: int, key: str) -> Optional[StoredResponse]:
+        """读取响应，未命中或已过期返回None"""
+        entry = self._entries.get((user_id, key))
+        if entry is None or entry.expires_at <= datetime.utcnow():
+            if entry is not None:
+                del self._entries[(user_id, key)]
+            self.misses += 1
+            return None
+        self._entries.move_to_end((user_id, key))
+        self.hits += 1
+        return entry
+
+    def put(self, user_id: int, key: str, stored: StoredResponse) -> None:
+        self._entries[(user_id, key)] = stored
+        self._entries.move_to_end((user_id, key))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def acquire(self, user_id: int, key: str) -> bool:
+        """标记键正在处理，已在处理中返回False"""
+        if (user_id, key) in self._pending:
+            self.conflicts += 1
+            return False
+        self._pending.add((user_id, key))
+        return True
+
+    def release(self, user_id: int, key: str) -> None:
+        self._pending.discard((user_id, key))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        """命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "conflicts": self.conflicts,
+        }
+
+
+# 全局单例
+idempotency_index = IdempotencyIndex(maxsize=settings.IDEMPOTENCY_CACHE_SIZE)
+
+
+async def request_fingerprint(request: Request) -> str:
+    """请求指纹：方法、路径、查询参数和请求体"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.url.path.encode())
+    digest.update(b"?" + request.url.query.encode())
+    digest.update(b"\n" + await request.body())
+    return digest.hexdigest()
+
+
+class IdempotencyService:
+    """
+    幂等请求处理
+
+    用法（一个请求一个实例）：
+        idempotency = IdempotencyService(db)
+        replay = await idempotency.begin(user_id, key, request)
+        if replay is not None:
+            return replay
+        ...业务逻辑，失败时抛 HTTPException（事务回滚，键不会被占用）...
+        return idempotency.finish(response)
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._record: Optional[IdempotencyRecord] = None
+
+    async def begin(self, user_id: int, key: Optional[str], request: Request) -> Optional[Response]:
+        """
+        开始处理请求
+
+        没有幂等键或第一次请求时占用该键并返回None，调用方继续执行业务逻辑；
+        重试时返回保存的响应。同一个键用于不同请求返回422，还在处理中返回409。
+        """
+        if key is None:
+            return None
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{IDEMPOTENCY_HEADER} 长度应为1-{MAX_KEY_LENGTH}个字符"
+            )
+        fingerprint = await request_fingerprint(request)
+
+        stored = idempotency_index.get(user_id, key)
+        if stored is None:
+            if not idempotency_index.acquire(user_id, key):
+                raise self._in_progress()
+            run_after_transaction_end(self.db, lambda: idempotency_index.release(user_id, key))
+            stored = await self._claim(user_id, key, fingerprint)
+            if stored is None:
+                return None
+        return self._replay(stored, fingerprint)
+
+    def finish(self, response: Any, status_code: int = status.HTTP_200_OK) -> Any:
+        """保存响应（随业务写操作一起提交），返回原响应"""
+        if self._record is None:
+            return response
+        record = self._record
+        record.status_code = status_code
+        record.response_body = json.dumps(jsonable_encoder(response), ensure_ascii=False)
+        stored = StoredResponse(record.fingerprint, status_code, record.response_body, record.expires_at)
+        run_after_commit(self.db, lambda: idempotency_index.put(record.user_id, record.key, stored))
+        return response
+
+    async def purge_expired(self) -> int:
+        """删除过期记录，返回删除条数"""
+        result = await self.db.execute(
+            delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= datetime.utcnow())
+        )
+        return result.rowcount
+
+    async def _claim(self, user_id: int, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """
+        在保存点内写入记录占用该键，返回None
+
+        键已存在时返回已保存的响应；已过期的旧记录删除后重新占用
+        """
+        now = datetime.utcnow()
+        record = IdempotencyRecord(
+            user_id=user_id,
+            key=key,
+            fingerprint=fingerprint,
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL)
+        )
+        for _ in range(2):
+            try:
+                async with self.db.begin_nested():
+                    self.db.add(record)
+                    await self.db.flush()
+            except IntegrityError:
+                existing = await self.db.scalar(
+                    select(IdempotencyRecord).where(
+                        IdempotencyRecord.user_id == user_id,
+                        IdempotencyRecord.key == key
+                    )
+                )
+                if existing is not None and existing.expires_at <= now:
+                    await self.db.delete(existing)
+                    await self.db.flush()
+                    continue
+                if existing is None or existing.status_code is None:
+                    raise self._in_progress()
+                stored = StoredResponse(
+                    existing.fingerprint, existing.status_code, existing.response_body, existing.expires_at
+                )
+                run_after_commit(self.db, lambda: idempotency_index.put(user_id, key, stored))
+                return stored
+            self._record = record
+            return None
+        raise self._in_progress()
+
+    @staticmethod
+    def _replay(stored: StoredResponse, fingerprint: str) -> Response:
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"{IDEMPOTENCY_HEADER} 已用于其他请求"
+            )
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    @staticmethod
+    def _in_progress() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="请求正在处理中，请稍后重试"
+        )
@@ -0,0 +1,331 @@
+"""
+卡流水查询
+
+按卡或按客户读取消费记录，沿 (user_card_id / customer_id, created_at, id)
+组合索引做 keyset 分页（新的在前）；导出时逐批读取，按月汇总在数据库里聚合。
+
+追加模式（CARD_LEDGER_APPEND_ONLY）下消费记录和卡余额快照只能新增，
+通过ORM修改或删除时抛出 LedgerAppendOnlyError；确需改写（如合并账号时改归属客户）
+的语句加 execution_options(ledger_rewrite=True)。
+卡余额 = 最新快照 + 快照之后的流水变动之和，见 card_balances。
+"""
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import select, func, case, extract, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models.card import UserCard
+from app.models.transaction import Transaction, TransactionType, CardBalanceSnapshot
+from app.schemas.transaction import CardBalance, LedgerEntry, LedgerPage, MonthlyConsumption, RecentTransaction
+from app.services.card_catalog import card_catalog
+from app.services.pagination import encode_cursor, decode_cursor, after_cursor
+
+
+# 导出时每批读取的行数
+EXPORT_BATCH_SIZE = 500
+
+_SORT_COLUMNS = (Transaction.created_at, Transaction.id)
+
+_LEDGER_COLUMNS = (
+    Transaction.id,
+    Transaction.user_card_id,
+    Transaction.appointment_id,
+    Transaction.transaction_type,
+    Transaction.service_type,
+    Transaction.times_changed,
+    Transaction.times_before,
+    Transaction.times_after,
+    Transaction.operator_id,
+    Transaction.notes,
+    Transaction.created_at,
+)
+
+
+def _owner_filter(user_card_id: Optional[int], customer_id: Optional[int]):
+    """按卡或按客户筛选（二选一）"""
+    if user_card_id is not None:
+        return Transaction.user_card_id == user_card_id
+    return Transaction.customer_id == customer_id
+
+
+class LedgerService:
+    """卡流水服务"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_card_owner(self, user_card_id: int) -> Optional[int]:
+        """卡的持有人ID，卡不存在返回None"""
+        return await self.db.scalar(select(UserCard.user_id).where(UserCard.id == user_card_id))
+
+    async def card_balance(self, user_card_id: int) -> Optional[CardBalance]:
+        """按最新快照和之后的流水重建一张卡的余额并与卡上的次数比对，卡不存在返回None"""
+        row = (await self.db.execute(
+            select(UserCard.id, UserCard.remaining_times).where(UserCard.id == user_card_id)
+        )).first()
+        if row is None:
+            return None
+        return (await card_balances(self.db, {row.id: row.remaining_times}))[row.id]
+
+    async def recent_transactions(self, customer_id: int, limit: int) -> List[RecentTransaction]:
+        """客户最近的几条流水（新的在前），只查询展示用的列，卡名取卡类型目录"""
+        result = await self.db.execute(
+            select(
+                Transaction.id,
+                Transaction.user_card_id,
+                UserCard.card_type_id,
+                Transaction.transaction_type,
+                Transaction.service_type,
+                Transaction.times_changed,
+                Transaction.created_at,
+            )
+            .join(UserCard, UserCard.id == Transaction.user_card_id)
+            .where(Transaction.customer_id == customer_id)
+            .order_by(*(column.desc() for column in _SORT_COLUMNS))
+            .limit(limit)
+        )
+        rows = result.all()
+        card_types = await card_catalog.types_for(self.db, {row.card_type_id for row in rows})
+        return [
+            RecentTransaction(
+                id=row.id,
+                user_card_id=row.user_card_id,
+                card_name=card_types[row.card_type_id].name,
+                transaction_type=row.transaction_type,
+                service_type=row.service_type,
+                times_changed=row.times_changed,
+                created_at=row.created_at,
+            )
+            for row in rows
+        ]
+
+    async def list_ledger(
+        self,
+        user_card_id: Optional[int] = None,
+        customer_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Optional[LedgerPage]:
+        """
+        分页获取一张卡或一个客户所有卡的流水（新的在前）
+
+        游标无效时返回None
+        """
+        after = None
+        if cursor:
+            after = decode_cursor(cursor, (datetime, int))
+            if after is None:
+                return None
+        items = await _fetch_batch(self.db, _owner_filter(user_card_id, customer_id), after, limit + 1)
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor((items[-1].created_at, items[-1].id))
+        return LedgerPage(items=items, next_cursor=next_cursor)
+
+    async def monthly_consumption(
+        self,
+        user_card_id: Optional[int] = None,
+        customer_id: Optional[int] = None
+    ) -> List[MonthlyConsumption]:
+        """按月汇总流水（新的月份在前），在数据库中聚合，不读取逐条记录"""
+        year = extract("year", Transaction.created_at)
+        month = extract("month", Transaction.created_at)
+
+        def times_of(transaction_type: TransactionType):
+            return func.coalesce(func.sum(
+                case((Transaction.transaction_type == transaction_type, Transaction.times_changed), else_=0)
+            ), 0)
+
+        result = await self.db.execute(
+            select(
+                year.label("year"),
+                month.label("month"),
+                func.count().label("transactions"),
+                (-times_of(TransactionType.CONSUME)).label("times_consumed"),
+                times_of(TransactionType.ADD).label("times_added"),
+                times_of(TransactionType.REFUND).label("times_refunded"),
+            )
+            .where(_owner_filter(user_card_id, customer_id))
+            .group_by(year, month)
+            .order_by(year.desc(), month.desc())
+        )
+        return [
+            MonthlyConsumption(
+                month=f"{row.year:04d}-{row.month:02d}",
+                transactions=row.transactions,
+                times_consumed=row.times_consumed,
+                times_added=row.times_added,
+                times_refunded=row.times_refunded,
+            )
+            for row in result
+        ]
+
+
+async def card_balances(db: AsyncSession, cards: Dict[int, Optional[int]]) -> Dict[int, CardBalance]:
+    """
+    批量重建卡余额
+
+    cards 为 {卡ID: 卡上记录的次数}。有快照的卡只读取最新快照之后的流水（沿 (user_card_id, id) 索引），
+    没有快照的老卡读取全部流水，以第一条流水的变动前次数为开卡次数（没有流水时以卡上的次数为准）
+    """
+    if not cards:
+        return {}
+    latest = (
+        select(
+            CardBalanceSnapshot.user_card_id,
+            func.max(CardBalanceSnapshot.last_transaction_id).label("position")
+        )
+        .where(CardBalanceSnapshot.user_card_id.in_(cards))
+        .group_by(CardBalanceSnapshot.user_card_id)
+        .subquery()
+    )
+    snapshots = {
+        row.user_card_id: row
+        for row in await db.execute(
+            select(
+                CardBalanceSnapshot.user_card_id,
+                CardBalanceSnapshot.last_transaction_id,
+                CardBalanceSnapshot.remaining_times,
+                CardBalanceSnapshot.transactions,
+            ).join(latest, (CardBalanceSnapshot.user_card_id == latest.c.user_card_id)
+                   & (CardBalanceSnapshot.last_transaction_id == latest.c.position))
+        )
+    }
+    tail_columns = (
+        Transaction.user_card_id,
+        func.count().label("count"),
+        func.sum(Transaction.times_changed).label("changed"),
+        func.max(Transaction.id).label("last_id"),
+    )
+    tails = {
+        row.user_card_id: row
+        for row in await db.execute(
+            select(*tail_columns)
+            .select_from(latest)
+            .join(Transaction, (Transaction.user_card_id == latest.c.user_card_id)
+                  & (Transaction.id > latest.c.position))
+            .group_by(Transaction.user_card_id)
+        )
+    }
+    # 没有快照的老卡：全部流水，开卡次数取第一条流水的变动前次数
+    openings = {}
+    legacy = [card_id for card_id in cards if card_id not in snapshots]
+    if legacy:
+        tails.update(
+            (row.user_card_id, row)
+            for row in await db.execute(
+                select(*tail_columns)
+                .where(Transaction.user_card_id.in_(legacy))
+                .group_by(Transaction.user_card_id)
+            )
+        )
+        first_ids = (
+            select(func.min(Transaction.id))
+            .where(Transaction.user_card_id.in_(legacy))
+            .group_by(Transaction.user_card_id)
+        )
+        openings = dict((await db.execute(
+            select(Transaction.user_card_id, Transaction.times_before).where(Transaction.id.in_(first_ids))
+        )).all())
+
+    balances = {}
+    for card_id, remaining_times in cards.items():
+        snapshot, tail = snapshots.get(card_id), tails.get(card_id)
+        if snapshot is not None:
+            base, position, counted = snapshot.remaining_times, snapshot.last_transaction_id, snapshot.transactions
+        else:
+            base, position, counted = openings.get(card_id, remaining_times), None, 0
+            if tail is None:
+                base = remaining_times
+        tail_count = tail.count if tail else 0
+        ledger_times = base
+        if base is not None and tail is not None:
+            ledger_times = base + tail.changed
+        balances[card_id] = CardBalance(
+            user_card_id=card_id,
+            remaining_times=remaining_times,
+            ledger_times=ledger_times,
+            snapshot_transaction_id=position,
+            tail_transactions=tail_count,
+            last_transaction_id=tail.last_id if tail else (position or 0),
+            transactions=counted + tail_count,
+            consistent=ledger_times == remaining_times,
+        )
+    return balances
+
+
+async def stream_ledger(
+    user_card_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+    session_maker: async_sessionmaker = async_session_maker,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[LedgerEntry]:
+    """
+    逐条产出全部流水（新的在前），供导出接口流式返回
+
+    按 keyset 每批查询 batch_size 行，每批用一个短事务：
+    响应发送期间不占用请求的会话，也不长时间持有读事务阻塞写入
+    """
+    condition = _owner_filter(user_card_id, customer_id)
+    after = None
+    while True:
+        async with session_maker() as db:
+            items = await _fetch_batch(db, condition, after, batch_size)
+        for item in items:
+            yield item
+        if len(items) < batch_size:
+            return
+        after = (items[-1].created_at, items[-1].id)
+
+
+async def _fetch_batch(db: AsyncSession, condition, after, limit: int) -> List[LedgerEntry]:
+    """读取游标之后的 limit 行流水"""
+    query = select(*_LEDGER_COLUMNS).where(condition)
+    if after is not None:
+        query = query.where(after_cursor(_SORT_COLUMNS, after, descending=True))
+    result = await db.execute(
+        query.order_by(*(column.desc() for column in _SORT_COLUMNS)).limit(limit)
+    )
+    return [LedgerEntry(**row._mapping) for row in result]
+
+
+# ============ 追加模式 ============
+
+class LedgerAppendOnlyError(RuntimeError):
+    """追加模式下修改或删除消费记录/卡余额快照"""
+
+
+_APPEND_ONLY_MODELS = (Transaction, CardBalanceSnapshot)
+
+
+@event.listens_for(Session, "before_flush")
+def _reject_ledger_changes(session, flush_context, instances):
+    """拒绝修改或删除已写入的流水和快照对象"""
+    if not settings.CARD_LEDGER_APPEND_ONLY:
+        return
+    for obj in session.deleted:
+        if isinstance(obj, _APPEND_ONLY_MODELS):
+            raise LedgerAppendOnlyError(f"{obj.__tablename__} 只能追加，不能删除")
+    for obj in session.dirty:
+        if isinstance(obj, _APPEND_ONLY_MODELS) and session.is_modified(obj):
+            raise LedgerAppendOnlyError(f"{obj.__tablename__} 只能追加，不能修改")
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _reject_ledger_statements(orm_execute_state):
+    """拒绝 update(Transaction) / delete(Transaction) 等语句（ledger_rewrite=True 时放行）"""
+    if not settings.CARD_LEDGER_APPEND_ONLY:
+        return
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.execution_options.get("ledger_rewrite"):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in _APPEND_ONLY_MODELS:
+        raise LedgerAppendOnlyError(f"{mapper.class_.__tablename__} 只能追加，不能修改或删除")
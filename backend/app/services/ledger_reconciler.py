@@ -0,0 +1,183 @@
+"""
+卡流水对账
+
+进程内后台任务，按卡ID分批逐张核对卡上的次数与流水重建的余额（见 ledger.card_balances）：
+有快照的卡只读取最新快照之后的少量流水，一轮对账的开销与新增流水数成正比，而不是与全部流水成正比。
+
+- 每批一个只读短事务，读完即结束，不阻塞扣卡
+- 一致且快照之后累计了 LEDGER_SNAPSHOT_EVERY 条流水的卡（以及还没有快照的老卡），
+  另开一个短事务追加新快照；快照只包含已写入的流水，流水只追加，晚写入也不会失效
+- 不一致的卡在新的事务中复查一次（排除读取期间刚好有扣卡提交），仍不一致则记录并输出，
+  不自动修正；之后的轮次恢复一致时从记录中移除
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models.card import UserCard
+from app.models.transaction import CardBalanceSnapshot
+from app.schemas.transaction import CardBalance
+from app.services.ledger import card_balances
+
+
+class LedgerReconciler:
+    """卡流水对账（进程内后台任务）"""
+
+    def __init__(
+        self,
+        interval: float,
+        chunk_size: int,
+        snapshot_every: int,
+        pause: float = 0.05,
+        session_maker: async_sessionmaker = async_session_maker
+    ):
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.snapshot_every = snapshot_every
+        self.pause = pause  # 批与批之间的间隔（秒）
+        self.session_maker = session_maker
+        self._task: Optional[asyncio.Task] = None
+        self.discrepancies: Dict[int, CardBalance] = {}  # 当前不一致的卡
+        self.passes = 0
+        self.cards_checked = 0
+        self.transactions_read = 0
+        self.snapshots_written = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration_ms = 0.0
+        self.last_transactions_read = 0
+        self.errors = 0
+
+    async def reconcile(self) -> List[CardBalance]:
+        """对账一轮（全部卡），返回不一致的卡"""
+        started = time.perf_counter()
+        transactions_read = 0
+        after_id = 0
+        while True:
+            checked, last_id, read = await self.reconcile_chunk(after_id)
+            transactions_read += read
+            if checked < self.chunk_size:
+                break
+            after_id = last_id
+            await asyncio.sleep(self.pause)
+
+        self.passes += 1
+        self.last_run_at = datetime.utcnow()
+        self.last_duration_ms = (time.perf_counter() - started) * 1000
+        self.last_transactions_read = transactions_read
+        return list(self.discrepancies.values())
+
+    async def reconcile_chunk(self, after_id: int) -> Tuple[int, int, int]:
+        """对账ID在 after_id 之后的一批卡，返回 (卡数, 最后一张卡的ID, 读取的流水条数)"""
+        async with self.session_maker() as db:
+            cards = dict((await db.execute(
+                select(UserCard.id, UserCard.remaining_times)
+                .where(UserCard.id > after_id)
+                .order_by(UserCard.id)
+                .limit(self.chunk_size)
+            )).all())
+            balances = await card_balances(db, cards)
+        if not cards:
+            return 0, after_id, 0
+
+        mismatched = {card_id for card_id, balance in balances.items() if not balance.consistent}
+        if mismatched:
+            # 复查：排除读取卡和读取流水之间刚好有扣卡提交的情况
+            async with self.session_maker() as db:
+                current = dict((await db.execute(
+                    select(UserCard.id, UserCard.remaining_times).where(UserCard.id.in_(mismatched))
+                )).all())
+                balances.update(await card_balances(db, current))
+        for card_id in cards:
+            balance = balances[card_id]
+            if balance.consistent:
+                self.discrepancies.pop(card_id, None)
+            elif card_id not in self.discrepancies:
+                self.discrepancies[card_id] = balance
+                print(f"卡流水对账不一致: 卡 {card_id} 记录 {balance.remaining_times} 次，"
+                      f"流水重建 {balance.ledger_times} 次")
+            else:
+                self.discrepancies[card_id] = balance
+
+        snapshots = [
+            {
+                "user_card_id": balance.user_card_id,
+                "last_transaction_id": balance.last_transaction_id,
+                "remaining_times": balance.ledger_times,
+                "transactions": balance.transactions,
+            }
+            for balance in balances.values()
+            if balance.consistent and (
+                balance.snapshot_transaction_id is None
+                or balance.tail_transactions >= self.snapshot_every
+            )
+        ]
+        if snapshots:
+            async with self.session_maker() as db:
+                await db.execute(insert(CardBalanceSnapshot), snapshots)
+                await db.commit()
+
+        read = sum(balance.tail_transactions for balance in balances.values())
+        self.cards_checked += len(cards)
+        self.transactions_read += read
+        self.snapshots_written += len(snapshots)
+        return len(cards), max(cards), read
+
+    def start(self) -> None:
+        """启动后台对账（启动时立即对账一轮）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                # 对账失败不影响服务，下个周期重试
+                self.errors += 1
+                print(f"卡流水对账失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        """运行统计（含当前不一致的卡）"""
+        return {
+            "passes": self.passes,
+            "cards_checked": self.cards_checked,
+            "transactions_read": self.transactions_read,
+            "snapshots_written": self.snapshots_written,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_duration_ms": round(self.last_duration_ms, 2),
+            "last_transactions_read": self.last_transactions_read,
+            "discrepancies": [
+                {
+                    "user_card_id": balance.user_card_id,
+                    "remaining_times": balance.remaining_times,
+                    "ledger_times": balance.ledger_times,
+                }
+                for balance in list(self.discrepancies.values())[:100]
+            ],
+            "discrepancy_count": len(self.discrepancies),
+            "errors": self.errors,
+        }
+
+
+# 全局单例
+ledger_reconciler = LedgerReconciler(
+    interval=settings.LEDGER_RECONCILE_INTERVAL,
+    chunk_size=settings.LEDGER_RECONCILE_CHUNK,
+    snapshot_every=settings.LEDGER_SNAPSHOT_EVERY,
+)
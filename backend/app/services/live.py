@@ -0,0 +1,130 @@
+"""
+可预约时段实时推送
+
+进程内发布订阅：客户端按 (门店ID, 日期) 订阅，预约和排班的写操作
+在事务提交后发布变化，推送给订阅了该门店当天的所有连接。
+每个连接只占用一个有界队列，空闲连接不消耗CPU。
+"""
+import asyncio
+from datetime import date
+from typing import Dict, Optional, Set, Tuple
+
+from app.config import settings
+from app.database import run_after_commit
+
+
+class AvailabilitySubscription:
+    """一个连接的订阅，可随时切换订阅的门店和日期"""
+
+    def __init__(self, broker: "AvailabilityBroker", queue_size: int):
+        self.broker = broker
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.channel: Optional[Tuple[int, date]] = None
+
+    def switch(self, store_id: int, work_date: date) -> None:
+        """切换订阅，丢弃旧频道尚未发送的消息"""
+        self.broker._detach(self)
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.channel = (store_id, work_date)
+        self.broker._attach(self)
+
+    async def get(self) -> dict:
+        """等待下一条消息"""
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.broker._detach(self)
+        self.channel = None
+
+    def __enter__(self) -> "AvailabilitySubscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AvailabilityBroker:
+    """
+    可预约时段变化的进程内分发
+
+    消息类型：
+    - booked / released：某员工的一个时间段被占用 / 释放
+    - schedule：排班变化，需重新拉取当天的可预约员工
+    - resync：连接消费太慢丢了消息，需重新拉取
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._channels: Dict[Tuple[int, date], Set[AvailabilitySubscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscription(self) -> AvailabilitySubscription:
+        """新建订阅（用 with 语句保证连接断开时退订）"""
+        return AvailabilitySubscription(self, self.queue_size)
+
+    def publish(self, store_id: int, work_date: Optional[date], event: dict) -> None:
+        """发布消息，不传日期时发给该门店的所有日期"""
+        if work_date is None:
+            channels = [channel for channel in self._channels if channel[0] == store_id]
+        else:
+            channels = [(store_id, work_date)]
+
+        self.published += 1
+        for channel in channels:
+            message = {**event, "store_id": channel[0], "work_date": channel[1].isoformat()}
+            for subscription in self._channels.get(channel, ()):
+                self._deliver(subscription, message)
+
+    def publish_on_commit(
+        self,
+        db,
+        store_id: int,
+        work_date: Optional[date],
+        event: dict
+    ) -> None:
+        """写操作调用：事务提交后发布（回滚则不发布）"""
+        run_after_commit(db, lambda: self.publish(store_id, work_date, event))
+
+    def stats(self) -> dict:
+        """订阅和分发统计"""
+        return {
+            "channels": len(self._channels),
+            "subscribers": sum(len(subscriptions) for subscriptions in self._channels.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+    def _deliver(self, subscription: AvailabilitySubscription, message: dict) -> None:
+        try:
+            subscription.queue.put_nowait(message)
+            self.delivered += 1
+        except asyncio.QueueFull:
+            # 队列满说明客户端跟不上，清空后只留一条 resync 让它重新拉取
+            self.dropped += subscription.queue.qsize() + 1
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait({
+                "type": "resync",
+                "store_id": message["store_id"],
+                "work_date": message["work_date"],
+            })
+
+    def _attach(self, subscription: AvailabilitySubscription) -> None:
+        self._channels.setdefault(subscription.channel, set()).add(subscription)
+
+    def _detach(self, subscription: AvailabilitySubscription) -> None:
+        if subscription.channel is None:
+            return
+        subscriptions = self._channels.get(subscription.channel)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._channels[subscription.channel]
+
+
+# 全局单例
+availability_broker = AvailabilityBroker(queue_size=settings.LIVE_QUEUE_SIZE)
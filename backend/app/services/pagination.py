@@ -0,0 +1,52 @@
+"""
+游标分页
+
+列表按若干排序列（最后一列为主键）做 keyset 分页：游标记录上一页最后一行的
+排序列取值，下一页从它之后开始查，不用 OFFSET，翻到多深都只扫描一页的行。
+对客户端来说游标是不透明字符串。
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """把排序列取值编码为游标"""
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values],
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Optional[Tuple[Any, ...]]:
+    """
+    解析游标，types 为各列的类型（int / str / date / datetime）
+
+    游标格式不对时返回None
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            return None
+        return tuple(
+            column_type.fromisoformat(value) if column_type in (date, datetime) else column_type(value)
+            for column_type, value in zip(types, values)
+        )
+    except (ValueError, TypeError):
+        return None
+
+
+def after_cursor(columns: Sequence[Any], values: Sequence[Any], descending: bool = False):
+    """
+    keyset 条件：(列1, 列2, ...) 排在游标之后
+
+    用行值比较，排序方向一致时可以沿组合索引直接定位
+    """
+    if descending:
+        return tuple_(*columns) < tuple_(*values)
+    return tuple_(*columns) > tuple_(*values)
@@ -1,17 +1,34 @@
 """
 排班服务
 """
+import heapq
+from collections import defaultdict
 from datetime import date, datetime, timedelta
-from typing import List, Optional
-from sqlalchemy import select, and_
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, and_, or_, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.models.schedule import Schedule
+from app.models.schedule import Schedule, ScheduleTemplate, ScheduleException
 from app.models.appointment import Appointment, AppointmentStatus
+from app.models.store import Store
+from app.models.time_range import minutes_to_time, time_to_minutes
 from app.models.user import User
-from app.schemas.schedule import ScheduleCreate, ScheduleBatchCreate, AvailableStaff
+from app.schemas.schedule import (
+    ScheduleCreate, ScheduleBatchCreate, ScheduleTemplateCreate,
+    AvailableStaff, DayAvailability, EarliestSlot
+)
 from app.schemas.user import StaffSimple
+from app.services.availability import (
+    SLOT_MINUTES, occupied_mask, free_start_mask, mask_to_times,
+    availability_cache
+)
+from app.services.live import availability_broker
+
+
+# 未指定结束日期时，排班模板向后展开的天数
+TEMPLATE_EXPAND_DAYS = 28
 
 
 class ScheduleService:
@@ -28,76 +45,309 @@ class ScheduleService:
         获取指定门店、日期的可预约员工及其可用时间段
         
         逻辑：
-        1. 查找该门店该天有排班的员工
-        2. 计算每个员工的可用时间段（排除已有预约）
+        1. 查找该门店该天有排班的员工（连同员工信息一次查出），
+           并展开当天生效的排班模板
+        2. 一次查出这些员工当天的全部有效预约
+        3. 用槽位位图计算每个员工的可用时间段
+        
+        结果按 (门店, 日期, 时长) 缓存，预约或排班变化时失效
         """
-        # 获取该门店该天的排班
+        cached = availability_cache.get(store_id, work_date, service_duration)
+        if cached is not None:
+            return cached
+        
+        generation = availability_cache.generation(store_id, work_date)
+        availability = await self._load_availability(
+            store_id, work_date, work_date, service_duration
+        )
+        availability_cache.put(
+            store_id, work_date, service_duration, availability[work_date], generation
+        )
+        return availability[work_date]
+    
+    async def get_available_staff_range(
+        self,
+        store_id: int,
+        start_date: date,
+        end_date: date,
+        service_duration: int = 30
+    ) -> List[DayAvailability]:
+        """
+        获取指定门店一段日期内每天的可预约员工
+        
+        整个日期范围只查询一次排班和一次预约；每天的结果写入缓存，
+        范围内每天都命中缓存时不查数据库
+        """
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        cached = {day: availability_cache.get(store_id, day, service_duration) for day in days}
+        if all(staff_list is not None for staff_list in cached.values()):
+            return [
+                DayAvailability(work_date=day, available_staff=staff_list)
+                for day, staff_list in cached.items()
+            ]
+        
+        generations = {day: availability_cache.generation(store_id, day) for day in days}
+        availability = await self._load_availability(
+            store_id, start_date, end_date, service_duration
+        )
+        for day, staff_list in availability.items():
+            availability_cache.put(store_id, day, service_duration, staff_list, generations[day])
+        return [
+            DayAvailability(work_date=work_date, available_staff=staff_list)
+            for work_date, staff_list in availability.items()
+        ]
+    
+    async def _load_availability(
+        self,
+        store_id: int,
+        start_date: date,
+        end_date: date,
+        service_duration: int
+    ) -> Dict[date, List[AvailableStaff]]:
+        """按日期计算可预约员工，返回的字典包含范围内的每一天"""
+        # 获取该门店日期范围内的排班
         result = await self.db.execute(
             select(Schedule)
-            .options(selectinload(Schedule.staff))
+            .options(joinedload(Schedule.staff))
             .where(
                 Schedule.store_id == store_id,
-                Schedule.work_date == work_date,
+                Schedule.work_date >= start_date,
+                Schedule.work_date <= end_date,
                 Schedule.is_active == True
             )
+            .order_by(Schedule.work_date, Schedule.id)
         )
-        schedules = result.scalars().all()
+        schedules = list(result.scalars().all())
+        schedules += await self._expand_templates(start_date, end_date, store_id=store_id)
+        schedules.sort(key=lambda schedule: schedule.work_date)
         
-        available_staff_list = []
+        availability = {
+            start_date + timedelta(days=offset): []
+            for offset in range((end_date - start_date).days + 1)
+        }
+        for schedule, free in await self._free_start_masks(
+            schedules, start_date, end_date, service_duration
+        ):
+            if free:
+                availability[schedule.work_date].append(self._build_available_staff(schedule, free))
         
-        for schedule in schedules:
-            # 获取该员工当天的已有预约
-            appointments_result = await self.db.execute(
-                select(Appointment).where(
-                    Appointment.staff_id == schedule.staff_id,
-                    Appointment.appointment_date == work_date,
-                    Appointment.status.in_([AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED])
+        return availability
+    
+    async def find_earliest_slots(
+        self,
+        service_duration: int = 30,
+        limit: int = 5,
+        days: int = 7,
+        now: Optional[datetime] = None
+    ) -> List[EarliestSlot]:
+        """
+        查找所有营业门店、所有员工中最早的可预约时段
+        
+        从今天起逐天查找：每个员工当天的可用开始时间是一个位图，
+        按最低位依次取出即为有序的空闲时间；用小顶堆合并所有员工，
+        凑够 limit 个后不再查询后面的日期
+        """
+        now = now or datetime.now()
+        now_minute = now.hour * 60 + now.minute
+        slots = []
+        
+        # 排班模板整个窗口只查询一次，按天分组
+        template_schedules = defaultdict(list)
+        for schedule in await self._expand_templates(
+            now.date(), now.date() + timedelta(days=days - 1), open_stores_only=True
+        ):
+            template_schedules[schedule.work_date].append(schedule)
+        
+        for offset in range(days):
+            work_date = now.date() + timedelta(days=offset)
+            result = await self.db.execute(
+                select(Schedule)
+                .join(Store, Store.id == Schedule.store_id)
+                .options(joinedload(Schedule.staff), contains_eager(Schedule.store))
+                .where(
+                    Schedule.work_date == work_date,
+                    Schedule.is_active == True,
+                    Store.is_active == True
                 )
             )
-            appointments = appointments_result.scalars().all()
-            
-            # 计算已占用的时间段
-            occupied_times = set()
-            for apt in appointments:
-                # 将预约时间段内的所有时间点标记为已占用
-                start = self._time_to_minutes(apt.start_time)
-                end = self._time_to_minutes(apt.end_time)
-                for t in range(start, end, 30):  # 以30分钟为单位
-                    occupied_times.add(t)
+            schedules = list(result.scalars().all()) + template_schedules[work_date]
+            if not schedules:
+                continue
             
-            # 计算可用时间段
-            available_times = []
-            start_minutes = self._time_to_minutes(schedule.start_time)
-            end_minutes = self._time_to_minutes(schedule.end_time)
+            # 每个员工的堆元素：(开始分钟, 排班序号, 剩余位图)
+            heap = []
+            for index, (schedule, free) in enumerate(
+                await self._free_start_masks(schedules, work_date, work_date, service_duration)
+            ):
+                if offset == 0:
+                    # 今天只保留当前时间之后的开始时间
+                    free &= ~self._mask_until(schedule.start_minute, now_minute)
+                if free:
+                    heap.append(self._pop_earliest(schedule.start_minute, free, index))
+            heapq.heapify(heap)
             
-            current = start_minutes
-            while current + service_duration <= end_minutes:
-                # 检查这个时间段是否可用
-                is_available = True
-                for t in range(current, current + service_duration, 30):
-                    if t in occupied_times:
-                        is_available = False
-                        break
-                
-                if is_available:
-                    available_times.append(self._minutes_to_time(current))
-                
-                current += 30  # 每30分钟一个时间点
+            while heap and len(slots) < limit:
+                start_minute, index, remaining = heapq.heappop(heap)
+                schedule = schedules[index]
+                slots.append(EarliestSlot(
+                    work_date=work_date,
+                    start_time=minutes_to_time(start_minute),
+                    store_id=schedule.store_id,
+                    store_name=schedule.store.name,
+                    staff=StaffSimple.model_validate(schedule.staff)
+                ))
+                if remaining:
+                    heapq.heappush(heap, self._pop_earliest(schedule.start_minute, remaining, index))
             
-            if available_times:
-                staff_simple = StaffSimple(
-                    id=schedule.staff.id,
-                    real_name=schedule.staff.real_name,
-                    nickname=schedule.staff.nickname,
-                    avatar_url=schedule.staff.avatar_url,
-                    introduction=schedule.staff.introduction
+            if len(slots) >= limit:
+                break
+        
+        return slots
+    
+    async def _free_start_masks(
+        self,
+        schedules: List[Schedule],
+        start_date: date,
+        end_date: date,
+        service_duration: int
+    ) -> List[Tuple[Schedule, int]]:
+        """一次查询排班员工在日期范围内的预约，返回每个排班的可用开始时间位图"""
+        if not schedules:
+            return []
+        
+        staff_ids = {schedule.staff_id for schedule in schedules}
+        appointments_result = await self.db.execute(
+            select(
+                Appointment.staff_id,
+                Appointment.appointment_date,
+                Appointment.start_minute,
+                Appointment.end_minute
+            ).where(
+                Appointment.staff_id.in_(staff_ids),
+                Appointment.appointment_date >= start_date,
+                Appointment.appointment_date <= end_date,
+                Appointment.status.in_([AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED])
+            )
+        )
+        busy_by_day = defaultdict(list)
+        for staff_id, appointment_date, start_minute, end_minute in appointments_result.all():
+            busy_by_day[(staff_id, appointment_date)].append((start_minute, end_minute))
+        
+        masks = []
+        for schedule in schedules:
+            busy = occupied_mask(
+                schedule.start_minute, busy_by_day.get((schedule.staff_id, schedule.work_date), ())
+            )
+            masks.append((
+                schedule,
+                free_start_mask(schedule.start_minute, schedule.end_minute, service_duration, busy)
+            ))
+        return masks
+    
+    def _build_available_staff(self, schedule: Schedule, free: int) -> AvailableStaff:
+        """把可用开始时间位图转换为接口返回的员工可用时间"""
+        return AvailableStaff(
+            staff=StaffSimple.model_validate(schedule.staff),
+            available_times=mask_to_times(schedule.start_minute, free)
+        )
+    
+    def _mask_until(self, origin: int, minute: int) -> int:
+        """开始时间不晚于 minute 的槽位位图"""
+        if minute < origin:
+            return 0
+        return (1 << ((minute - origin) // SLOT_MINUTES + 1)) - 1
+    
+    def _pop_earliest(self, origin: int, mask: int, index: int) -> Tuple[int, int, int]:
+        """取出位图中最早的开始时间，返回堆元素 (开始分钟, 排班序号, 剩余位图)"""
+        lowest = mask & -mask
+        return (origin + (lowest.bit_length() - 1) * SLOT_MINUTES, index, mask ^ lowest)
+    
+    async def _expand_templates(
+        self,
+        start_date: date,
+        end_date: date,
+        store_id: Optional[int] = None,
+        staff_id: Optional[int] = None,
+        open_stores_only: bool = False
+    ) -> List[Schedule]:
+        """
+        把日期范围内生效的排班模板展开为排班（不入库）
+        
+        只展开请求的日期范围；员工当天已有排班表记录（任意门店）
+        或该日期是模板的例外日期时不展开
+        """
+        query = (
+            select(ScheduleTemplate)
+            .join(Store, Store.id == ScheduleTemplate.store_id)
+            .options(joinedload(ScheduleTemplate.staff), contains_eager(ScheduleTemplate.store))
+            .where(
+                ScheduleTemplate.is_active == True,
+                ScheduleTemplate.valid_from <= end_date,
+                or_(
+                    ScheduleTemplate.valid_until.is_(None),
+                    ScheduleTemplate.valid_until >= start_date
                 )
-                available_staff_list.append(AvailableStaff(
-                    staff=staff_simple,
-                    available_times=available_times
-                ))
+            )
+        )
+        if store_id is not None:
+            query = query.where(ScheduleTemplate.store_id == store_id)
+        if staff_id is not None:
+            query = query.where(ScheduleTemplate.staff_id == staff_id)
+        if open_stores_only:
+            query = query.where(Store.is_active == True)
+        result = await self.db.execute(query.order_by(ScheduleTemplate.id))
+        templates = result.scalars().all()
+        if not templates:
+            return []
         
-        return available_staff_list
+        exceptions_result = await self.db.execute(
+            select(ScheduleException.template_id, ScheduleException.exception_date).where(
+                ScheduleException.template_id.in_([template.id for template in templates]),
+                ScheduleException.exception_date >= start_date,
+                ScheduleException.exception_date <= end_date
+            )
+        )
+        exceptions = set(exceptions_result.all())
+        
+        # 当天有排班表记录的员工以排班表为准
+        overrides_result = await self.db.execute(
+            select(Schedule.staff_id, Schedule.work_date).where(
+                Schedule.staff_id.in_({template.staff_id for template in templates}),
+                Schedule.work_date >= start_date,
+                Schedule.work_date <= end_date,
+                Schedule.is_active == True
+            )
+        )
+        overrides = set(overrides_result.all())
+        
+        schedules = []
+        for offset in range((end_date - start_date).days + 1):
+            work_date = start_date + timedelta(days=offset)
+            for template in templates:
+                if (
+                    template.applies_to(work_date)
+                    and (template.id, work_date) not in exceptions
+                    and (template.staff_id, work_date) not in overrides
+                ):
+                    schedules.append(self._template_schedule(template, work_date))
+        return schedules
+    
+    def _template_schedule(self, template: ScheduleTemplate, work_date: date) -> Schedule:
+        """由模板生成某天的排班对象（不加入会话）"""
+        schedule = Schedule(
+            staff_id=template.staff_id,
+            store_id=template.store_id,
+            work_date=work_date,
+            start_minute=template.start_minute,
+            end_minute=template.end_minute,
+            is_active=True,
+            created_at=template.created_at
+        )
+        schedule.template_id = template.id
+        # 直接设置已加载的关联，不触发反向关系，避免对象被级联加入会话
+        set_committed_value(schedule, "staff", template.staff)
+        set_committed_value(schedule, "store", template.store)
+        return schedule
     
     async def get_staff_schedules(
         self, 
@@ -106,7 +356,12 @@ class ScheduleService:
         end_date: Optional[date] = None,
         include_store: bool = False
     ) -> List[Schedule]:
-        """获取员工的排班"""
+        """
+        获取员工的排班（含排班模板展开的日期）
+        
+        模板从 start_date（默认今天）起展开，未指定 end_date 时
+        展开 TEMPLATE_EXPAND_DAYS 天
+        """
         query = select(Schedule).where(
             Schedule.staff_id == staff_id,
             Schedule.is_active == True
@@ -125,7 +380,14 @@ class ScheduleService:
             query = query.where(Schedule.work_date <= end_date)
         
         result = await self.db.execute(query.order_by(Schedule.work_date))
-        return result.scalars().all()
+        schedules = list(result.scalars().all())
+        
+        expand_from = start_date or date.today()
+        expand_to = end_date or expand_from + timedelta(days=TEMPLATE_EXPAND_DAYS - 1)
+        if expand_from <= expand_to:
+            schedules += await self._expand_templates(expand_from, expand_to, staff_id=staff_id)
+            schedules.sort(key=lambda schedule: (schedule.work_date, schedule.start_minute))
+        return schedules
     
     async def create_schedule(self, schedule_data: ScheduleCreate) -> Schedule:
         """创建排班"""
@@ -139,7 +401,9 @@ class ScheduleService:
         )
         schedule = existing_result.scalar_one_or_none()
         if schedule:
-            # 更新现有排班
+            # 更新现有排班（换门店时原门店当天的可预约时段也变了）
+            if schedule.store_id != schedule_data.store_id:
+                self._availability_changed(schedule.store_id, schedule.work_date)
             schedule.store_id = schedule_data.store_id
             schedule.start_time = schedule_data.start_time
             schedule.end_time = schedule_data.end_time
@@ -147,6 +411,8 @@ class ScheduleService:
             schedule = Schedule(**schedule_data.model_dump())
             self.db.add(schedule)
         
+        self._availability_changed(schedule_data.store_id, schedule_data.work_date)
+        await self._invalidate_template_stores(schedule_data.staff_id, [schedule_data.work_date])
         await self.db.flush()
         await self.db.refresh(schedule)
         return schedule
@@ -156,19 +422,69 @@ class ScheduleService:
         staff_id: int,
         batch_data: ScheduleBatchCreate
     ) -> List[Schedule]:
-        """批量创建排班"""
-        schedules = []
-        for work_date in batch_data.work_dates:
-            schedule_data = ScheduleCreate(
-                staff_id=staff_id,
-                store_id=batch_data.store_id,
-                work_date=work_date,
-                start_time=batch_data.start_time,
-                end_time=batch_data.end_time
-            )
-            schedule = await self.create_schedule(schedule_data)
-            schedules.append(schedule)
-        return schedules
+        """
+        批量创建排班
+        
+        一次查出这些日期已有的排班，已有的用一条 UPDATE 统一更新，
+        其余的用一条多行 INSERT 写入，不再逐天查询和刷新
+        """
+        work_dates = list(dict.fromkeys(batch_data.work_dates))  # 去重并保持顺序
+        if not work_dates:
+            return []
+        start_minute = time_to_minutes(batch_data.start_time)
+        end_minute = time_to_minutes(batch_data.end_time)
+        
+        existing_result = await self.db.execute(
+            select(Schedule).where(
+                Schedule.staff_id == staff_id,
+                Schedule.work_date.in_(work_dates),
+                Schedule.is_active == True
+            )
+        )
+        schedules_by_date = {schedule.work_date: schedule for schedule in existing_result.scalars()}
+        
+        # 换门店的日期，原门店当天的可预约时段也要失效
+        for schedule in schedules_by_date.values():
+            if schedule.store_id != batch_data.store_id:
+                self._availability_changed(schedule.store_id, schedule.work_date)
+        
+        # 更新已有排班
+        if schedules_by_date:
+            await self.db.execute(
+                update(Schedule)
+                .where(Schedule.id.in_([schedule.id for schedule in schedules_by_date.values()]))
+                .values(
+                    store_id=batch_data.store_id,
+                    start_minute=start_minute,
+                    end_minute=end_minute
+                )
+            )
+        
+        # 新增排班
+        new_dates = [work_date for work_date in work_dates if work_date not in schedules_by_date]
+        if new_dates:
+            inserted = await self.db.scalars(
+                insert(Schedule).returning(Schedule),
+                [
+                    {
+                        "staff_id": staff_id,
+                        "store_id": batch_data.store_id,
+                        "work_date": work_date,
+                        "start_minute": start_minute,
+                        "end_minute": end_minute,
+                    }
+                    for work_date in new_dates
+                ]
+            )
+            schedules_by_date.update(
+                (schedule.work_date, schedule) for schedule in inserted.all()
+            )
+        
+        for work_date in work_dates:
+            self._availability_changed(batch_data.store_id, work_date)
+        await self._invalidate_template_stores(staff_id, work_dates)
+        
+        return [schedules_by_date[work_date] for work_date in work_dates]
     
     async def delete_schedule(self, schedule_id: int, staff_id: int) -> bool:
         """删除排班"""
@@ -184,16 +500,113 @@ class ScheduleService:
             return False
         
         schedule.is_active = False
+        self._availability_changed(schedule.store_id, schedule.work_date)
+        await self._invalidate_template_stores(staff_id, [schedule.work_date])
         await self.db.flush()
         return True
     
-    def _time_to_minutes(self, time_str: str) -> int:
-        """将时间字符串转换为分钟数"""
-        hours, minutes = map(int, time_str.split(':'))
-        return hours * 60 + minutes
+    def _availability_changed(self, store_id: int, work_date: Optional[date] = None) -> None:
+        """失效可预约时段缓存，并在提交后通知订阅的客户端重新拉取（不传日期为整个门店）"""
+        availability_cache.invalidate_on_commit(self.db, store_id, work_date)
+        availability_broker.publish_on_commit(self.db, store_id, work_date, {"type": "schedule"})
     
-    def _minutes_to_time(self, minutes: int) -> str:
-        """将分钟数转换为时间字符串"""
-        hours = minutes // 60
-        mins = minutes % 60
-        return f"{hours:02d}:{mins:02d}"
+    async def _invalidate_template_stores(self, staff_id: int, work_dates: Iterable[date]) -> None:
+        """排班表记录覆盖同日的模板，增删记录时模板所在门店当天的缓存也要失效"""
+        result = await self.db.execute(
+            select(ScheduleTemplate.store_id).distinct().where(
+                ScheduleTemplate.staff_id == staff_id,
+                ScheduleTemplate.is_active == True
+            )
+        )
+        for store_id in result.scalars().all():
+            for work_date in work_dates:
+                self._availability_changed(store_id, work_date)
+    
+    async def create_template(
+        self,
+        staff_id: int,
+        template_data: ScheduleTemplateCreate
+    ) -> Optional[ScheduleTemplate]:
+        """
+        创建每周排班模板
+        
+        与该员工已有模板在星期和有效期上重叠时返回None
+        """
+        template = ScheduleTemplate(
+            staff_id=staff_id,
+            store_id=template_data.store_id,
+            weekdays=template_data.weekdays,
+            start_time=template_data.start_time,
+            end_time=template_data.end_time,
+            valid_from=template_data.valid_from,
+            valid_until=template_data.valid_until
+        )
+        
+        for existing in await self.get_templates(staff_id):
+            if (
+                existing.weekday_mask & template.weekday_mask
+                and existing.valid_from <= (template.valid_until or date.max)
+                and template.valid_from <= (existing.valid_until or date.max)
+            ):
+                return None
+        
+        self.db.add(template)
+        self._availability_changed(template.store_id)
+        await self.db.flush()
+        await self.db.refresh(template)
+        return template
+    
+    async def get_templates(self, staff_id: int) -> List[ScheduleTemplate]:
+        """获取员工的有效排班模板"""
+        result = await self.db.execute(
+            select(ScheduleTemplate).where(
+                ScheduleTemplate.staff_id == staff_id,
+                ScheduleTemplate.is_active == True
+            ).order_by(ScheduleTemplate.valid_from, ScheduleTemplate.id)
+        )
+        return result.scalars().all()
+    
+    async def delete_template(self, template_id: int, staff_id: int) -> bool:
+        """删除排班模板（之后的日期不再按模板展开）"""
+        template = await self._get_own_template(template_id, staff_id)
+        if not template:
+            return False
+        
+        template.is_active = False
+        self._availability_changed(template.store_id)
+        await self.db.flush()
+        return True
+    
+    async def add_template_exception(
+        self,
+        template_id: int,
+        staff_id: int,
+        exception_date: date
+    ) -> bool:
+        """排除排班模板的某一天（如请假）"""
+        template = await self._get_own_template(template_id, staff_id)
+        if not template:
+            return False
+        
+        existing_result = await self.db.execute(
+            select(ScheduleException.id).where(
+                ScheduleException.template_id == template_id,
+                ScheduleException.exception_date == exception_date
+            )
+        )
+        if existing_result.scalar_one_or_none() is None:
+            self.db.add(ScheduleException(template_id=template_id, exception_date=exception_date))
+            self._availability_changed(template.store_id, exception_date)
+            await self.db.flush()
+        return True
+    
+    async def _get_own_template(self, template_id: int, staff_id: int) -> Optional[ScheduleTemplate]:
+        """获取员工自己的有效模板"""
+        result = await self.db.execute(
+            select(ScheduleTemplate).where(
+                ScheduleTemplate.id == template_id,
+                ScheduleTemplate.staff_id == staff_id,
+                ScheduleTemplate.is_active == True
+            )
+        )
+        return result.scalar_one_or_none()
@@ -0,0 +1,103 @@
+"""
+服务规则表
+
+由卡类型目录快照预先计算：(服务类型, 卡类型) -> (服务时长, 每次扣减次数)，
+预约时按服务类型取时长、核销时按卡类型取扣减次数都是一次字典查找，不查询数据库。
+卡类型目录重新加载时一起重建（见 card_catalog）。
+
+- 服务时长：卡类型本身就是这个服务时取卡类型的时长，
+  否则取该服务所有有效卡类型中最长的时长（保证预约时间够用），没有对应卡类型时用默认时长
+- 扣减次数：取卡类型的每次扣减次数，未知卡类型扣1次
+"""
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple, Union
+
+from sqlalchemy import case
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.card import ServiceType, UserCard
+from app.schemas.card import CardTypeResponse
+
+
+# 没有对应卡类型时的默认服务时长（分钟）
+DEFAULT_DURATIONS = {
+    ServiceType.WASH: 30,
+    ServiceType.SOAK: 50,
+    ServiceType.CARE: 50,
+    ServiceType.COMBO: 50,
+}
+DEFAULT_DEDUCT_TIMES = 1
+
+
+class ServiceRule(NamedTuple):
+    """一项服务规则"""
+    duration_minutes: int  # 服务时长（分钟）
+    deduct_times: int  # 每次服务扣减次数
+
+
+class ServiceRules:
+    """服务规则表（只读）"""
+
+    def __init__(self, card_types: Iterable[CardTypeResponse]):
+        card_types = list(card_types)
+        # 服务类型的默认规则（未指定卡类型时）
+        durations = dict(DEFAULT_DURATIONS)
+        for service_type in ServiceType:
+            own = [ct.duration_minutes for ct in card_types
+                   if ct.is_active and ct.service_type == service_type]
+            if own:
+                durations[service_type] = max(own)
+        self._defaults: Dict[ServiceType, ServiceRule] = {
+            service_type: ServiceRule(durations.get(service_type, 30), DEFAULT_DEDUCT_TIMES)
+            for service_type in ServiceType
+        }
+        # (服务类型, 卡类型ID) -> 规则，停用的卡类型也要有（老卡仍会核销）
+        self._rules: Dict[Tuple[ServiceType, int], ServiceRule] = {
+            (service_type, ct.id): ServiceRule(
+                ct.duration_minutes if ct.service_type == service_type else durations[service_type],
+                ct.deduct_times,
+            )
+            for ct in card_types
+            for service_type in ServiceType
+        }
+        self._deduct_times: Dict[int, int] = {ct.id: ct.deduct_times for ct in card_types}
+
+    def rule(self, service_type: ServiceType, card_type_id: Optional[int] = None) -> ServiceRule:
+        """(服务类型, 卡类型) 对应的规则，卡类型未知时用服务类型的默认规则"""
+        rule = self._rules.get((service_type, card_type_id))
+        return rule if rule is not None else self._defaults[service_type]
+
+    def duration(self, service_type: ServiceType, card_type_id: Optional[int] = None) -> int:
+        """服务时长（分钟）"""
+        return self.rule(service_type, card_type_id).duration_minutes
+
+    def deduct_times(
+        self,
+        service_type: ServiceType,
+        card_type_id: Optional[int] = None,
+        service_count: int = 1
+    ) -> int:
+        """核销扣减次数（综合卡按预约时选择的服务数量倍数扣减）"""
+        return self.rule(service_type, card_type_id).deduct_times * max(service_count, 1)
+
+    def deduct_times_expression(self, service_count: int = 1) -> Union[int, ColumnElement]:
+        """
+        扣卡 UPDATE 中使用的扣减次数
+
+        核销时还不知道卡的类型，按卡类型ID取 CASE 在同一条 UPDATE 中算出扣减次数，
+        不必先查询卡；所有卡类型扣减次数相同时直接返回整数
+        """
+        count = max(service_count, 1)
+        if set(self._deduct_times.values()) <= {DEFAULT_DEDUCT_TIMES}:
+            return DEFAULT_DEDUCT_TIMES * count
+        return case(
+            {card_type_id: times * count for card_type_id, times in self._deduct_times.items()},
+            value=UserCard.card_type_id,
+            else_=DEFAULT_DEDUCT_TIMES * count,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "rules": len(self._rules),
+            "durations": {service_type.value: rule.duration_minutes
+                          for service_type, rule in self._defaults.items()},
+        }
@@ -0,0 +1,169 @@
+"""
+登录凭证吊销
+
+token 中带有角色和凭证版本（ver），员工/管理员权限直接由签名校验过的声明判断，不查询数据库。
+用户角色变化或被禁用时凭证版本加一（revoke_user_tokens），之前签发的 token 随之失效：
+
+- 进程内只记录最近吊销过的用户的当前版本（user_id -> 版本），
+  吊销早于 token 有效期的记录不再需要（那之前签发的 token 都已过期）
+- 本进程的吊销在事务提交后立即生效；其他进程的吊销由后台任务
+  按 token_revoked_at 每 TOKEN_REVOCATION_REFRESH 秒增量同步
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import async_session_maker, run_after_commit
+from app.models.user import User
+from app.services.user_cache import user_cache
+
+
+# 增量同步时往前多读的时间，覆盖提交较晚、吊销时间早于上次同步的记录
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+
+class TokenRevocations:
+    """已吊销的登录凭证版本（进程内）"""
+
+    def __init__(
+        self,
+        refresh_interval: float,
+        token_lifetime: timedelta,
+        session_maker: async_sessionmaker = async_session_maker
+    ):
+        self.refresh_interval = refresh_interval
+        self.token_lifetime = token_lifetime
+        self.session_maker = session_maker
+        self._versions: Dict[int, int] = {}  # 用户ID -> 当前凭证版本，更早版本的token无效
+        self._revoked_at: Dict[int, datetime] = {}
+        self._since: Optional[datetime] = None  # 已同步到的吊销时间
+        self._task: Optional[asyncio.Task] = None
+        self.rejected = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        """token 中的凭证版本是否已被吊销"""
+        if version < self._versions.get(user_id, 0):
+            self.rejected += 1
+            return True
+        return False
+
+    def note(self, user_id: int, version: int, revoked_at: datetime) -> None:
+        """记录一次吊销（版本只增不减）"""
+        if version > self._versions.get(user_id, 0):
+            self._versions[user_id] = version
+            self._revoked_at[user_id] = revoked_at
+
+    async def load(self, db: AsyncSession) -> None:
+        """全量加载有效期内的吊销记录（启动时调用）"""
+        self._since = datetime.utcnow() - self.token_lifetime
+        await self.refresh(db)
+
+    async def refresh(self, db: AsyncSession) -> None:
+        """增量同步上次之后的吊销记录，并清理早于 token 有效期的记录"""
+        now = datetime.utcnow()
+        since = (self._since or now - self.token_lifetime) - REFRESH_OVERLAP
+        result = await db.execute(
+            select(User.id, User.token_version, User.token_revoked_at)
+            .where(User.token_revoked_at >= since)
+        )
+        for user_id, version, revoked_at in result:
+            self.note(user_id, version, revoked_at)
+        self._since = now
+
+        expired = now - self.token_lifetime
+        for user_id in [uid for uid, revoked_at in self._revoked_at.items() if revoked_at < expired]:
+            del self._versions[user_id]
+            del self._revoked_at[user_id]
+        self.refreshes += 1
+
+    def clear(self) -> None:
+        self._versions.clear()
+        self._revoked_at.clear()
+        self._since = None
+
+    def start(self) -> None:
+        """启动后台增量同步"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                async with self.session_maker() as db:
+                    await self.refresh(db)
+            except Exception as e:
+                # 同步失败不影响服务，下个周期重试
+                self.errors += 1
+                print(f"同步登录凭证吊销记录失败: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._versions),
+            "rejected": self.rejected,
+            "refreshes": self.refreshes,
+            "synced_at": self._since.isoformat() if self._since else None,
+            "errors": self.errors,
+        }
+
+
+def revoke_user_tokens(db: AsyncSession, user: User) -> None:
+    """
+    吊销用户之前签发的所有 token（角色变化、禁用时调用）
+
+    凭证版本加一，事务提交后本进程立即生效；之后签发的 token 带新版本
+    """
+    user.token_version = (user.token_version or 0) + 1
+    user.token_revoked_at = datetime.utcnow()
+    user_id, version, revoked_at = user.id, user.token_version, user.token_revoked_at
+    run_after_commit(db, lambda: token_revocations.note(user_id, version, revoked_at))
+    user_cache.invalidate_on_commit(db, user_id)
+
+
+async def revoke_tokens(db: AsyncSession, user_ids: List[int]) -> None:
+    """
+    批量吊销多个用户的 token（一条 UPDATE，用于合并账号等批量禁用）
+
+    与 revoke_user_tokens 相同，事务提交后本进程立即生效；不同步会话中已加载的用户对象
+    """
+    if not user_ids:
+        return
+    revoked_at = datetime.utcnow()
+    result = await db.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(token_version=User.token_version + 1, token_revoked_at=revoked_at)
+        .returning(User.id, User.token_version)
+        .execution_options(synchronize_session=False)
+    )
+    revoked = result.all()
+
+    def note_all():
+        for user_id, version in revoked:
+            token_revocations.note(user_id, version, revoked_at)
+
+    run_after_commit(db, note_all)
+    for user_id, _ in revoked:
+        user_cache.invalidate_on_commit(db, user_id)
+
+
+# 全局单例
+token_revocations = TokenRevocations(
+    refresh_interval=settings.TOKEN_REVOCATION_REFRESH,
+    token_lifetime=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+)
@@ -1,13 +1,18 @@
 """
 用户服务
 """
-from typing import List, Optional
-from sqlalchemy import select, or_, update
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.models.appointment import Appointment
 from app.models.user import User, UserRole
 from app.models.card import UserCard
+from app.models.transaction import Transaction
 from app.schemas.user import UserUpdate
+from app.services.customer_search import customer_name_index, search_phone
+from app.services.token_revocation import revoke_tokens
+from app.services.user_cache import user_cache
 
 
 class UserService:
@@ -28,6 +33,7 @@ class UserService:
         update_data = user_data.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(user, key, value)
+        user_cache.invalidate_on_commit(self.db, user_id)
         
         await self.db.flush()
         await self.db.refresh(user)
@@ -56,29 +62,41 @@ class UserService:
     async def search_users(
         self, 
         phone: Optional[str] = None, 
-        nickname: Optional[str] = None
+        nickname: Optional[str] = None,
+        limit: int = 20
     ) -> List[User]:
-        """搜索用户"""
-        query = select(User).where(User.is_active == True)
+        """
+        搜索用户
+        
+        手机号按尾号或开头几位匹配，姓名按昵称或真实姓名包含匹配（走索引，见 customer_search）；
+        结果按匹配程度排序，手机号的结果在前
+        """
+        if not phone and not nickname:
+            result = await self.db.execute(select(User).where(User.is_active == True).limit(limit))
+            return result.scalars().all()
         
-        conditions = []
+        ranked: List[int] = []
         if phone:
-            conditions.append(User.phone.contains(phone))
+            ranked += await search_phone(self.db, phone, limit)
         if nickname:
-            conditions.append(User.nickname.contains(nickname))
+            await customer_name_index.refresh(self.db)
+            ranked += customer_name_index.search(nickname, limit)
+        user_ids = list(dict.fromkeys(ranked))[:limit]
+        if not user_ids:
+            return []
         
-        if conditions:
-            query = query.where(or_(*conditions))
-        
-        result = await self.db.execute(query.limit(20))
-        return result.scalars().all()
+        result = await self.db.execute(
+            select(User).where(User.id.in_(user_ids), User.is_active == True)
+        )
+        users = {user.id: user for user in result.scalars()}
+        return [users[user_id] for user_id in user_ids if user_id in users]
     
     async def bind_phone(self, user_id: int, phone: str) -> dict:
         """
         绑定手机号
         
         如果手机号已被其他用户使用（员工开卡时创建），
-        则将那个用户的卡转移到当前用户
+        则将那些用户的卡、预约和消费记录合并到当前用户
         """
         # 获取当前用户
         current_user = await self.get_user(user_id)
@@ -89,39 +107,65 @@ class UserService:
         if current_user.phone:
             raise ValueError("您已绑定手机号")
         
-        cards_merged = False
-        
-        # 查找是否有其他用户使用这个手机号（员工开卡时创建的）
-        # 可能有多个，所以用 scalars().all()
+        # 查找是否有其他用户使用这个手机号（员工开卡时创建的），可能有多个
         result = await self.db.execute(
-            select(User).where(
+            select(User.id).where(
                 User.phone == phone,
                 User.id != user_id
             )
         )
-        existing_users = result.scalars().all()
-        
-        for existing_user in existing_users:
-            # 将那个用户的卡转移到当前用户
-            await self.db.execute(
-                update(UserCard)
-                .where(UserCard.user_id == existing_user.id)
-                .values(user_id=user_id)
-            )
-            
-            # 如果那个用户没有真实的微信登录（是员工创建的占位用户），可以禁用它
-            if existing_user.openid.startswith('phone_'):
-                existing_user.is_active = False
-                existing_user.phone = None  # 清除手机号避免冲突
-            
-            cards_merged = True
+        source_ids = result.scalars().all()
+        if source_ids:
+            await self.merge_accounts(user_id, source_ids)
         
         # 更新当前用户的手机号
         current_user.phone = phone
+        user_cache.invalidate_on_commit(self.db, user_id)
         await self.db.flush()
         await self.db.refresh(current_user)
         
         return {
             "user": current_user,
-            "cards_merged": cards_merged
+            "cards_merged": bool(source_ids)
         }
+    
+    async def merge_accounts(self, target_id: int, source_ids: List[int]) -> Dict[str, int]:
+        """
+        把 source_ids 这些账号的卡、预约和消费记录合并到 target_id
+        
+        每张表一条批量 UPDATE，在调用方的事务中执行，返回各表改归属的行数。
+        员工开卡时建的占位用户（openid 以 phone_ 开头）合并后禁用、清除手机号，
+        并吊销其 token；有微信登录的账号保留。
+        语句不同步会话中已加载的卡、预约、消费记录对象
+        """
+        source_ids = [source_id for source_id in source_ids if source_id != target_id]
+        if not source_ids:
+            return {}
+        
+        moved = {}
+        for model, column, options in (
+            (UserCard, UserCard.user_id, {}),
+            (Appointment, Appointment.customer_id, {}),
+            # 消费记录追加模式下只允许显式改写
+            (Transaction, Transaction.customer_id, {"ledger_rewrite": True}),
+        ):
+            result = await self.db.execute(
+                update(model)
+                .where(column.in_(source_ids))
+                .values({column.key: target_id})
+                .execution_options(synchronize_session=False, **options)
+            )
+            moved[model.__tablename__] = result.rowcount
+        
+        result = await self.db.execute(
+            update(User)
+            .where(User.id.in_(source_ids), User.openid.startswith("phone_"))
+            .values(is_active=False, phone=None, phone_reversed=None)  # 清除手机号避免冲突
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+        deactivated = result.scalars().all()
+        # 同时失效已认证用户缓存；姓名搜索索引按 updated_at 同步
+        await revoke_tokens(self.db, deactivated)
+        moved["deactivated_users"] = len(deactivated)
+        return moved
@@ -0,0 +1,101 @@
+"""
+已认证用户缓存
+
+每个需要登录的接口都要按 token 中的用户ID确认用户存在、未禁用并取得角色。
+这里按用户ID缓存这几列（进程内LRU + TTL），命中时认证不查询数据库；
+修改用户资料、绑定手机号（会禁用占位用户）、升级为员工时在事务提交后失效。
+"""
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from app.config import settings
+from app.database import run_after_commit
+from app.models.user import UserRole
+
+
+class CachedUser(NamedTuple):
+    """认证用到的用户列"""
+    id: int
+    openid: str
+    role: UserRole
+    is_active: bool
+
+
+class UserCache:
+    """已认证用户缓存（进程内LRU）"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, CachedUser]]" = OrderedDict()
+        # 失效代数：查询前记下，写入时代数变了说明期间有用户被修改，放弃写入
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def generation(self) -> int:
+        """当前失效代数，查询前获取并在 put 时传回"""
+        return self._generation
+    
+    def get(self, user_id: int) -> Optional[CachedUser]:
+        """读取缓存，未命中或已过期返回None"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+    
+    def put(self, user: CachedUser, generation: int) -> None:
+        """写入缓存（查询期间有用户被失效过则不写入）"""
+        if generation != self._generation:
+            return
+        self._entries[user.id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, user_id: int) -> None:
+        self._generation += 1
+        self._entries.pop(user_id, None)
+        self.invalidations += 1
+    
+    def invalidate_on_commit(self, db, user_id: int) -> None:
+        """
+        写操作调用：立即失效，并在事务提交后再失效一次
+        
+        第二次失效覆盖提交前其他请求读到旧数据并回填缓存的情况
+        """
+        self.invalidate(user_id)
+        run_after_commit(db, lambda: self.invalidate(user_id))
+    
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        """命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# 全局单例
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL,
+)
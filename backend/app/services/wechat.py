@@ -0,0 +1,238 @@
+"""
+微信接口客户端
+
+登录时用 code 换取 openid（code2session）。进程内共享一个 httpx.AsyncClient，随应用启动和关闭：
+
+- 连接池保持长连接，登录高峰不再每次重新建立 TCP/TLS 连接
+- 信号量限制同时进行的请求数，超出的排队，排队时间计入总时限
+- 网络错误、超时、5xx、微信返回系统繁忙（errcode -1）时，在总时限内退避重试
+- 连续失败达到阈值后熔断：冷却期内直接失败不再请求微信，
+  冷却结束后放行一个试探请求，成功则恢复
+"""
+import asyncio
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from app.config import settings
+
+
+# 需要重试的微信错误码（-1 系统繁忙）
+RETRYABLE_ERRCODES = {-1}
+# 重试退避的基数（秒），每次翻倍并加随机抖动
+RETRY_BACKOFF = 0.1
+
+
+class WechatUnavailableError(RuntimeError):
+    """微信接口暂时不可用（熔断中、排队超时或重试后仍失败）"""
+
+
+class _RetryableResponse(Exception):
+    """可以重试的响应（5xx、系统繁忙、不是JSON对象）"""
+
+
+class CircuitBreaker:
+    """熔断器：连续失败 threshold 次后打开，cooldown 秒后放行一个试探请求"""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0  # 连续失败次数
+        self.opened_at: Optional[float] = None
+        self.opens = 0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """是否放行请求（半开时只放行一个试探请求）"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            # 达到阈值，或试探请求失败：重新开始冷却
+            if self.opened_at is None:
+                self.opens += 1
+            self.opened_at = time.monotonic()
+
+    def abandon(self) -> None:
+        """试探请求没有结果（被取消、排队超时等，不是微信的问题），释放试探名额"""
+        self._probing = False
+
+
+class WechatClient:
+    """微信接口客户端（进程内共享）"""
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float,
+        deadline: float,
+        retries: int,
+        max_connections: int,
+        max_concurrency: int,
+        breaker_threshold: int,
+        breaker_cooldown: float,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.max_connections = max_connections
+        self.transport = transport
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        self.rejected = 0  # 熔断期间直接拒绝
+        self.queue_timeouts = 0
+        self.in_flight = 0
+
+    async def start(self) -> None:
+        """创建共享的 HTTP 客户端（应用启动时调用，未启动时首次请求自动创建）"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self.transport,
+            )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def code2session(self, app_id: str, secret: str, code: str) -> Optional[dict]:
+        """
+        用登录 code 换取 openid / session_key
+
+        code 无效（微信返回其他错误码）时返回None；
+        熔断中、排队超时或重试后仍失败时抛出 WechatUnavailableError
+        """
+        # 半开时放行的这一个请求是试探请求（判断和 allow() 之间没有 await）
+        probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise WechatUnavailableError("微信登录服务繁忙，请稍后重试")
+        deadline = time.monotonic() + self.deadline
+        params = {
+            "appid": app_id,
+            "secret": secret,
+            "js_code": code,
+            "grant_type": "authorization_code",
+        }
+
+        try:
+            await self.start()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.deadline)
+            except asyncio.TimeoutError:
+                # 本进程排队太久，与微信是否正常无关，不计入熔断
+                self.queue_timeouts += 1
+                raise WechatUnavailableError("微信登录排队超时，请稍后重试")
+
+            self.in_flight += 1
+            try:
+                return await self._request_with_retries(params, deadline)
+            finally:
+                self.in_flight -= 1
+                self._semaphore.release()
+        except BaseException:
+            # 试探请求没有记录成功或失败就结束（取消、排队超时、意外的异常）时释放试探名额，
+            # 否则半开状态下 allow() 会一直拒绝，直到进程重启
+            if probe:
+                self.breaker.abandon()
+            raise
+
+    async def _request_with_retries(self, params: dict, deadline: float) -> Optional[dict]:
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self.retried += 1
+            try:
+                data = await self._request(params, min(self.timeout, remaining))
+            except (httpx.RequestError, _RetryableResponse):
+                # 超时（httpx.TimeoutException）、响应体解压失败（httpx.DecodingError）也是 RequestError
+                backoff = RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+                if attempt == self.retries or time.monotonic() + backoff >= deadline:
+                    break
+                await asyncio.sleep(backoff)
+                continue
+            self.breaker.record_success()
+            return data if "openid" in data else None
+
+        self.failures += 1
+        self.breaker.record_failure()
+        raise WechatUnavailableError("微信登录服务暂时不可用，请稍后重试")
+
+    async def _request(self, params: dict, timeout: float) -> dict:
+        self.requests += 1
+        response = await self._client.get("/sns/jscode2session", params=params, timeout=timeout)
+        if response.status_code >= 500:
+            raise _RetryableResponse(response.status_code)
+        try:
+            # 微信返回的 Content-Type 是 text/plain
+            data = response.json()
+        except ValueError:
+            raise _RetryableResponse("invalid json")
+        if not isinstance(data, dict):
+            raise _RetryableResponse("invalid json")
+        if data.get("errcode") in RETRYABLE_ERRCODES:
+            raise _RetryableResponse(data.get("errcode"))
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+            "consecutive_failures": self.breaker.failures,
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "in_flight": self.in_flight,
+        }
+
+
+# 全局单例
+wechat_client = WechatClient(
+    base_url=settings.WECHAT_API_URL,
+    timeout=settings.WECHAT_TIMEOUT,
+    deadline=settings.WECHAT_DEADLINE,
+    retries=settings.WECHAT_RETRIES,
+    max_connections=settings.WECHAT_MAX_CONNECTIONS,
+    max_concurrency=settings.WECHAT_MAX_CONCURRENCY,
+    breaker_threshold=settings.WECHAT_BREAKER_THRESHOLD,
+    breaker_cooldown=settings.WECHAT_BREAKER_COOLDOWN,
+)
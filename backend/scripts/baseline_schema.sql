@@ -0,0 +1,131 @@
+-- 第一版（迁移前）的表结构，用于检查迁移后的库，见 scripts/test_query_plans.py
+CREATE TABLE users (
+	id INTEGER NOT NULL, 
+	openid VARCHAR(64) NOT NULL, 
+	union_id VARCHAR(64), 
+	nickname VARCHAR(50), 
+	phone VARCHAR(20), 
+	avatar_url VARCHAR(500), 
+	role VARCHAR(8) NOT NULL, 
+	is_active BOOLEAN NOT NULL, 
+	real_name VARCHAR(50), 
+	employee_no VARCHAR(20), 
+	introduction VARCHAR(500), 
+	created_at DATETIME NOT NULL, 
+	updated_at DATETIME NOT NULL, 
+	PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_users_openid ON users (openid);
+CREATE INDEX ix_users_phone ON users (phone);
+CREATE TABLE stores (
+	id INTEGER NOT NULL, 
+	name VARCHAR(100) NOT NULL, 
+	address VARCHAR(200) NOT NULL, 
+	phone VARCHAR(20), 
+	latitude FLOAT, 
+	longitude FLOAT, 
+	opening_time VARCHAR(10) NOT NULL, 
+	closing_time VARCHAR(10) NOT NULL, 
+	description TEXT, 
+	images TEXT, 
+	is_active BOOLEAN NOT NULL, 
+	created_at DATETIME NOT NULL, 
+	updated_at DATETIME NOT NULL, 
+	PRIMARY KEY (id)
+);
+CREATE TABLE card_types (
+	id INTEGER NOT NULL, 
+	name VARCHAR(50) NOT NULL, 
+	service_type VARCHAR(5) NOT NULL, 
+	total_times INTEGER, 
+	validity_days INTEGER, 
+	price FLOAT NOT NULL, 
+	single_price FLOAT NOT NULL, 
+	deduct_times INTEGER NOT NULL, 
+	duration_minutes INTEGER NOT NULL, 
+	description TEXT, 
+	notes VARCHAR(200), 
+	is_active BOOLEAN NOT NULL, 
+	created_at DATETIME NOT NULL, 
+	PRIMARY KEY (id)
+);
+CREATE TABLE user_cards (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	card_type_id INTEGER NOT NULL, 
+	remaining_times INTEGER, 
+	expire_date DATETIME, 
+	created_by INTEGER, 
+	is_active BOOLEAN NOT NULL, 
+	created_at DATETIME NOT NULL, 
+	updated_at DATETIME NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES users (id), 
+	FOREIGN KEY(card_type_id) REFERENCES card_types (id), 
+	FOREIGN KEY(created_by) REFERENCES users (id)
+);
+CREATE INDEX ix_user_cards_user_id ON user_cards (user_id);
+CREATE TABLE schedules (
+	id INTEGER NOT NULL, 
+	staff_id INTEGER NOT NULL, 
+	store_id INTEGER NOT NULL, 
+	work_date DATE NOT NULL, 
+	start_time VARCHAR(10) NOT NULL, 
+	end_time VARCHAR(10) NOT NULL, 
+	is_active BOOLEAN NOT NULL, 
+	created_at DATETIME NOT NULL, 
+	updated_at DATETIME NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(staff_id) REFERENCES users (id), 
+	FOREIGN KEY(store_id) REFERENCES stores (id)
+);
+CREATE INDEX ix_schedules_staff_id ON schedules (staff_id);
+CREATE INDEX ix_schedules_store_id ON schedules (store_id);
+CREATE INDEX ix_schedules_work_date ON schedules (work_date);
+CREATE TABLE appointments (
+	id INTEGER NOT NULL, 
+	customer_id INTEGER NOT NULL, 
+	staff_id INTEGER NOT NULL, 
+	store_id INTEGER NOT NULL, 
+	service_type VARCHAR(5) NOT NULL, 
+	service_count INTEGER NOT NULL, 
+	appointment_date DATE NOT NULL, 
+	start_time VARCHAR(10) NOT NULL, 
+	end_time VARCHAR(10) NOT NULL, 
+	status VARCHAR(9) NOT NULL, 
+	notes TEXT, 
+	completed_at DATETIME, 
+	completed_by INTEGER, 
+	created_at DATETIME NOT NULL, 
+	updated_at DATETIME NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(customer_id) REFERENCES users (id), 
+	FOREIGN KEY(staff_id) REFERENCES users (id), 
+	FOREIGN KEY(store_id) REFERENCES stores (id), 
+	FOREIGN KEY(completed_by) REFERENCES users (id)
+);
+CREATE INDEX ix_appointments_customer_id ON appointments (customer_id);
+CREATE INDEX ix_appointments_appointment_date ON appointments (appointment_date);
+CREATE INDEX ix_appointments_staff_id ON appointments (staff_id);
+CREATE INDEX ix_appointments_store_id ON appointments (store_id);
+CREATE TABLE transactions (
+	id INTEGER NOT NULL, 
+	customer_id INTEGER NOT NULL, 
+	user_card_id INTEGER NOT NULL, 
+	appointment_id INTEGER, 
+	transaction_type VARCHAR(7) NOT NULL, 
+	service_type VARCHAR(5) NOT NULL, 
+	times_changed INTEGER NOT NULL, 
+	times_before INTEGER, 
+	times_after INTEGER, 
+	operator_id INTEGER NOT NULL, 
+	notes TEXT, 
+	created_at DATETIME NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(customer_id) REFERENCES users (id), 
+	FOREIGN KEY(user_card_id) REFERENCES user_cards (id), 
+	FOREIGN KEY(appointment_id) REFERENCES appointments (id), 
+	FOREIGN KEY(operator_id) REFERENCES users (id)
+);
+CREATE INDEX ix_transactions_customer_id ON transactions (customer_id);
+CREATE INDEX ix_transactions_user_card_id ON transactions (user_card_id);
@@ -0,0 +1,131 @@
+"""
+预约列表压测：全量列表 vs 游标分页
+
+给一个老客户和一个员工造大量预约，对比原来的全量列表（整行加载 + 嵌套门店/人员）
+和分页列表（只查展示列 + 对照表）的耗时和响应大小，并确认逐页翻完的结果
+与全量列表顺序一致、不重不漏
+
+运行方式：
+cd backend
+python -m scripts.bench_appointment_lists
+"""
+import asyncio
+import json
+from datetime import date, timedelta
+
+from scripts.common import temp_database, timer, QueryCounter
+
+from sqlalchemy import insert
+
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import ServiceType
+from app.models.store import Store
+from app.models.user import User, UserRole
+from app.schemas.appointment import AppointmentDetail
+from app.services.appointment import AppointmentService
+
+
+FIRST_DATE = date(2020, 1, 1)
+PAGE_SIZE = 20
+
+
+async def seed(session_maker, appointments: int):
+    async with session_maker() as db:
+        stores = [Store(name=f"门店{i}", address="测试地址" * 5, description="门店介绍" * 20)
+                  for i in range(5)]
+        customer = User(openid="customer", nickname="老客户", phone="13800000000")
+        others = [User(openid=f"other_{i}", nickname=f"客户{i}") for i in range(50)]
+        staff = [User(openid=f"staff_{i}", role=UserRole.STAFF, nickname=f"技师{i}",
+                      real_name=f"技师{i}", introduction="擅长养发" * 20) for i in range(8)]
+        db.add_all([*stores, customer, *others, *staff])
+        await db.flush()
+
+        rows = []
+        for i in range(appointments):
+            start = 540 + (i % 20) * 30
+            rows.append({
+                "customer_id": customer.id if i % 2 == 0 else others[i % len(others)].id,
+                "staff_id": staff[0].id if i % 2 == 1 else staff[i % len(staff)].id,
+                "store_id": stores[i % len(stores)].id,
+                "service_type": ServiceType.WASH,
+                "service_count": 1,
+                "appointment_date": FIRST_DATE + timedelta(days=i // 20),
+                "start_minute": start,
+                "end_minute": start + 30,
+                "status": AppointmentStatus.COMPLETED,
+            })
+        await db.execute(insert(Appointment), rows)
+        await db.commit()
+        return customer.id, staff[0].id
+
+
+async def walk_pages(list_page):
+    """从第一页翻到最后一页，返回所有ID和页数"""
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = await list_page(cursor)
+        ids.extend(item.id for item in page.items)
+        pages += 1
+        cursor = page.next_cursor
+        if cursor is None:
+            return ids, pages
+
+
+async def compare(engine, session_maker, label, owner_id, full_list, list_page):
+    async with session_maker() as db:
+        # 和接口一样，当前用户已在会话中（全量列表的嵌套对象依赖这一点）
+        owner = await db.get(User, owner_id)  # noqa: F841  会话只弱引用，需保持引用
+        service = AppointmentService(db)
+        with QueryCounter(engine) as counter, timer() as elapsed:
+            full = await full_list(service)
+            payload = json.dumps(
+                [AppointmentDetail.model_validate(a).model_dump(mode="json") for a in full]
+            )
+        full_ms, full_sql = elapsed(), counter.count
+
+    async with session_maker() as db:
+        service = AppointmentService(db)
+        with QueryCounter(engine) as counter, timer() as elapsed:
+            first = await list_page(service, None)
+            page_payload = first.model_dump_json()
+        page_ms, page_sql = elapsed(), counter.count
+
+        ids, pages = await walk_pages(lambda cursor: list_page(service, cursor))
+        assert ids == [a.id for a in full], f"{label}: 逐页结果与全量列表不一致"
+
+        # 最后一页（游标定位，不扫描前面的行）
+        cursor = None
+        for _ in range(pages - 1):
+            cursor = (await list_page(service, cursor)).next_cursor
+        with timer() as elapsed:
+            await list_page(service, cursor)
+        last_ms = elapsed()
+
+    print(f"{label:<6} {len(full):>6} | {full_sql:>3} {full_ms:>8.1f} {len(payload) / 1024:>8.1f} | "
+          f"{page_sql:>3} {page_ms:>6.2f} {len(page_payload) / 1024:>6.1f} {last_ms:>6.2f} | {pages:>4}")
+
+
+async def main():
+    print(f"{'列表':<5} {'条数':>6} | {'全量SQL':>3} {'ms':>8} {'KB':>8} | "
+          f"{'分页SQL':>3} {'首页ms':>5} {'KB':>6} {'末页ms':>5} | {'页数':>3}")
+    print("-" * 84)
+    for appointments in (2000, 20000):
+        async with temp_database() as (engine, session_maker):
+            customer_id, staff_id = await seed(session_maker, appointments)
+            await compare(
+                engine, session_maker, "客户", customer_id,
+                lambda service: service.get_customer_appointments(customer_id),
+                lambda service, cursor: service.list_customer_appointments(
+                    customer_id, cursor=cursor, limit=PAGE_SIZE),
+            )
+            await compare(
+                engine, session_maker, "员工", staff_id,
+                lambda service: service.get_staff_appointments(staff_id),
+                lambda service, cursor: service.list_staff_appointments(
+                    staff_id, cursor=cursor, limit=PAGE_SIZE),
+            )
+    print("✅ 逐页翻完与全量列表一致")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""
+认证压测：每次查询用户 vs 已认证用户缓存 vs token 中的角色声明
+
+直接调用员工权限依赖（get_current_user + require_staff），对比
+每次查询 users 表（旧token，每次调用前清空缓存）、命中已认证用户缓存（旧token）
+与按 token 中的角色和凭证版本授权（新token）的耗时和SQL条数，并确认：
+- 升级为员工后之前的客户 token 失效，重新登录的 token 带员工角色
+- 绑定手机号禁用占位用户后，占位用户的 token 立即失效
+- 修改资料后缓存失效；回滚的修改之后认证到的仍是库中的用户
+- 其他进程的吊销经增量同步后生效
+
+运行方式：
+cd backend
+python -m scripts.bench_auth
+"""
+import asyncio
+import statistics
+from datetime import timedelta
+
+from scripts.common import temp_database, timer, QueryCounter
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.models.user import User, UserRole
+from app.schemas.user import UserUpdate
+from app.services.auth import AuthService, get_current_user, require_staff
+from app.services.token_revocation import TokenRevocations, revoke_user_tokens
+from app.services.user import UserService
+from app.services.user_cache import user_cache
+
+
+CALLS = 2000
+
+
+def credentials_for(user: User, claims: bool = True) -> HTTPAuthorizationCredentials:
+    """claims 为假时签发不带角色的旧token"""
+    service = AuthService(None)
+    if claims:
+        token = service._create_access_token(user.id, user.openid, user.role, user.token_version)
+    else:
+        token = service._create_access_token(user.id, user.openid)
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+async def authenticate(session_maker, credentials):
+    """与请求一致：每次一个会话"""
+    async with session_maker() as db:
+        return await get_current_user(credentials, db)
+
+
+async def authorize_staff(session_maker, credentials):
+    return await require_staff(await authenticate(session_maker, credentials))
+
+
+async def measure(engine, session_maker, credentials, cached: bool):
+    """返回 (每次调用耗时ms中位数, 每次调用SQL条数)"""
+    latencies = []
+    with QueryCounter(engine) as counter:
+        for _ in range(CALLS):
+            if not cached:
+                user_cache.clear()
+            with timer() as elapsed:
+                await authorize_staff(session_maker, credentials)
+            latencies.append(elapsed())
+    return statistics.median(latencies), counter.count / CALLS
+
+
+async def expect_unauthorized(session_maker, credentials):
+    try:
+        await authenticate(session_maker, credentials)
+    except HTTPException as e:
+        assert e.status_code == 401
+    else:
+        raise AssertionError("已失效的token不应通过认证")
+
+
+async def main():
+    async with temp_database() as (engine, session_maker):
+        async with session_maker() as db:
+            staff = User(openid="staff_王五", nickname="王五", role=UserRole.STAFF)
+            customer = User(openid="dev_customer_张三", nickname="张三")
+            placeholder = User(openid="phone_13800000000", phone="13800000000")
+            db.add_all([staff, customer, placeholder])
+            await db.commit()
+
+        results = [
+            ("每次查询", await measure(engine, session_maker, credentials_for(staff, claims=False), cached=False)),
+            ("缓存命中", await measure(engine, session_maker, credentials_for(staff, claims=False), cached=True)),
+            ("token声明", await measure(engine, session_maker, credentials_for(staff), cached=True)),
+        ]
+        assert results[-1][1][1] == 0, "按token声明授权不应查询数据库"
+
+        # 升级为员工：之前的客户token失效，重新签发的token带员工角色
+        customer_credentials = credentials_for(customer)
+        assert (await authenticate(session_maker, customer_credentials)).role == UserRole.CUSTOMER
+        async with session_maker() as db:
+            # 同一微信账号选择员工角色登录（密码已校验）
+            upgraded = await AuthService(db)._get_or_create_user(customer.openid, role="staff", nickname="张三")
+            await db.commit()
+        await expect_unauthorized(session_maker, customer_credentials)
+        assert (await authorize_staff(session_maker, credentials_for(upgraded))).role == UserRole.STAFF
+
+        # 旧token走缓存：修改资料后缓存失效；回滚的修改之后重新加载的仍是库中的值
+        legacy = credentials_for(upgraded, claims=False)
+        assert (await authenticate(session_maker, legacy)).role == UserRole.STAFF
+        async with session_maker() as db:
+            await UserService(db).update_user(customer.id, UserUpdate(nickname="李四"))
+            await db.rollback()
+        assert (await authenticate(session_maker, legacy)).role == UserRole.STAFF
+        async with session_maker() as db:
+            await UserService(db).update_user(customer.id, UserUpdate(nickname="李四"))
+            await db.commit()
+        assert user_cache.get(customer.id) is None
+
+        # 绑定手机号禁用占位用户：占位用户的新旧token都立即失效
+        placeholder_tokens = [credentials_for(placeholder), credentials_for(placeholder, claims=False)]
+        for credentials in placeholder_tokens:
+            assert (await authenticate(session_maker, credentials)).is_active
+        async with session_maker() as db:
+            await UserService(db).bind_phone(customer.id, "13800000000")
+            await db.commit()
+        for credentials in placeholder_tokens:
+            await expect_unauthorized(session_maker, credentials)
+
+        # 其他进程：增量同步后才看到本进程之外的吊销
+        other = TokenRevocations(refresh_interval=30, token_lifetime=timedelta(days=7),
+                                 session_maker=session_maker)
+        async with session_maker() as db:
+            await other.load(db)
+        staff_version = staff.token_version
+        assert not other.is_revoked(staff.id, staff_version)
+        async with session_maker() as db:
+            revoke_user_tokens(db, await db.get(User, staff.id))
+            await db.commit()
+        assert not other.is_revoked(staff.id, staff_version)
+        async with session_maker() as db:
+            await other.refresh(db)
+        assert other.is_revoked(staff.id, staff_version)
+        assert other.stats()["size"] == 3
+
+    print(f"{'方式':<10} | {'员工权限校验ms(中位)':>16} {'每次SQL':>8}")
+    print("-" * 44)
+    for label, (latency, sql) in results:
+        print(f"{label:<10} | {latency:>22.3f} {sql:>8.1f}")
+    print(f"token声明 比每次查询快 {results[0][1][0] / results[-1][1][0]:.1f}x")
+    print("✅ 员工权限不查询数据库；升级员工、禁用用户后旧token失效，其他进程同步后生效")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""
+可预约员工查询性能对比
+
+对比逐员工查询预约（N+1）与一次查询 + 槽位位图两种实现的
+SQL条数和耗时（不走缓存），并校验两者结果一致；最后一列为缓存命中时的耗时
+
+运行方式：
+cd backend
+python -m scripts.bench_availability
+"""
+import asyncio
+import random
+import statistics
+from datetime import date
+
+from scripts.common import temp_database, QueryCounter, timer
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import ServiceType
+from app.models.schedule import Schedule
+from app.models.store import Store
+from app.models.user import User, UserRole
+from app.models.time_range import minutes_to_time
+from app.services.availability import availability_cache
+from app.services.schedule import ScheduleService
+
+
+STAFF_COUNTS = [5, 20, 50, 100]
+REPEAT = 20
+WORK_DATE = date(2026, 1, 10)
+
+
+async def legacy_available_staff(db, store_id, work_date, service_duration):
+    """原实现：每个员工单独查询预约，逐时间点检查集合"""
+    result = await db.execute(
+        select(Schedule)
+        .options(selectinload(Schedule.staff))
+        .where(
+            Schedule.store_id == store_id,
+            Schedule.work_date == work_date,
+            Schedule.is_active == True
+        )
+    )
+    available = {}
+    for schedule in result.scalars().all():
+        appointments = (await db.execute(
+            select(Appointment).where(
+                Appointment.staff_id == schedule.staff_id,
+                Appointment.appointment_date == work_date,
+                Appointment.status.in_([AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED])
+            )
+        )).scalars().all()
+        occupied = set()
+        for apt in appointments:
+            for t in range(apt.start_minute, apt.end_minute, 30):
+                occupied.add(t)
+        times = []
+        current = schedule.start_minute
+        end = schedule.end_minute
+        while current + service_duration <= end:
+            if all(t not in occupied for t in range(current, current + service_duration, 30)):
+                times.append(minutes_to_time(current))
+            current += 30
+        if times:
+            available[schedule.staff_id] = times
+    return available
+
+
+async def seed(session_maker, staff_count):
+    rng = random.Random(staff_count)
+    async with session_maker() as db:
+        store = Store(name="测试门店", address="测试地址")
+        customer = User(openid="bench_customer", role=UserRole.CUSTOMER)
+        db.add_all([store, customer])
+        await db.flush()
+        for i in range(staff_count):
+            staff = User(openid=f"bench_staff_{i}", real_name=f"员工{i}", role=UserRole.STAFF)
+            db.add(staff)
+            await db.flush()
+            db.add(Schedule(
+                staff_id=staff.id, store_id=store.id, work_date=WORK_DATE,
+                start_time="09:00", end_time="21:00"
+            ))
+            # 每个员工随机若干个不重叠的预约
+            for slot in sorted(rng.sample(range(0, 22, 2), 5)):
+                start = 9 * 60 + slot * 30
+                db.add(Appointment(
+                    customer_id=customer.id, staff_id=staff.id, store_id=store.id,
+                    service_type=ServiceType.CARE, appointment_date=WORK_DATE,
+                    start_time=minutes_to_time(start), end_time=minutes_to_time(start + 50),
+                    status=AppointmentStatus.CONFIRMED
+                ))
+        await db.commit()
+        return store.id
+
+
+async def measure(engine, session_maker, func, use_cache=False):
+    latencies = []
+    queries = 0
+    result = None
+    for _ in range(REPEAT):
+        if not use_cache:
+            availability_cache.clear()
+        async with session_maker() as db:
+            with QueryCounter(engine) as counter, timer() as elapsed:
+                result = await func(db)
+            latencies.append(elapsed())
+            queries = counter.count
+    return result, queries, statistics.median(latencies)
+
+
+async def main():
+    print(f"{'员工数':>6} | {'原实现SQL':>9} {'原实现ms':>9} | {'新实现SQL':>9} {'新实现ms':>9} | {'缓存ms':>7}")
+    print("-" * 66)
+    for staff_count in STAFF_COUNTS:
+        async with temp_database() as (engine, session_maker):
+            store_id = await seed(session_maker, staff_count)
+
+            legacy, legacy_queries, legacy_ms = await measure(
+                engine, session_maker,
+                lambda db: legacy_available_staff(db, store_id, WORK_DATE, 50)
+            )
+            current, current_queries, current_ms = await measure(
+                engine, session_maker,
+                lambda db: ScheduleService(db).get_available_staff(store_id, WORK_DATE, 50)
+            )
+
+            _, _, cached_ms = await measure(
+                engine, session_maker,
+                lambda db: ScheduleService(db).get_available_staff(store_id, WORK_DATE, 50),
+                use_cache=True
+            )
+
+            assert legacy == {item.staff.id: item.available_times for item in current}, "结果不一致"
+            print(f"{staff_count:>6} | {legacy_queries:>9} {legacy_ms:>9.2f} | "
+                  f"{current_queries:>9} {current_ms:>9.2f} | {cached_ms:>7.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
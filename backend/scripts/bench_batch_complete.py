@@ -0,0 +1,139 @@
+"""
+批量核销压测：逐个核销 vs 批量核销
+
+同样的一天预约（部分客户共用一张卡，夹杂过期卡、次数不足、重复提交），
+分别用逐个调用 complete_appointment（每个一次提交，和逐个请求接口一致）
+和一次 complete_appointments_batch 核销，对比SQL数量和耗时，
+并确认两种方式最终的卡内次数、消费记录和预约状态一致
+
+运行方式：
+cd backend
+python -m scripts.bench_batch_complete
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+
+from scripts.common import temp_database, timer, QueryCounter
+
+from sqlalchemy import insert, select
+
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.store import Store
+from app.models.transaction import Transaction
+from app.models.user import User, UserRole
+from app.schemas.appointment import BatchCompleteItem
+from app.services.appointment import AppointmentService
+
+
+WORK_DATE = date(2026, 1, 10)
+
+
+async def seed(session_maker, count: int):
+    """返回 (员工ID, 核销项列表)"""
+    async with session_maker() as db:
+        store = Store(name="测试门店", address="测试地址")
+        staff = User(openid="staff", role=UserRole.STAFF)
+        customers = [User(openid=f"customer_{i}") for i in range(count)]
+        card_type = CardType(name="洗头10次卡", service_type=ServiceType.WASH, total_times=10)
+        db.add_all([store, staff, *customers, card_type])
+        await db.flush()
+
+        # 每4个客户中：3个用自己的卡，第4个用前一个人的卡（家庭共用卡）
+        cards = []
+        for i, customer in enumerate(customers):
+            expire_date = datetime.utcnow() - timedelta(days=1) if i % 25 == 24 else None
+            remaining = 1 if i % 10 == 9 else 10
+            cards.append(UserCard(user_id=customer.id, card_type_id=card_type.id,
+                                  remaining_times=remaining, expire_date=expire_date))
+        db.add_all(cards)
+        await db.flush()
+
+        rows = [
+            {
+                "customer_id": customer.id,
+                "staff_id": staff.id,
+                "store_id": store.id,
+                "service_type": ServiceType.WASH,
+                "service_count": 2 if i % 7 == 0 else 1,
+                "appointment_date": WORK_DATE,
+                "start_minute": 540 + i,
+                "end_minute": 570 + i,
+                "status": AppointmentStatus.CONFIRMED,
+            }
+            for i, customer in enumerate(customers)
+        ]
+        appointment_ids = (await db.scalars(insert(Appointment).returning(Appointment.id), rows)).all()
+        await db.commit()
+
+        items = [
+            BatchCompleteItem(
+                appointment_id=appointment_id,
+                user_card_id=cards[i - 1 if i % 4 == 3 else i].id
+            )
+            for i, appointment_id in enumerate(sorted(appointment_ids))
+        ]
+        items.append(items[0])  # 重复提交
+        return staff.id, items
+
+
+async def snapshot(session_maker):
+    async with session_maker() as db:
+        cards = (await db.execute(
+            select(UserCard.id, UserCard.remaining_times).order_by(UserCard.id)
+        )).all()
+        transactions = (await db.execute(
+            select(Transaction.user_card_id, Transaction.appointment_id, Transaction.times_changed,
+                   Transaction.times_before, Transaction.times_after)
+            .order_by(Transaction.appointment_id)
+        )).all()
+        statuses = (await db.execute(
+            select(Appointment.id, Appointment.status).order_by(Appointment.id)
+        )).all()
+        return cards, transactions, statuses
+
+
+async def run_single(engine, session_maker, staff_id, items):
+    succeeded = 0
+    with QueryCounter(engine) as counter, timer() as elapsed:
+        for item in items:
+            async with session_maker() as db:
+                ok = await AppointmentService(db).complete_appointment(
+                    item.appointment_id, item.user_card_id, staff_id
+                )
+                await db.commit()
+                succeeded += ok
+    return succeeded, counter.count, elapsed()
+
+
+async def run_batch(engine, session_maker, staff_id, items):
+    with QueryCounter(engine) as counter, timer() as elapsed:
+        async with session_maker() as db:
+            results = await AppointmentService(db).complete_appointments_batch(items, staff_id)
+            await db.commit()
+    return sum(result.success for result in results), counter.count, elapsed()
+
+
+async def main():
+    print(f"{'预约数':>4} | {'逐个成功':>4} {'SQL':>6} {'ms':>8} | {'批量成功':>4} {'SQL':>4} {'ms':>7} | {'加速':>5}")
+    print("-" * 64)
+    for count in (20, 100, 200):
+        async with temp_database() as (engine, session_maker):
+            staff_id, items = await seed(session_maker, count)
+            single_ok, single_sql, single_ms = await run_single(engine, session_maker, staff_id, items)
+            single_state = await snapshot(session_maker)
+
+        async with temp_database() as (engine, session_maker):
+            staff_id, items = await seed(session_maker, count)
+            batch_ok, batch_sql, batch_ms = await run_batch(engine, session_maker, staff_id, items)
+            batch_state = await snapshot(session_maker)
+
+        assert single_ok == batch_ok, "两种方式成功数不一致"
+        assert single_state == batch_state, "两种方式最终数据不一致"
+        print(f"{count:>6} | {single_ok:>8} {single_sql:>6} {single_ms:>8.1f} | "
+              f"{batch_ok:>8} {batch_sql:>4} {batch_ms:>7.1f} | {single_ms / batch_ms:>5.1f}x")
+    print("✅ 批量核销与逐个核销结果一致")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""
+卡过期扫描压测
+
+造大量持卡（约三分之一已过期），扫描的同时持续有员工扣卡（每个员工每10ms一次），
+对比不扫描、一次性 UPDATE 全部过期卡、分批扫描（每批一个短事务）时扣卡请求的耗时分布，
+并确认标记的卡正好是已到期的卡、再次扫描不做任何事
+
+运行方式：
+cd backend
+python -m scripts.bench_card_expiry
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from scripts.common import temp_database, timer
+
+from sqlalchemy import insert, select
+
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.user import User, UserRole
+from app.services.card import CardService
+from app.services.card_expiry import CardExpirySweeper
+
+
+NOW = datetime(2026, 1, 10, 12, 0)
+LIVE_CARDS = 50  # 扫描期间被扣卡的有效卡
+WORKERS = 2  # 同时扣卡的员工数
+BASELINE_SECONDS = 2  # 对照组扣卡时长
+
+
+async def seed(session_maker, count: int):
+    """返回 (员工ID, 扣卡用的有效卡ID列表)"""
+    async with session_maker() as db:
+        staff = User(openid="staff", role=UserRole.STAFF)
+        customers = [User(openid=f"customer_{i}") for i in range(100)]
+        card_type = CardType(name="洗头10次卡", service_type=ServiceType.WASH, total_times=10)
+        db.add_all([staff, *customers, card_type])
+        await db.flush()
+        rows = []
+        for i in range(count):
+            if i % 3 == 0:
+                expire_date = NOW - timedelta(days=1 + i % 300)  # 已过期
+            elif i % 3 == 1:
+                expire_date = NOW + timedelta(days=1 + i % 300)
+            else:
+                expire_date = None  # 永久有效
+            rows.append({
+                "user_id": customers[i % len(customers)].id,
+                "card_type_id": card_type.id,
+                "remaining_times": 10000,
+                "expire_date": expire_date,
+            })
+        await db.execute(insert(UserCard), rows)
+        await db.commit()
+        live_ids = (await db.scalars(
+            select(UserCard.id).where(UserCard.expire_date.is_(None)).limit(LIVE_CARDS)
+        )).all()
+        return staff.id, live_ids
+
+
+async def deduct_loop(session_maker, staff_id, card_ids, stop: asyncio.Event, latencies: list):
+    """扫描期间不停扣卡，记录每次扣卡（含提交）的耗时"""
+    i = 0
+    while not stop.is_set():
+        with timer() as elapsed:
+            async with session_maker() as db:
+                transaction = await CardService(db).deduct_card(card_ids[i % len(card_ids)], 1, staff_id)
+                await db.commit()
+        assert transaction is not None
+        latencies.append(elapsed())
+        i += 1
+        await asyncio.sleep(0.01)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+async def run(count: int, chunk_size: int, pause: float):
+    """chunk_size 为0时不扫描，只在同样时长内扣卡作为对照"""
+    async with temp_database() as (engine, session_maker):
+        staff_id, live_ids = await seed(session_maker, count)
+        sweeper = CardExpirySweeper(interval=60, chunk_size=chunk_size or 1, pause=pause,
+                                    session_maker=session_maker)
+
+        stop, latencies = asyncio.Event(), []
+        workers = [asyncio.create_task(deduct_loop(session_maker, staff_id, live_ids, stop, latencies))
+                   for _ in range(WORKERS)]
+        await asyncio.sleep(0.05)
+        if chunk_size:
+            await sweeper.sweep(NOW)
+        else:
+            await asyncio.sleep(BASELINE_SECONDS)
+        stop.set()
+        await asyncio.gather(*workers)
+        stats = sweeper.stats()
+
+        if chunk_size:
+            with timer() as elapsed:
+                again = await sweeper.sweep(NOW)
+            stats["rerun_ms"] = elapsed()
+            async with session_maker() as db:
+                expired_ids = set((await db.scalars(
+                    select(UserCard.id).where(UserCard.is_expired == True))).all())
+                due_ids = set((await db.scalars(select(UserCard.id).where(UserCard.expire_date < NOW))).all())
+            assert expired_ids == due_ids, "标记结果应正好是已到期的卡"
+            assert again == 0, "再次扫描不应再标记"
+        return stats, latencies
+
+
+async def main():
+    print(f"{'持卡数':>6} {'方式':<10} | {'标记':>6} {'批数':>4} {'总ms':>7} {'单批最长ms':>8} | "
+          f"{'扣卡':>4} {'p50ms':>6} {'p99ms':>7} {'最长ms':>7}")
+    print("-" * 92)
+    for count in (30000, 150000):
+        for label, chunk_size, pause in (("不扫描", 0, 0), ("一次UPDATE", count, 0),
+                                         ("每批500", 500, 0.05), ("每批2000", 2000, 0.05)):
+            stats, latencies = await run(count, chunk_size, pause)
+            print(f"{count:>9} {label:<10} | {stats['last_marked']:>8} {stats['last_chunks']:>6} "
+                  f"{stats['last_duration_ms']:>9.1f} {stats['max_chunk_ms']:>13.1f} | "
+                  f"{len(latencies):>6} {percentile(latencies, 0.5):>7.1f} "
+                  f"{percentile(latencies, 0.99):>7.1f} {max(latencies):>8.1f}")
+    print("✅ 过期标记正确，再次扫描为空")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
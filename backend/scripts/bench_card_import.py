@@ -0,0 +1,174 @@
+"""
+批量导入压测：逐个开卡 vs 流式批量导入
+
+生成一份纸质记录导出的 CSV（部分手机号重复、部分是已有客户、夹杂错误行），
+对比逐行调用 create_new_customer_card（每行一个事务，和逐个请求接口一致）与 CardImporter 的耗时，
+并确认两种方式得到的客户和卡一致、重复手机号只建一个客户、错误行被跳过并报告行号
+
+运行方式：
+cd backend
+python -m scripts.bench_card_import
+"""
+import asyncio
+import csv
+import io
+import json
+import random
+
+from scripts.common import temp_database, timer, QueryCounter
+from scripts.init_data import CARD_TYPES
+
+from sqlalchemy import func, select
+
+from app.models.card import CardType, UserCard
+from app.models.transaction import CardBalanceSnapshot
+from app.models.user import User, UserRole
+from app.services.card import CardService
+from app.services.card_import import CardImporter, parse_rows
+
+
+EXISTING_CUSTOMERS = 2000
+SINGLE_ROWS = 1000  # 逐个开卡只跑这么多行，按比例估算全部
+UPLOAD_CHUNK = 64 * 1024  # 模拟上传时每次收到的字节数
+
+
+def make_csv(rows: int, card_types) -> (bytes, int):
+    """返回 (CSV内容, 错误行数)"""
+    rng = random.Random(5)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["name", "phone", "card_type", "remaining_times", "expire_date"])
+    bad = 0
+    for i in range(rows):
+        roll = rng.random()
+        if roll < 0.1:
+            phone = f"1390000{rng.randrange(EXISTING_CUSTOMERS):04d}"  # 已有客户
+        elif roll < 0.2 and i:
+            phone = f"1380{rng.randrange(i):07d}"  # 文件中重复（同一客户多张卡）
+        else:
+            phone = f"1380{i:07d}"
+        card_type = rng.choice(card_types)
+        name = f"客户{i}" if rng.random() < 0.9 else ""
+        remaining = rng.randint(0, card_type.total_times) if card_type.total_times else ""
+        expire = f"2027-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if rng.random() < 0.5 else ""
+        kind = card_type.name if rng.random() < 0.5 else card_type.id
+        if i % 500 == 7:
+            phone, bad = "无号码", bad + 1
+        elif i % 500 == 8:
+            kind, bad = "不存在的卡", bad + 1
+        elif i % 500 == 9:
+            remaining, bad = -1, bad + 1
+        writer.writerow([name, phone, kind, remaining, expire])
+    return out.getvalue().encode("utf-8-sig"), bad
+
+
+async def upload(content: bytes):
+    for start in range(0, len(content), UPLOAD_CHUNK):
+        yield content[start:start + UPLOAD_CHUNK]
+
+
+async def seed(session_maker):
+    async with session_maker() as db:
+        admin = User(openid="admin", role=UserRole.ADMIN)
+        card_types = [CardType(**data) for data in CARD_TYPES]
+        customers = [
+            User(openid=f"wx_{i}", phone=f"1390000{i:04d}", nickname=f"老客户{i}" if i % 2 else None)
+            for i in range(EXISTING_CUSTOMERS)
+        ]
+        db.add_all([admin, *card_types, *customers])
+        await db.commit()
+        return admin.id, card_types
+
+
+async def summarize(session_maker):
+    """(客户数, 卡数, 每位客户的卡类型和次数)"""
+    async with session_maker() as db:
+        users = await db.scalar(select(func.count()).select_from(User))
+        cards = await db.scalar(select(func.count()).select_from(UserCard))
+        snapshots = await db.scalar(select(func.count()).select_from(CardBalanceSnapshot))
+        holdings = sorted((await db.execute(
+            select(User.phone, UserCard.card_type_id, UserCard.remaining_times)
+            .join(UserCard, UserCard.user_id == User.id)
+        )).all())
+    assert snapshots == cards, "每张卡都应有开卡快照"
+    return users, cards, holdings
+
+
+async def run_single(engine, session_maker, admin_id, content: bytes):
+    """逐行开卡（只处理前 SINGLE_ROWS 行，忽略导入才支持的剩余次数和到期日）"""
+    card_types = {}
+    async with session_maker() as db:
+        for card_type in (await db.scalars(select(CardType))).all():
+            card_types[card_type.name] = card_types[str(card_type.id)] = card_type.id
+    rows = list(csv.DictReader(io.StringIO(content.decode("utf-8-sig"))))[:SINGLE_ROWS]
+    with QueryCounter(engine) as counter, timer() as elapsed:
+        for row in rows:
+            if row["card_type"] not in card_types or not row["phone"].isdigit():
+                continue
+            async with session_maker() as db:
+                await CardService(db).create_new_customer_card(
+                    row["name"], row["phone"], card_types[row["card_type"]], admin_id
+                )
+                await db.commit()
+    return elapsed(), counter.count
+
+
+async def run_import(engine, session_maker, admin_id, content: bytes):
+    progress_lines = []
+    with QueryCounter(engine) as counter, timer() as elapsed:
+        importer = CardImporter(operator_id=admin_id, session_maker=session_maker)
+        async for progress in importer.run(parse_rows(upload(content), "csv")):
+            progress_lines.append(progress)
+    return elapsed(), counter.count, progress_lines
+
+
+async def main():
+    print(f"{'行数':>6} | {'逐个开卡 行/秒':>12} {'估算总耗时s':>10} | {'批量导入ms':>9} {'SQL':>5} {'行/秒':>8} | {'加速':>6}")
+    print("-" * 78)
+    for rows in (20000, 50000):
+        async with temp_database() as (engine, session_maker):
+            admin_id, card_types = await seed(session_maker)
+            content, bad = make_csv(rows, card_types)
+            single_ms, single_sql = await run_single(engine, session_maker, admin_id, content)
+
+        async with temp_database() as (engine, session_maker):
+            admin_id, _ = await seed(session_maker)
+            import_ms, import_sql, progress_lines = await run_import(engine, session_maker, admin_id, content)
+            users, cards, holdings = await summarize(session_maker)
+
+        final = progress_lines[-1]
+        assert final.done and final.processed == rows
+        assert final.failed == bad and cards == rows - bad
+        reported = sorted(error.line for progress in progress_lines for error in progress.errors)
+        assert reported == [i + 2 for i in range(rows) if i % 500 in (7, 8, 9)], "错误行号不对"
+        phones = {phone for phone, _, _ in holdings}
+        assert users == 1 + EXISTING_CUSTOMERS + final.created_users
+        assert len(phones) == final.created_users + len(phones & {f"1390000{i:04d}" for i in range(EXISTING_CUSTOMERS)})
+
+        single_rate = SINGLE_ROWS / single_ms * 1000
+        print(f"{rows:>8} | {single_rate:>14.0f} {rows / single_rate:>14.1f} | "
+              f"{import_ms:>11.0f} {import_sql:>5} {rows / import_ms * 1000:>9.0f} | "
+              f"{rows / single_rate * 1000 / import_ms:>6.0f}x")
+
+    # JSONL 与 CSV 一致
+    async with temp_database() as (engine, session_maker):
+        admin_id, card_types = await seed(session_maker)
+        content, _ = make_csv(300, card_types)
+        await run_import(engine, session_maker, admin_id, content)
+        from_csv = await summarize(session_maker)
+    async with temp_database() as (engine, session_maker):
+        admin_id, _ = await seed(session_maker)
+        jsonl = "\n".join(
+            json.dumps(row, ensure_ascii=False)
+            for row in csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+        ).encode()
+        importer = CardImporter(operator_id=admin_id, session_maker=session_maker, chunk_size=64)
+        async for _ in importer.run(parse_rows(upload(jsonl), "jsonl")):
+            pass
+        assert await summarize(session_maker) == from_csv, "JSONL 导入结果应与 CSV 一致"
+
+    print("✅ 导入结果正确：重复手机号只建一个客户，已有客户按手机号匹配，错误行已报告")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
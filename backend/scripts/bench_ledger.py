@@ -0,0 +1,128 @@
+"""
+卡流水压测：全量读取 vs 游标分页 / 流式导出 / 按月汇总
+
+给一张老卡造大量流水，对比整表读取ORM对象和分页接口的耗时，并确认：
+- 逐页翻完与全量读取顺序一致、不重不漏
+- 流式导出的结果与全量读取一致
+- 数据库按月汇总与在Python中逐条累加一致
+
+运行方式：
+cd backend
+python -m scripts.bench_ledger
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from scripts.common import temp_database, timer
+
+from sqlalchemy import insert, select
+
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.transaction import Transaction, TransactionType
+from app.models.user import User, UserRole
+from app.services.ledger import LedgerService, stream_ledger
+
+
+FIRST_DAY = datetime(2024, 1, 1, 9, 0)
+PAGE_SIZE = 20
+
+
+async def seed(session_maker, count: int):
+    """一张卡 count 条流水（每10条中1条充值），另一张卡少量流水做干扰"""
+    async with session_maker() as db:
+        customer = User(openid="customer")
+        staff = User(openid="staff", role=UserRole.STAFF)
+        card_type = CardType(name="洗头10次卡", service_type=ServiceType.WASH, total_times=10)
+        db.add_all([customer, staff, card_type])
+        await db.flush()
+        card = UserCard(user_id=customer.id, card_type_id=card_type.id, remaining_times=count)
+        other = UserCard(user_id=customer.id, card_type_id=card_type.id, remaining_times=10)
+        db.add_all([card, other])
+        await db.flush()
+
+        rows, remaining = [], count
+        for i in range(count):
+            is_add = i % 10 == 0
+            change = 10 if is_add else -1
+            rows.append({
+                "customer_id": customer.id,
+                "user_card_id": card.id if i % 50 else other.id,
+                "transaction_type": TransactionType.ADD if is_add else TransactionType.CONSUME,
+                "service_type": ServiceType.WASH,
+                "times_changed": change,
+                "times_before": remaining,
+                "times_after": remaining + change,
+                "operator_id": staff.id,
+                # 同一时刻多条（批量核销）也能稳定排序
+                "created_at": FIRST_DAY + timedelta(hours=(i // 3) * 2),
+            })
+            remaining += change
+        await db.execute(insert(Transaction), rows)
+        await db.commit()
+        return card.id
+
+
+async def main():
+    print(f"{'流水数':>6} | {'全量ms':>7} | {'首页ms':>5} {'末页ms':>5} {'页数':>5} | "
+          f"{'导出ms':>6} | {'月汇总ms':>6} {'月数':>3}")
+    print("-" * 70)
+    for count in (5000, 50000):
+        async with temp_database() as (engine, session_maker):
+            card_id = await seed(session_maker, count)
+
+            async with session_maker() as db:
+                with timer() as elapsed:
+                    full = (await db.execute(
+                        select(Transaction).where(Transaction.user_card_id == card_id)
+                        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+                    )).scalars().all()
+                full_ms = elapsed()
+                full_ids = [t.id for t in full]
+
+                # Python 中逐条按月累加
+                expected = defaultdict(lambda: [0, 0, 0])
+                for t in full:
+                    month = expected[t.created_at.strftime("%Y-%m")]
+                    month[0] += 1
+                    if t.transaction_type == TransactionType.CONSUME:
+                        month[1] -= t.times_changed
+                    else:
+                        month[2] += t.times_changed
+
+            async with session_maker() as db:
+                service = LedgerService(db)
+                with timer() as elapsed:
+                    page = await service.list_ledger(user_card_id=card_id, limit=PAGE_SIZE)
+                first_ms = elapsed()
+
+                ids, pages = [item.id for item in page.items], 1
+                while page.next_cursor:
+                    cursor = page.next_cursor
+                    with timer() as elapsed:
+                        page = await service.list_ledger(user_card_id=card_id, cursor=cursor, limit=PAGE_SIZE)
+                    last_ms = elapsed()
+                    ids.extend(item.id for item in page.items)
+                    pages += 1
+                assert ids == full_ids, "逐页结果与全量读取不一致"
+
+                with timer() as elapsed:
+                    monthly = await service.monthly_consumption(user_card_id=card_id)
+                monthly_ms = elapsed()
+                assert {m.month: [m.transactions, m.times_consumed, m.times_added] for m in monthly} \
+                    == dict(expected), "按月汇总与逐条累加不一致"
+                assert [m.month for m in monthly] == sorted(expected, reverse=True)
+
+            with timer() as elapsed:
+                exported = [entry.id async for entry in stream_ledger(user_card_id=card_id,
+                                                                      session_maker=session_maker)]
+            export_ms = elapsed()
+            assert exported == full_ids, "流式导出与全量读取不一致"
+
+        print(f"{count:>8} | {full_ms:>8.1f} | {first_ms:>7.2f} {last_ms:>7.2f} {pages:>6} | "
+              f"{export_ms:>8.1f} | {monthly_ms:>8.2f} {len(monthly):>5}")
+    print("✅ 分页、导出、按月汇总与全量读取一致")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
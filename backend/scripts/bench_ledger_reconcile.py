@@ -0,0 +1,219 @@
+"""
+卡流水对账压测：全量重扫 vs 快照 + 增量对账
+
+造大量持卡和流水（一半卡有开卡快照，一半是没有快照的老卡，第一张卡的流水特别多），
+并把几张卡的次数改错，
+对比每次全量汇总所有流水和对账任务（第一轮补写快照，之后只读快照之后的流水）的耗时，
+并确认：
+- 对账任务报告的不一致正好是改错的卡，改回后不再报告
+- 单张卡按快照重建的余额与全量汇总一致
+- 追加模式下不能修改或删除流水
+
+运行方式：
+cd backend
+python -m scripts.bench_ledger_reconcile
+"""
+import asyncio
+import random
+import sys
+
+from scripts.common import temp_database, timer
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.transaction import CardBalanceSnapshot, Transaction, TransactionType
+from app.models.user import User, UserRole
+from app.services.card import CardService
+from app.services.ledger import LedgerAppendOnlyError, LedgerService
+from app.services.ledger_reconciler import LedgerReconciler
+
+
+CARDS = 10000
+NEW_TRANSACTIONS = 10000  # 两轮对账之间新增的流水
+BROKEN = 5  # 改错次数的卡
+INSERT_BATCH = 50000
+SNAPSHOT_EVERY = 20
+
+
+async def seed(session_maker, transactions: int):
+    """返回 (员工ID, 卡ID列表)"""
+    rng = random.Random(7)
+    async with session_maker() as db:
+        staff = User(openid="staff", role=UserRole.STAFF)
+        customers = [User(openid=f"customer_{i}") for i in range(CARDS // 10)]
+        card_type = CardType(name="洗头次卡", service_type=ServiceType.WASH, total_times=10 ** 6)
+        db.add_all([staff, *customers, card_type])
+        await db.flush()
+
+        opening = [rng.randint(transactions // CARDS * 2, transactions // CARDS * 4) for _ in range(CARDS)]
+        card_ids = (await db.scalars(insert(UserCard).returning(UserCard.id), [
+            {"user_id": customers[i % len(customers)].id, "card_type_id": card_type.id,
+             "remaining_times": opening[i]}
+            for i in range(CARDS)
+        ])).all()
+        card_ids = sorted(card_ids)
+        # 一半卡有开卡快照，另一半是上线快照之前开的老卡
+        await db.execute(insert(CardBalanceSnapshot), [
+            {"user_card_id": card_id, "last_transaction_id": 0, "remaining_times": opening[i]}
+            for i, card_id in enumerate(card_ids) if i % 2 == 0
+        ])
+
+        balances = dict(zip(card_ids, opening))
+        owners = {card_id: customers[i % len(customers)].id for i, card_id in enumerate(card_ids)}
+        rows = []
+        for n in range(transactions):
+            # 第一张卡是多年的老卡，流水特别多
+            card_id = card_ids[0] if n % 20 == 1 else card_ids[rng.randrange(CARDS)]
+            change = 5 if n % 20 == 0 else -1
+            before = balances[card_id]
+            balances[card_id] = before + change
+            rows.append({
+                "customer_id": owners[card_id], "user_card_id": card_id,
+                "transaction_type": TransactionType.ADD if change > 0 else TransactionType.CONSUME,
+                "service_type": ServiceType.WASH, "times_changed": change,
+                "times_before": before, "times_after": before + change, "operator_id": staff.id,
+            })
+            if len(rows) == INSERT_BATCH:
+                await db.execute(insert(Transaction), rows)
+                rows = []
+        if rows:
+            await db.execute(insert(Transaction), rows)
+        await db.execute(
+            update(UserCard),
+            [{"id": card_id, "remaining_times": remaining} for card_id, remaining in balances.items()]
+        )
+        await db.commit()
+        return staff.id, card_ids
+
+
+async def full_rescan(session_maker):
+    """对照组：每次汇总所有流水，与卡上的次数比对，返回不一致的卡"""
+    async with session_maker() as db:
+        first_ids = select(func.min(Transaction.id)).group_by(Transaction.user_card_id)
+        openings = dict((await db.execute(
+            select(Transaction.user_card_id, Transaction.times_before).where(Transaction.id.in_(first_ids))
+        )).all())
+        sums = dict((await db.execute(
+            select(Transaction.user_card_id, func.sum(Transaction.times_changed))
+            .group_by(Transaction.user_card_id)
+        )).all())
+        cards = (await db.execute(select(UserCard.id, UserCard.remaining_times))).all()
+    return {
+        card_id for card_id, remaining in cards
+        if card_id in sums and openings[card_id] + sums[card_id] != remaining
+    }
+
+
+async def check_append_only(session_maker):
+    async with session_maker() as db:
+        for statement in (
+            update(Transaction).where(Transaction.id == 1).values(times_changed=0),
+            delete(Transaction).where(Transaction.id == 1),
+            update(CardBalanceSnapshot).values(remaining_times=0),
+        ):
+            try:
+                await db.execute(statement)
+            except LedgerAppendOnlyError:
+                pass
+            else:
+                raise AssertionError(f"追加模式下不应允许: {statement}")
+        transaction = await db.get(Transaction, 1)
+        transaction.notes = "改写"
+        try:
+            await db.flush()
+        except LedgerAppendOnlyError:
+            await db.rollback()
+        else:
+            raise AssertionError("追加模式下不应允许修改流水")
+        # 明确要求改写时放行
+        await db.execute(
+            update(Transaction).where(Transaction.id == 1).values(notes="合并")
+            .execution_options(ledger_rewrite=True)
+        )
+        await db.rollback()
+
+
+async def run(transactions: int):
+    async with temp_database() as (engine, session_maker):
+        with timer() as elapsed:
+            staff_id, card_ids = await seed(session_maker, transactions)
+        seed_ms = elapsed()
+
+        # 把几张卡的次数改错（绕过流水直接改卡）
+        broken = set(random.Random(3).sample(card_ids[1:], BROKEN))
+        async with session_maker() as db:
+            await db.execute(
+                update(UserCard).where(UserCard.id.in_(broken))
+                .values(remaining_times=UserCard.remaining_times + 1)
+            )
+            await db.commit()
+
+        with timer() as elapsed:
+            expected = await full_rescan(session_maker)
+        rescan_ms = elapsed()
+        assert expected == broken
+
+        reconciler = LedgerReconciler(interval=60, chunk_size=500, snapshot_every=SNAPSHOT_EVERY, pause=0,
+                                      session_maker=session_maker)
+        rounds = []
+        for label in ("第一轮", "新增流水后", "无新增"):
+            if label == "新增流水后":
+                async with session_maker() as db:
+                    rng = random.Random(11)
+                    await CardService(db).deduct_cards([
+                        {"user_card_id": card_ids[rng.randrange(CARDS)], "times": 1,
+                         "service_type": ServiceType.WASH}
+                        for _ in range(NEW_TRANSACTIONS)
+                    ], operator_id=staff_id)
+                    await db.commit()
+            with timer() as elapsed:
+                discrepancies = await reconciler.reconcile()
+            rounds.append((label, elapsed(), reconciler.last_transactions_read, reconciler.snapshots_written))
+            assert {balance.user_card_id for balance in discrepancies} == broken, "不一致的卡应正好是改错的卡"
+
+        # 改回后不再报告
+        async with session_maker() as db:
+            await db.execute(
+                update(UserCard).where(UserCard.id.in_(broken))
+                .values(remaining_times=UserCard.remaining_times - 1)
+            )
+            await db.commit()
+        assert await reconciler.reconcile() == []
+
+        # 单张卡：全量汇总 vs 快照 + 尾部流水
+        card_id = card_ids[0]
+        async with session_maker() as db:
+            with timer() as elapsed:
+                first = await db.scalar(
+                    select(Transaction.times_before).where(Transaction.user_card_id == card_id)
+                    .order_by(Transaction.id).limit(1))
+                total = await db.scalar(
+                    select(func.sum(Transaction.times_changed)).where(Transaction.user_card_id == card_id))
+            single_full_ms = elapsed()
+            with timer() as elapsed:
+                balance = await LedgerService(db).card_balance(card_id)
+            single_snapshot_ms = elapsed()
+        assert balance.consistent and balance.ledger_times == first + total
+        assert balance.tail_transactions < SNAPSHOT_EVERY
+
+        await check_append_only(session_maker)
+        return seed_ms, rescan_ms, rounds, (single_full_ms, single_snapshot_ms, balance)
+
+
+async def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [200000, 1000000]
+    for transactions in sizes:
+        seed_ms, rescan_ms, rounds, single = await run(transactions)
+        print(f"\n流水 {transactions} 条，卡 {CARDS} 张（造数据 {seed_ms / 1000:.1f}s）")
+        print(f"  全量重扫: {rescan_ms:8.1f} ms，读取 {transactions} 条流水")
+        for label, ms, read, snapshots in rounds:
+            print(f"  对账{label:<6}: {ms:8.1f} ms，读取 {read:>7} 条流水，累计写入快照 {snapshots}")
+        single_full_ms, single_snapshot_ms, balance = single
+        print(f"  单张卡余额: 全量汇总 {single_full_ms:.2f} ms，"
+              f"快照 + {balance.tail_transactions} 条尾部流水 {single_snapshot_ms:.2f} ms")
+    print("\n✅ 对账结果与全量重扫一致，追加模式拒绝改写流水")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
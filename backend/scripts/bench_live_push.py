@@ -0,0 +1,85 @@
+"""
+实时推送压测
+
+模拟大量空闲连接（每个连接一个等待消息的协程，和 /schedules/live 的循环一致），
+统计每个连接占用的内存，以及一条消息分发到同一门店当天所有订阅者的耗时
+
+运行方式：
+cd backend
+python -m scripts.bench_live_push
+"""
+import asyncio
+import tracemalloc
+from datetime import date, timedelta
+
+from scripts.common import timer
+
+from app.services.live import AvailabilityBroker
+
+
+WORK_DATE = date(2026, 1, 10)
+STORES = 10
+DAYS = 7
+
+
+async def hold_connection(broker, store_id, work_date, received):
+    """一个空闲连接：订阅后一直等待消息"""
+    with broker.subscription() as subscription:
+        subscription.switch(store_id, work_date)
+        while True:
+            await subscription.get()
+            received[0] += 1
+
+
+async def run(connections: int):
+    broker = AvailabilityBroker(queue_size=32)
+    received = [0]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [
+        asyncio.create_task(hold_connection(
+            broker, i % STORES, WORK_DATE + timedelta(days=i // STORES % DAYS), received
+        ))
+        for i in range(connections)
+    ]
+    await asyncio.sleep(0)
+    per_connection = (tracemalloc.get_traced_memory()[0] - before) / connections
+    tracemalloc.stop()
+
+    # 同一门店当天的订阅者数量
+    fanout = len(broker._channels.get((0, WORK_DATE), ()))
+    with timer() as elapsed:
+        broker.publish(0, WORK_DATE, {"type": "booked", "staff_id": 1,
+                                      "start_time": "10:00", "end_time": "10:30"})
+        while received[0] < fanout:
+            await asyncio.sleep(0)
+    publish_ms = elapsed()
+
+    # 排班模板变化：整个门店所有日期
+    received[0] = 0
+    store_fanout = sum(len(subs) for (store_id, _), subs in broker._channels.items() if store_id == 0)
+    with timer() as elapsed:
+        broker.publish(0, None, {"type": "schedule"})
+        while received[0] < store_fanout:
+            await asyncio.sleep(0)
+    store_ms = elapsed()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    assert broker.stats()["subscribers"] == 0, "连接关闭后应全部退订"
+
+    print(f"{connections:>7} | {per_connection / 1024:>9.2f} | "
+          f"{fanout:>6} {publish_ms:>9.2f} | {store_fanout:>6} {store_ms:>9.2f}")
+
+
+async def main():
+    print(f"{'连接数':>5} | {'KB/连接':>7} | {'当天订阅':>4} {'分发ms':>7} | {'门店订阅':>4} {'分发ms':>7}")
+    print("-" * 62)
+    for connections in (1000, 5000, 20000):
+        await run(connections)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
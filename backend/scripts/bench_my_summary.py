@@ -0,0 +1,188 @@
+"""
+“我的”页面压测：两个接口依次请求 vs 并发多会话 vs 汇总接口
+
+给一批客户造卡、预约和流水，对比页面打开时原来的做法
+（依次请求 /cards/my-cards 和 /appointments/my-appointments/page，每次请求各自认证、各开一个会话）、
+三组查询各开会话并发执行，与 /users/me/summary（认证和三组查询共用请求的会话）的耗时和SQL条数，
+并确认汇总接口返回的卡和预约与原来两个接口一致
+
+运行方式：
+cd backend
+python -m scripts.bench_my_summary
+"""
+import asyncio
+import random
+import statistics
+from datetime import date, datetime, timedelta
+
+from scripts.common import temp_database, timer, QueryCounter
+from scripts.init_data import CARD_TYPES
+
+from sqlalchemy import insert, select
+
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.store import Store
+from app.models.transaction import Transaction, TransactionType
+from app.models.user import User, UserRole
+from app.schemas.summary import CustomerSummary
+from app.services.appointment import AppointmentService
+from app.services.card import CardService
+from app.services.customer_summary import customer_summary, SUMMARY_APPOINTMENTS, SUMMARY_TRANSACTIONS
+from app.services.ledger import LedgerService
+
+
+CUSTOMERS = 200
+APPOINTMENTS_PER_CUSTOMER = 100
+TRANSACTIONS_PER_CUSTOMER = 200
+ROUNDS = 50
+CONCURRENT = 20  # 同时打开页面的客户数
+
+
+async def seed(session_maker):
+    rng = random.Random(9)
+    async with session_maker() as db:
+        stores = [Store(name=f"门店{i}", address="测试地址") for i in range(3)]
+        staff = [User(openid=f"staff_{i}", role=UserRole.STAFF, real_name=f"技师{i}") for i in range(5)]
+        customers = [User(openid=f"customer_{i}", phone=f"1380000{i:04d}") for i in range(CUSTOMERS)]
+        card_types = [CardType(**data) for data in CARD_TYPES]
+        db.add_all([*stores, *staff, *customers, *card_types])
+        await db.flush()
+
+        cards = {}
+        for customer in customers:
+            cards[customer.id] = (await db.scalars(insert(UserCard).returning(UserCard.id), [
+                {"user_id": customer.id, "card_type_id": card_type.id, "remaining_times": 1000}
+                for card_type in rng.sample(card_types, 3)
+            ])).all()
+
+        appointments, transactions = [], []
+        for customer in customers:
+            for i in range(APPOINTMENTS_PER_CUSTOMER):
+                start = 540 + (i % 10) * 60
+                appointments.append({
+                    "customer_id": customer.id, "staff_id": rng.choice(staff).id,
+                    "store_id": rng.choice(stores).id, "service_type": ServiceType.WASH,
+                    "appointment_date": date(2024, 1, 1) + timedelta(days=i // 10),
+                    "start_minute": start, "end_minute": start + 30,
+                    "status": AppointmentStatus.COMPLETED,
+                })
+            for i in range(TRANSACTIONS_PER_CUSTOMER):
+                transactions.append({
+                    "customer_id": customer.id, "user_card_id": rng.choice(cards[customer.id]),
+                    "transaction_type": TransactionType.CONSUME, "service_type": ServiceType.WASH,
+                    "times_changed": -1, "operator_id": staff[0].id,
+                    "created_at": datetime(2024, 1, 1) + timedelta(hours=i),
+                })
+        await db.execute(insert(Appointment), appointments)
+        await db.execute(insert(Transaction), transactions)
+        await db.commit()
+        return [customer.id for customer in customers]
+
+
+async def authenticate(db, user_id: int) -> User:
+    """每个请求的认证查询（与 get_current_user 一致）"""
+    return (await db.execute(select(User).where(User.id == user_id))).scalar_one()
+
+
+async def open_page_before(session_maker, customer_id: int):
+    """原来：两个请求依次发出，各自认证"""
+    async with session_maker() as db:
+        user = await authenticate(db, customer_id)
+        cards = await CardService(db).get_user_cards(user.id)
+    async with session_maker() as db:
+        user = await authenticate(db, customer_id)
+        page = await AppointmentService(db).list_customer_appointments(
+            customer_id=user.id, limit=SUMMARY_APPOINTMENTS
+        )
+    return cards, page
+
+
+async def open_page_concurrent(session_maker, customer_id: int):
+    """对照组：一个请求，三组查询各开一个会话并发执行"""
+    async with session_maker() as db:
+        user = await authenticate(db, customer_id)
+
+    async def read(query):
+        async with session_maker() as db:
+            return await query(db)
+
+    cards, page, transactions = await asyncio.gather(
+        read(lambda db: CardService(db).get_user_cards(user.id)),
+        read(lambda db: AppointmentService(db).list_customer_appointments(
+            customer_id=user.id, limit=SUMMARY_APPOINTMENTS)),
+        read(lambda db: LedgerService(db).recent_transactions(user.id, SUMMARY_TRANSACTIONS)),
+    )
+    return CustomerSummary(cards=cards, appointments=page, recent_transactions=transactions)
+
+
+async def open_page_after(session_maker, customer_id: int):
+    """现在：一个请求，认证和三组查询共用请求的会话"""
+    async with session_maker() as db:
+        user = await authenticate(db, customer_id)
+        return await customer_summary(db, user.id)
+
+
+async def measure(engine, open_page, session_maker, customer_ids):
+    """返回 (单个客户逐次打开的中位耗时ms, 每次SQL条数, 并发打开的总耗时ms)"""
+    latencies = []
+    for i in range(ROUNDS):
+        with timer() as elapsed:
+            await open_page(session_maker, customer_ids[i])
+        latencies.append(elapsed())
+    with QueryCounter(engine) as counter:
+        await open_page(session_maker, customer_ids[0])
+    with timer() as elapsed:
+        await asyncio.gather(*(open_page(session_maker, customer_id)
+                               for customer_id in customer_ids[:CONCURRENT]))
+    return statistics.median(latencies), counter.count, elapsed()
+
+
+async def main():
+    async with temp_database() as (engine, session_maker):
+        customer_ids = await seed(session_maker)
+
+        # 汇总接口的卡和预约与原来两个接口一致
+        for customer_id in customer_ids[:5]:
+            cards, page = await open_page_before(session_maker, customer_id)
+            summary = await open_page_after(session_maker, customer_id)
+            assert summary == await open_page_concurrent(session_maker, customer_id)
+            assert summary.cards == cards and summary.appointments == page
+            assert len(summary.recent_transactions) == SUMMARY_TRANSACTIONS
+            assert [t.created_at for t in summary.recent_transactions] == sorted(
+                (t.created_at for t in summary.recent_transactions), reverse=True)
+
+        # 预热卡类型目录
+        await open_page_after(session_maker, customer_ids[0])
+        results = [
+            ("两个接口依次", 2, await measure(engine, open_page_before, session_maker, customer_ids)),
+            ("并发多会话", 1, await measure(engine, open_page_concurrent, session_maker, customer_ids)),
+            ("汇总接口", 1, await measure(engine, open_page_after, session_maker, customer_ids)),
+        ]
+
+        # 其他进程新建卡类型、开卡并消费（本进程目录未失效）：汇总接口仍能取到卡名
+        async with session_maker() as db:
+            type_id = (await db.execute(insert(CardType).returning(CardType.id), [
+                {"name": "其他进程的卡", "service_type": ServiceType.CARE, "total_times": 8}
+            ])).scalar_one()
+            card_id = (await db.execute(insert(UserCard).returning(UserCard.id), [
+                {"user_id": customer_ids[0], "card_type_id": type_id, "remaining_times": 7}
+            ])).scalar_one()
+            await db.execute(insert(Transaction), [{
+                "customer_id": customer_ids[0], "user_card_id": card_id,
+                "transaction_type": TransactionType.CONSUME, "service_type": ServiceType.CARE,
+                "times_changed": -1, "operator_id": customer_ids[0], "created_at": datetime(2030, 1, 1),
+            }])
+            await db.commit()
+        summary = await open_page_after(session_maker, customer_ids[0])
+        assert summary.recent_transactions[0].card_name == "其他进程的卡"
+
+    print(f"{'方式':<12} | {'请求数':>4} {'打开页面ms(中位)':>14} {'SQL':>4} | {f'{CONCURRENT}位客户同时打开ms':>18}")
+    print("-" * 70)
+    for label, requests, (latency, sql, concurrent) in results:
+        print(f"{label:<12} | {requests:>6} {latency:>18.2f} {sql:>4} | {concurrent:>24.1f}")
+    print("✅ 汇总接口返回的卡和预约与原接口一致，另带最近流水")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
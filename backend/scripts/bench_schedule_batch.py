@@ -0,0 +1,96 @@
+"""
+批量排班性能对比
+
+对比逐天调用 create_schedule 与批量 UPSERT 两种实现在
+30/90/365 天批量下的SQL条数和耗时（首次创建、再次覆盖各测一次）
+
+运行方式：
+cd backend
+python -m scripts.bench_schedule_batch
+"""
+import asyncio
+from datetime import date, timedelta
+
+from scripts.common import temp_database, QueryCounter, timer
+
+from sqlalchemy import select, func
+
+from app.models.schedule import Schedule
+from app.models.store import Store
+from app.models.user import User, UserRole
+from app.schemas.schedule import ScheduleCreate, ScheduleBatchCreate, ScheduleResponse
+from app.services.schedule import ScheduleService
+
+
+BATCH_DAYS = [30, 90, 365]
+START_DATE = date(2026, 1, 1)
+
+
+async def legacy_batch(db, staff_id, batch_data):
+    """原实现：逐天创建"""
+    schedules = []
+    service = ScheduleService(db)
+    for work_date in batch_data.work_dates:
+        schedules.append(await service.create_schedule(ScheduleCreate(
+            staff_id=staff_id,
+            store_id=batch_data.store_id,
+            work_date=work_date,
+            start_time=batch_data.start_time,
+            end_time=batch_data.end_time
+        )))
+    return schedules
+
+
+async def bulk_batch(db, staff_id, batch_data):
+    """新实现：批量 UPSERT"""
+    return await ScheduleService(db).create_schedules_batch(staff_id, batch_data)
+
+
+async def run(engine, session_maker, batch_func, staff_id, batch_data):
+    async with session_maker() as db:
+        with QueryCounter(engine) as counter, timer() as elapsed:
+            schedules = await batch_func(db, staff_id, batch_data)
+            await db.commit()
+        # 确认返回结果可以直接序列化
+        for schedule in schedules:
+            ScheduleResponse.model_validate(schedule)
+        return counter.count, elapsed()
+
+
+async def main():
+    print(f"{'天数':>5} {'场景':>4} | {'原实现SQL':>9} {'原实现ms':>9} | {'批量SQL':>7} {'批量ms':>8}")
+    print("-" * 58)
+    for days in BATCH_DAYS:
+        results = {}
+        for name, batch_func in (("legacy", legacy_batch), ("bulk", bulk_batch)):
+            async with temp_database() as (engine, session_maker):
+                async with session_maker() as db:
+                    store_a = Store(name="门店A", address="测试地址")
+                    store_b = Store(name="门店B", address="测试地址")
+                    staff = User(openid="staff", role=UserRole.STAFF)
+                    db.add_all([store_a, store_b, staff])
+                    await db.commit()
+
+                work_dates = [START_DATE + timedelta(days=i) for i in range(days)]
+                create = ScheduleBatchCreate(store_id=store_a.id, work_dates=work_dates,
+                                             start_time="09:00", end_time="18:00")
+                overwrite = ScheduleBatchCreate(store_id=store_b.id, work_dates=work_dates,
+                                                start_time="10:00", end_time="20:00")
+                results[(name, "创建")] = await run(engine, session_maker, batch_func, staff.id, create)
+                results[(name, "覆盖")] = await run(engine, session_maker, batch_func, staff.id, overwrite)
+
+                async with session_maker() as db:
+                    count = (await db.execute(
+                        select(func.count()).select_from(Schedule).where(Schedule.store_id == store_b.id)
+                    )).scalar()
+                    assert count == days, f"{name} 覆盖后排班数量不对: {count}"
+
+        for scene in ("创建", "覆盖"):
+            legacy_queries, legacy_ms = results[("legacy", scene)]
+            bulk_queries, bulk_ms = results[("bulk", scene)]
+            print(f"{days:>5} {scene:>4} | {legacy_queries:>9} {legacy_ms:>9.1f} | "
+                  f"{bulk_queries:>7} {bulk_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
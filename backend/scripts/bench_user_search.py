@@ -0,0 +1,219 @@
+"""
+客户搜索压测：LIKE '%x%' 全表扫描 vs 手机尾号索引 + 姓名 n-gram 索引
+
+造 10 万客户（随机手机号、常见姓氏的中文姓名，部分有微信昵称），
+对比原来的 search_users（phone / nickname 各用 contains）与新的 search_users
+在员工常用输入（手机尾号4位、姓氏、名字、全名）下的延迟，并确认：
+- 结果与逐个比对全部客户得到的匹配一致，且按匹配程度排序
+- 修改姓名（ORM 和导入用的批量更新）、新建客户后立即搜得到
+- 禁用的占位用户（绑定手机号时）不再出现在结果中
+
+运行方式：
+cd backend
+python -m scripts.bench_user_search
+"""
+import asyncio
+import random
+import statistics
+from datetime import datetime, timedelta
+
+from scripts.common import temp_database, timer
+
+from sqlalchemy import case, insert, or_, select, update
+
+from app.models.user import User, UserRole, reverse_phone
+from app.schemas.user import UserUpdate
+from app.services.customer_search import customer_name_index
+from app.services.user import UserService
+
+
+CUSTOMERS = 100_000
+ROUNDS = 30
+LIMIT = 20
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+GIVEN = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华玉萍红娥玲芬燕彬鹏辉丹萍婷雪琳晶欣怡宇浩然子涵梓轩一诺雨桐思彤佳琪"
+
+
+def make_customers(rng):
+    # 已有的老客户，不在姓名索引增量同步的窗口内
+    created_at = datetime.utcnow() - timedelta(days=1)
+    phones = rng.sample(range(10 ** 9), CUSTOMERS)
+    rows = []
+    for i, number in enumerate(phones):
+        name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.choice((1, 2, 2))))
+        phone = f"1{rng.choice('3589')}{number:09d}"
+        rows.append({
+            "openid": f"customer_{i}",
+            "phone": phone,
+            "phone_reversed": reverse_phone(phone),
+            "real_name": name if rng.random() < 0.7 else None,
+            "nickname": name if rng.random() < 0.6 else rng.choice(("小", "阿", "")) + name[1:],
+            "role": UserRole.CUSTOMER,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return rows
+
+
+async def legacy_search(db, phone=None, nickname=None):
+    """原来的 search_users"""
+    query = select(User).where(User.is_active == True)
+    conditions = []
+    if phone:
+        conditions.append(User.phone.contains(phone))
+    if nickname:
+        conditions.append(User.nickname.contains(nickname))
+    if conditions:
+        query = query.where(or_(*conditions))
+    result = await db.execute(query.limit(LIMIT))
+    return result.scalars().all()
+
+
+async def like_ranked_search(db, phone=None, nickname=None):
+    """同样的匹配和排序规则直接用 LIKE 写（不建索引能做到的最好情况，仍是全表扫描）"""
+    if phone:
+        rank = case((User.phone == phone, 0), (User.phone.endswith(phone), 1), else_=2)
+        condition = or_(User.phone.endswith(phone), User.phone.startswith(phone))
+    else:
+        rank = case(
+            (or_(User.nickname == nickname, User.real_name == nickname), 0),
+            (or_(User.nickname.startswith(nickname), User.real_name.startswith(nickname)), 1),
+            else_=2,
+        )
+        condition = or_(User.nickname.contains(nickname), User.real_name.contains(nickname))
+    result = await db.execute(
+        select(User).where(User.is_active == True, condition)
+        .order_by(rank, User.id.desc()).limit(LIMIT)
+    )
+    return result.scalars().all()
+
+
+def expected_matches(customers, phone=None, name=None):
+    """逐个比对所有有效客户（新搜索的匹配规则：手机号尾号或开头，昵称或真实姓名包含）"""
+    matched = set()
+    for user_id, row in customers.items():
+        if not row["is_active"]:
+            continue
+        if phone and (row["phone"].endswith(phone) or row["phone"].startswith(phone)):
+            matched.add(user_id)
+        if name and any(name in (n or "") for n in (row["nickname"], row["real_name"])):
+            matched.add(user_id)
+    return matched
+
+
+def name_rank(user_id, row, name):
+    """(匹配程度, 新客户在前)"""
+    names = [n for n in (row["nickname"], row["real_name"]) if n and name in n]
+    return min((0 if n == name else 1 if n.startswith(name) else 2) for n in names), -user_id
+
+
+async def measure(session_maker, search, kwargs):
+    latencies = []
+    for _ in range(ROUNDS):
+        async with session_maker() as db:
+            with timer() as elapsed:
+                users = await search(db, **kwargs)
+        latencies.append(elapsed())
+    return statistics.median(latencies), len(users)
+
+
+async def main():
+    rng = random.Random(24)
+    async with temp_database() as (engine, session_maker):
+        rows = make_customers(rng)
+        async with session_maker() as db:
+            ids = (await db.scalars(insert(User.__table__).returning(User.id), rows)).all()
+            await db.commit()
+        customers = {user_id: {**row, "is_active": True} for user_id, row in zip(ids, rows)}
+
+        async with session_maker() as db:
+            with timer() as build:
+                await customer_name_index.refresh(db)
+        print(f"{CUSTOMERS} 位客户，姓名索引全量构建 {build():.0f}ms，{customer_name_index.stats()}")
+
+        sample = customers[ids[rng.randrange(len(ids))]]
+        full_name = sample["real_name"] or sample["nickname"]
+        cases = [
+            ("手机尾号4位", {"phone": sample["phone"][-4:]}),
+            ("完整手机号", {"phone": sample["phone"]}),
+            ("姓氏", {"nickname": full_name[0]}),
+            ("名字", {"nickname": full_name[1:]}),
+            ("全名", {"nickname": full_name}),
+            ("不存在的名字", {"nickname": "欧阳锋"}),
+        ]
+
+        async def new_search(db, **kwargs):
+            return await UserService(db).search_users(limit=LIMIT, **kwargs)
+
+        # 原来的搜索不排序，匹配够 20 个就停止扫描，常见的字反而很快；
+        # 排序（以及搜真实姓名）需要扫完整张表，和同样规则的 LIKE 写法比较
+        print(f"\n{'输入':<10} | {'原来ms':>8} {'LIKE排序ms':>10} {'现在ms':>8} {'加速':>7} {'结果数':>6}")
+        print("-" * 62)
+        for label, kwargs in cases:
+            legacy_ms, _ = await measure(session_maker, legacy_search, kwargs)
+            like_ms, _ = await measure(session_maker, like_ranked_search, kwargs)
+            new_ms, count = await measure(session_maker, new_search, kwargs)
+            print(f"{label:<10} | {legacy_ms:>10.2f} {like_ms:>12.2f} {new_ms:>8.2f} "
+                  f"{like_ms / new_ms:>8.1f}x {count:>8}")
+
+            # 结果正确：匹配数不超过上限时与逐个比对一致，且按匹配程度排序
+            async with session_maker() as db:
+                users = await new_search(db, **kwargs)
+            expected = expected_matches(customers, kwargs.get("phone"), kwargs.get("nickname"))
+            found = {user.id for user in users}
+            async with session_maker() as db:
+                assert [u.id for u in await like_ranked_search(db, **kwargs)] == [u.id for u in users], label
+            assert found <= expected
+            if len(expected) <= LIMIT:
+                assert found == expected, label
+            else:
+                assert len(found) == LIMIT, label
+            if "nickname" in kwargs:
+                ranks = [name_rank(user.id, customers[user.id], kwargs["nickname"]) for user in users]
+                assert ranks == sorted(ranks), label
+                # 未返回的匹配都排在最后一个之后
+                assert all(name_rank(u, customers[u], kwargs["nickname"]) > ranks[-1] for u in expected - found)
+        async with session_maker() as db:
+            users = await new_search(db, phone=sample["phone"][-4:])
+        assert users[0].phone.endswith(sample["phone"][-4:])
+
+        # 修改后立即搜得到：ORM 修改、导入用的按主键批量更新、新建客户
+        renamed, imported = ids[0], ids[1]
+        async with session_maker() as db:
+            await UserService(db).update_user(renamed, UserUpdate(nickname="诸葛青"))
+            await db.execute(update(User), [{"id": imported, "nickname": "上官燕", "real_name": "上官燕"}])
+            newcomer = User(openid="dev_customer_new", nickname="慕容复", phone="19912345678")
+            db.add(newcomer)
+            await db.commit()
+        assert newcomer.phone_reversed == "87654321991"
+        async with session_maker() as db:
+            service = UserService(db)
+            assert [u.id for u in await service.search_users(nickname="诸葛")] == [renamed]
+            assert [u.id for u in await service.search_users(nickname="上官燕")] == [imported]
+            assert [u.id for u in await service.search_users(nickname="慕容")] == [newcomer.id]
+            assert [u.id for u in await service.search_users(phone="5678")][0] == newcomer.id
+            old_name = customers[renamed]["nickname"]
+            assert renamed not in {u.id for u in await service.search_users(nickname=old_name)} \
+                or customers[renamed]["real_name"] and old_name in customers[renamed]["real_name"]
+
+        # 绑定手机号禁用员工开卡时建的占位用户：不再出现在搜索结果中
+        async with session_maker() as db:
+            placeholder = User(openid="phone_13700001111", phone="13700001111", nickname="欧阳克")
+            customer = User(openid="dev_customer_欧阳克", nickname="欧阳克")
+            db.add_all([placeholder, customer])
+            await db.commit()
+            found = await UserService(db).search_users(nickname="欧阳克")
+            assert {u.id for u in found} == {placeholder.id, customer.id}
+            await UserService(db).bind_phone(customer.id, "13700001111")
+            await db.commit()
+        async with session_maker() as db:
+            service = UserService(db)
+            assert [u.id for u in await service.search_users(nickname="欧阳克")] == [customer.id]
+            assert [u.id for u in await service.search_users(phone="13700001111")] == [customer.id]
+        print("\n统计:", customer_name_index.stats())
+
+    print("✅ 手机尾号和姓名搜索走索引，结果与全表比对一致并按匹配程度排序，修改后立即可搜")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
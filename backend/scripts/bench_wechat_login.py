@@ -0,0 +1,149 @@
+"""
+微信登录压测：每次新建客户端 vs 共享连接池的 WechatClient
+
+用本地桩服务（scripts/wechat_stub.py）模拟微信 code2session，对比原来每次登录新建
+httpx.AsyncClient 的做法与 WechatClient：
+- 早高峰登录：耗时、延迟分位、新建连接数
+- 微信偶发失败：登录成功率（WechatClient 在总时限内重试）
+- 微信卡住：原做法每次都等到超时；WechatClient 连续失败后熔断、直接失败，
+  微信恢复后试探请求成功即恢复
+
+运行方式：
+cd backend
+python -m scripts.bench_wechat_login
+"""
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from scripts.common import timer
+from scripts.wechat_stub import WechatStub
+
+from app.services.wechat import WechatClient, WechatUnavailableError
+
+
+LOGINS = 500
+CONCURRENT = 100  # 同时登录的人数
+STUB_DELAY = 0.02  # 微信正常时的响应时间（秒）
+FLAKY_RATE = 0.3
+HANG_DELAY = 30.0  # 微信卡住
+DEADLINE = 1.0
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 0.5
+
+
+async def legacy_login(base_url: str, code: str):
+    """原做法：每次新建客户端，默认超时，不重试"""
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{base_url}/sns/jscode2session", params={
+            "appid": "stub", "secret": "stub", "js_code": code, "grant_type": "authorization_code",
+        })
+        data = response.json()
+        return data.get("openid")
+
+
+def pooled_client(base_url: str) -> WechatClient:
+    return WechatClient(
+        base_url=base_url, timeout=DEADLINE, deadline=DEADLINE, retries=2,
+        max_connections=20, max_concurrency=50,
+        breaker_threshold=BREAKER_THRESHOLD, breaker_cooldown=BREAKER_COOLDOWN,
+    )
+
+
+async def burst(login, logins: int = LOGINS):
+    """CONCURRENT 人同时不断登录，返回 (总耗时ms, 每次延迟ms列表, 成功数)"""
+    latencies, succeeded = [], 0
+    codes = iter(range(logins))
+
+    async def user():
+        nonlocal succeeded
+        for n in codes:
+            started = time.perf_counter()
+            try:
+                openid = await login(f"code{n}")
+            except Exception:
+                openid = None
+            latencies.append((time.perf_counter() - started) * 1000)
+            succeeded += openid == f"stub_code{n}"
+
+    with timer() as elapsed:
+        await asyncio.gather(*(user() for _ in range(CONCURRENT)))
+    return elapsed(), latencies, succeeded
+
+
+def percentile(values, p):
+    return sorted(values)[min(int(len(values) * p), len(values) - 1)]
+
+
+async def main():
+    async with WechatStub(delay=STUB_DELAY, seed=1) as stub:
+        client = pooled_client(stub.url)
+
+        async def pooled_login(code):
+            data = await client.code2session("stub", "stub", code)
+            return data["openid"] if data else None
+
+        # 无效 code 返回 None，不算微信故障
+        assert await client.code2session("stub", "stub", "invalid") is None
+        assert client.breaker.failures == 0
+
+        print(f"早高峰：{CONCURRENT} 人同时登录，共 {LOGINS} 次，微信响应 {STUB_DELAY * 1000:.0f}ms")
+        print(f"{'方式':<14} | {'总耗时ms':>8} {'p50':>7} {'p95':>7} {'新建连接':>8} {'成功':>5}")
+        for label, login in (("每次新建客户端", lambda code: legacy_login(stub.url, code)),
+                             ("共享连接池", pooled_login)):
+            connections = stub.connections
+            total, latencies, succeeded = await burst(login)
+            print(f"{label:<14} | {total:>10.0f} {percentile(latencies, 0.5):>7.1f} "
+                  f"{percentile(latencies, 0.95):>7.1f} {stub.connections - connections:>10} {succeeded:>5}")
+            assert succeeded == LOGINS
+
+        # 微信偶发失败
+        stub.fail_rate = FLAKY_RATE
+        print(f"\n微信偶发失败（{FLAKY_RATE:.0%} 的请求返回 500 或系统繁忙）")
+        for label, login in (("每次新建客户端", lambda code: legacy_login(stub.url, code)),
+                             ("共享连接池", pooled_login)):
+            _, _, succeeded = await burst(login, logins=200)
+            print(f"{label:<14} | 登录成功率 {succeeded / 200:.0%}")
+        stub.fail_rate = 0.0
+        client.breaker.record_success()
+
+        # 微信卡住：连续失败后熔断，直接失败
+        stub.delay = HANG_DELAY
+        print(f"\n微信卡住（总时限 {DEADLINE}s，连续失败 {BREAKER_THRESHOLD} 次熔断）")
+        latencies = []
+        for n in range(BREAKER_THRESHOLD + 20):
+            with timer() as elapsed:
+                try:
+                    await client.code2session("stub", "stub", f"hang{n}")
+                except WechatUnavailableError:
+                    pass
+                else:
+                    raise AssertionError("微信卡住时不应登录成功")
+            latencies.append(elapsed())
+        before_open = latencies[:BREAKER_THRESHOLD]
+        after_open = latencies[BREAKER_THRESHOLD:]
+        assert client.breaker.state == "open" and client.rejected == len(after_open)
+        print(f"熔断前每次 {statistics.mean(before_open):.0f}ms（等到时限），"
+              f"熔断后每次 {statistics.mean(after_open):.3f}ms（不再请求微信）")
+        try:
+            await asyncio.wait_for(legacy_login(stub.url, "hang"), 10)
+        except httpx.TimeoutException:
+            print("原做法：每次登录都等到默认超时（5s）后报错")
+
+        # 微信恢复：冷却后试探请求成功即恢复
+        stub.delay = STUB_DELAY
+        await asyncio.sleep(BREAKER_COOLDOWN)
+        assert client.breaker.state == "half_open"
+        assert await pooled_login("recovered") == "stub_recovered"
+        assert client.breaker.state == "closed"
+        print("微信恢复：冷却后试探请求成功，熔断关闭")
+        print("统计:", client.stats())
+        await client.close()
+
+    print("✅ 共享连接池复用连接，偶发失败自动重试，微信卡住时熔断快速失败")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
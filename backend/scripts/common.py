@@ -0,0 +1,97 @@
+"""
+脚本公共工具 - 临时数据库和SQL计数
+
+供 bench_*.py / test_*.py 等脚本使用，不影响正式数据库
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+
+from app.database import init_db, configure_sqlite
+from app.services.card_catalog import card_catalog
+from app.services.customer_search import customer_name_index
+from app.services.token_revocation import token_revocations
+from app.services.user_cache import user_cache
+import app.models  # noqa: F401  注册所有模型
+
+
+@asynccontextmanager
+async def temp_database(schema: Optional[str] = None):
+    """
+    创建一个临时SQLite数据库，返回 (engine, session_maker)
+    
+    schema 为建表SQL文件路径时先按它建表，再由 init_db 迁移（检查升级上来的库）
+    """
+    tmpdir = tempfile.mkdtemp(prefix="yancare_")
+    if schema is not None:
+        conn = sqlite3.connect(f"{tmpdir}/bench.db")
+        with open(schema, encoding="utf-8") as f:
+            conn.executescript(f.read())
+        conn.close()
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmpdir}/bench.db",
+        connect_args={"timeout": 30},
+    )
+    configure_sqlite(engine)
+    card_catalog.invalidate()  # 卡类型目录是进程内全局的，换库后需重新加载
+    user_cache.clear()  # 用户ID在新库中会重复
+    token_revocations.clear()
+    customer_name_index.clear()
+    try:
+        await init_db(engine)
+        yield engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+class QueryCounter:
+    """统计引擎执行的SQL语句数量（statements 为执行的SQL）"""
+
+    def __init__(self, engine):
+        self.engine = engine.sync_engine
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+    def touched(self, table: str) -> bool:
+        """是否有SQL涉及该表"""
+        return any(table in statement for statement in self.statements)
+
+    def __enter__(self):
+        self.count = 0
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+@contextmanager
+def timer():
+    """计时（毫秒），用法：with timer() as t: ...; t()"""
+    start = time.perf_counter()
+    elapsed = None
+
+    def result():
+        return elapsed if elapsed is not None else (time.perf_counter() - start) * 1000
+
+    try:
+        yield result
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
@@ -0,0 +1,174 @@
+"""
+账号合并测试
+
+客户绑定手机号时，同一手机号的其他账号（员工开卡时建的占位用户，也可能有其他微信账号）
+有几百个的情况下：
+- 卡、预约、消费记录全部改归当前客户，SQL条数与重复账号数无关
+- 占位用户被禁用、清除手机号，之前的 token 失效、不再出现在客户搜索中；其他微信账号保留
+- 其他客户的数据不受影响；回滚时什么都不变，也不吊销 token
+
+运行方式：
+cd backend
+python -m scripts.test_account_merge
+"""
+import asyncio
+from datetime import date
+
+from scripts.common import temp_database, timer, QueryCounter
+from scripts.init_data import CARD_TYPES
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import func, insert, select
+
+from app.config import settings
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.store import Store
+from app.models.transaction import Transaction, TransactionType
+from app.models.user import User, UserRole
+from app.services.auth import AuthService, get_current_user
+from app.services.token_revocation import token_revocations
+from app.services.user import UserService
+from app.services.user_cache import user_cache
+
+
+PHONE = "13800000000"
+PLACEHOLDERS = 300  # 员工开卡时重复建的占位用户
+WECHAT_ACCOUNTS = 3  # 用同一手机号的其他微信账号
+CARDS, APPOINTMENTS, TRANSACTIONS = 2, 3, 4  # 每个账号
+
+
+async def seed(session_maker):
+    async with session_maker() as db:
+        store = Store(name="门店", address="测试地址")
+        staff = User(openid="staff", role=UserRole.STAFF)
+        customer = User(openid="dev_customer_张三", nickname="张三")
+        other = User(openid="dev_customer_李四", nickname="李四", phone="13900000000")
+        placeholders = [
+            User(openid=f"phone_{PHONE}_{i}", phone=PHONE, nickname=f"占位{i}") for i in range(PLACEHOLDERS)
+        ]
+        wechat = [User(openid=f"dev_customer_{i}", phone=PHONE) for i in range(WECHAT_ACCOUNTS)]
+        card_type = CardType(**CARD_TYPES[0])
+        db.add_all([store, staff, customer, other, *placeholders, *wechat, card_type])
+        await db.flush()
+
+        for owner in [other, *placeholders, *wechat]:
+            card_ids = (await db.scalars(insert(UserCard).returning(UserCard.id), [
+                {"user_id": owner.id, "card_type_id": card_type.id, "remaining_times": 10}
+                for _ in range(CARDS)
+            ])).all()
+            await db.execute(insert(Appointment), [
+                {
+                    "customer_id": owner.id, "staff_id": staff.id, "store_id": store.id,
+                    "service_type": ServiceType.WASH, "appointment_date": date(2026, 1, 1 + i),
+                    "start_minute": 600, "end_minute": 630, "status": AppointmentStatus.COMPLETED,
+                }
+                for i in range(APPOINTMENTS)
+            ])
+            await db.execute(insert(Transaction), [
+                {
+                    "customer_id": owner.id, "user_card_id": card_ids[i % CARDS],
+                    "transaction_type": TransactionType.CONSUME, "service_type": ServiceType.WASH,
+                    "times_changed": -1, "operator_id": staff.id,
+                }
+                for i in range(TRANSACTIONS)
+            ])
+        await db.commit()
+        return customer, other, placeholders, wechat
+
+
+async def owned_rows(db, user_id):
+    """(卡数, 预约数, 消费记录数)"""
+    return tuple([
+        await db.scalar(select(func.count()).select_from(model).where(column == user_id))
+        for model, column in (
+            (UserCard, UserCard.user_id),
+            (Appointment, Appointment.customer_id),
+            (Transaction, Transaction.customer_id),
+        )
+    ])
+
+
+def credentials_for(user: User) -> HTTPAuthorizationCredentials:
+    token = AuthService(None)._create_access_token(user.id, user.openid, user.role, user.token_version)
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+async def is_authenticated(session_maker, user: User) -> bool:
+    async with session_maker() as db:
+        try:
+            await get_current_user(credentials_for(user), db)
+        except HTTPException as e:
+            assert e.status_code == 401
+            return False
+    return True
+
+
+async def main():
+    assert settings.CARD_LEDGER_APPEND_ONLY, "消费记录追加模式下也应能合并"
+    async with temp_database() as (engine, session_maker):
+        customer, other, placeholders, wechat = await seed(session_maker)
+        sources = [*placeholders, *wechat]
+
+        # 回滚：什么都不变，也不吊销 token
+        async with session_maker() as db:
+            await UserService(db).bind_phone(customer.id, PHONE)
+            await db.rollback()
+        async with session_maker() as db:
+            assert await owned_rows(db, customer.id) == (0, 0, 0)
+            assert await owned_rows(db, placeholders[0].id) == (CARDS, APPOINTMENTS, TRANSACTIONS)
+        assert await is_authenticated(session_maker, placeholders[0])
+        assert not token_revocations.stats()["size"]
+
+        # 占位用户已登录过（缓存了认证信息），也已在客户搜索索引中
+        for user in placeholders[:10]:
+            assert await is_authenticated(session_maker, user)
+        async with session_maker() as db:
+            assert len(await UserService(db).search_users(nickname="占位")) == 20
+
+        async with session_maker() as db:
+            with QueryCounter(engine) as counter, timer() as elapsed:
+                result = await UserService(db).bind_phone(customer.id, PHONE)
+                await db.commit()
+        assert result["cards_merged"]
+        updates = [s for s in counter.statements if s.lstrip().upper().startswith("UPDATE")]
+        assert counter.count <= 10, f"SQL条数应与重复账号数无关，实际 {counter.count}"
+        print(f"合并 {len(sources)} 个账号：{elapsed():.1f}ms，{counter.count} 条SQL（其中 {len(updates)} 条UPDATE）")
+
+        async with session_maker() as db:
+            merged = len(sources)
+            assert await owned_rows(db, customer.id) == (CARDS * merged, APPOINTMENTS * merged, TRANSACTIONS * merged)
+            for user in sources:
+                assert await owned_rows(db, user.id) == (0, 0, 0)
+            assert await owned_rows(db, other.id) == (CARDS, APPOINTMENTS, TRANSACTIONS), "其他客户不受影响"
+
+            # 占位用户禁用并清除手机号，其他微信账号保留
+            rows = (await db.execute(
+                select(User.openid, User.is_active, User.phone, User.phone_reversed)
+                .where(User.id.in_([user.id for user in sources]))
+            )).all()
+            for openid, is_active, phone, phone_reversed in rows:
+                if openid.startswith("phone_"):
+                    assert (is_active, phone, phone_reversed) == (False, None, None)
+                else:
+                    assert is_active and phone == PHONE
+
+            # 客户搜索：按手机号只找到当前客户和其他微信账号，占位用户的姓名搜不到
+            found = await UserService(db).search_users(phone=PHONE, limit=50)
+            assert {user.id for user in found} == {customer.id, *(user.id for user in wechat)}
+            assert await UserService(db).search_users(nickname="占位") == []
+
+        # 占位用户的 token 立即失效（包括缓存过的），其他微信账号不受影响
+        for user in placeholders:
+            assert user_cache.get(user.id) is None
+            assert not await is_authenticated(session_maker, user)
+        for user in wechat:
+            assert await is_authenticated(session_maker, user)
+        assert token_revocations.stats()["size"] == PLACEHOLDERS
+
+    print("✅ 卡、预约和消费记录一次合并到当前客户，占位用户禁用且 token 失效")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
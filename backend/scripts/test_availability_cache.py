@@ -0,0 +1,94 @@
+"""
+可预约时段缓存测试
+
+确认 AvailabilityCache：
+- 计算期间该天或该门店被失效过时，计算结果不写入缓存；失效之后开始的计算可以写入
+- 按天失效只影响那一天，按门店失效影响该门店所有日期
+- 失效过的天数很多时，失效记录不超过 maxsize 条；淘汰记录后早于它开始的计算也不写入
+- clear() 清空全部条目和失效记录，正在进行的计算也不再写入
+
+运行方式：
+cd backend
+python -m scripts.test_availability_cache
+"""
+from datetime import date, timedelta
+
+from app.services.availability import AvailabilityCache
+
+
+MAXSIZE = 64
+DAY = date(2027, 1, 4)
+
+
+def main():
+    cache = AvailabilityCache(maxsize=MAXSIZE, ttl=60)
+
+    # 计算期间该天被失效：不写入；之后开始的计算可以写入
+    generation = cache.generation(1, DAY)
+    cache.invalidate(1, DAY)
+    cache.put(1, DAY, 30, "stale", generation)
+    assert cache.get(1, DAY, 30) is None
+    cache.put(1, DAY, 30, "fresh", cache.generation(1, DAY))
+    assert cache.get(1, DAY, 30) == "fresh"
+
+    # 按天失效只影响那一天，其他天、其他门店在期间开始的计算照常写入
+    generation = cache.generation(1, DAY)
+    cache.invalidate(1, DAY + timedelta(days=1))
+    cache.put(1, DAY, 60, "same store", generation)
+    cache.put(2, DAY + timedelta(days=1), 30, "other store", generation)
+    assert cache.get(1, DAY, 60) == "same store"
+    assert cache.get(2, DAY + timedelta(days=1), 30) == "other store"
+
+    # 按门店失效：该门店所有日期失效，期间开始的计算不写入，其他门店不受影响
+    generation = cache.generation(1, DAY)
+    cache.invalidate(1)
+    assert cache.get(1, DAY, 30) is None and cache.get(1, DAY, 60) is None
+    assert cache.get(2, DAY + timedelta(days=1), 30) == "other store"
+    cache.put(1, DAY + timedelta(days=30), 30, "stale", generation)
+    assert cache.get(1, DAY + timedelta(days=30), 30) is None
+    print("计算期间失效过的天、门店不写入，其他天和门店不受影响")
+
+    # 很多天被失效过：失效记录不超过 maxsize 条
+    slow = cache.generation(3, DAY)  # 失效很多天之前就开始的计算
+    recent = None
+    for i in range(MAXSIZE * 20):
+        for store_id in (1, 2):
+            cache.invalidate(store_id, DAY + timedelta(days=i))
+            assert cache.stats()["invalidated_days"] <= MAXSIZE
+        if i == MAXSIZE * 20 - MAXSIZE // 4:
+            recent = cache.generation(3, DAY)
+    assert cache.stats()["invalidated_days"] == MAXSIZE
+    # 淘汰的失效记录之前开始的计算一律不写入（哪怕它的那天没失效过）
+    cache.put(3, DAY, 30, "stale", slow)
+    assert cache.get(3, DAY, 30) is None
+    # 最近开始的计算：没失效过的天照常写入，之后失效过的天不写入
+    cache.put(3, DAY, 30, "fresh", recent)
+    assert cache.get(3, DAY, 30) == "fresh"
+    last_day = DAY + timedelta(days=MAXSIZE * 20 - 1)
+    cache.put(1, last_day, 30, "stale", recent)
+    assert cache.get(1, last_day, 30) is None
+    print(f"失效 {MAXSIZE * 40} 天后失效记录 {cache.stats()['invalidated_days']} 条（上限 {MAXSIZE}）")
+
+    # clear：条目和失效记录全部清空，正在进行的计算不写入
+    generation = cache.generation(3, DAY)
+    cache.clear()
+    assert cache.stats()["size"] == 0 and cache.stats()["invalidated_days"] == 0
+    assert cache.get(3, DAY, 30) is None
+    cache.put(3, DAY, 30, "stale", generation)
+    assert cache.get(3, DAY, 30) is None
+    cache.put(3, DAY, 30, "fresh", cache.generation(3, DAY))
+    assert cache.get(3, DAY, 30) == "fresh"
+    print("clear 后条目和失效记录清空，之前开始的计算不写入")
+
+    # 条目数不超过 maxsize
+    for i in range(MAXSIZE * 3):
+        cache.put(4, DAY + timedelta(days=i), 30, i, cache.generation(4, DAY))
+    assert cache.stats()["size"] == MAXSIZE
+    assert cache.get(4, DAY, 30) is None and cache.get(4, DAY + timedelta(days=MAXSIZE * 3 - 1), 30) is not None
+    print("统计:", cache.stats())
+
+    print("✅ 可预约缓存的条目和失效记录都有上限，计算期间失效过的结果不写入")
+
+
+if __name__ == "__main__":
+    main()
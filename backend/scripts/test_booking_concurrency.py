@@ -0,0 +1,108 @@
+"""
+并发预约测试
+
+同时发起数百个预约请求抢同一员工同一天的时段，
+校验最终没有任何两个有效预约时间重叠
+
+运行方式：
+cd backend
+python -m scripts.test_booking_concurrency
+"""
+import asyncio
+import random
+from datetime import date
+
+from scripts.common import temp_database, timer
+
+from sqlalchemy import select, func
+
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import ServiceType
+from app.models.reservation import SlotReservation
+from app.models.schedule import Schedule
+from app.models.store import Store
+from app.models.user import User, UserRole
+from app.schemas.appointment import AppointmentCreate
+from app.services.appointment import AppointmentService
+from app.models.time_range import minutes_to_time
+
+
+BOOKINGS = 300
+WORK_DATE = date(2026, 1, 10)
+SERVICE_TYPES = [ServiceType.WASH, ServiceType.SOAK, ServiceType.CARE]
+
+
+async def book(session_maker, customer_id, store_id, staff_id, start_time, service_type):
+    async with session_maker() as db:
+        appointment = await AppointmentService(db).create_appointment(
+            customer_id,
+            AppointmentCreate(
+                store_id=store_id,
+                staff_id=staff_id,
+                service_type=service_type,
+                appointment_date=WORK_DATE,
+                start_time=start_time,
+            )
+        )
+        await db.commit()
+        return appointment is not None
+
+
+async def main():
+    rng = random.Random(42)
+    async with temp_database() as (engine, session_maker):
+        async with session_maker() as db:
+            store = Store(name="测试门店", address="测试地址")
+            staff = [User(openid=f"staff_{i}", role=UserRole.STAFF) for i in range(2)]
+            customers = [User(openid=f"customer_{i}") for i in range(BOOKINGS)]
+            db.add_all([store, *staff, *customers])
+            await db.flush()
+            for s in staff:
+                db.add(Schedule(staff_id=s.id, store_id=store.id, work_date=WORK_DATE,
+                                start_time="09:00", end_time="21:00"))
+            await db.commit()
+
+        # 所有请求集中在少数几个时段上，制造大量冲突
+        candidate_times = [minutes_to_time(9 * 60 + 30 * i) for i in range(24)]
+        tasks = [
+            book(
+                session_maker,
+                customers[i].id,
+                store.id,
+                rng.choice(staff).id,
+                rng.choice(candidate_times),
+                rng.choice(SERVICE_TYPES),
+            )
+            for i in range(BOOKINGS)
+        ]
+        with timer() as elapsed:
+            results = await asyncio.gather(*tasks)
+        succeeded = sum(results)
+
+        async with session_maker() as db:
+            appointments = (await db.execute(
+                select(Appointment).where(Appointment.status == AppointmentStatus.CONFIRMED)
+                .order_by(Appointment.staff_id, Appointment.start_minute)
+            )).scalars().all()
+            reservations = (await db.execute(
+                select(func.count()).select_from(SlotReservation)
+            )).scalar()
+
+        assert len(appointments) == succeeded, "成功数与预约数不一致"
+
+        # 同一员工按开始时间排序后，相邻预约不能重叠
+        for prev, curr in zip(appointments, appointments[1:]):
+            if prev.staff_id != curr.staff_id:
+                continue
+            assert prev.end_minute <= curr.start_minute, (
+                f"重复预约: 员工{prev.staff_id} {prev.start_time}-{prev.end_time} 与 "
+                f"{curr.start_time}-{curr.end_time}"
+            )
+
+        print(f"并发请求 {BOOKINGS} 个，成功 {succeeded} 个，冲突被拒 {BOOKINGS - succeeded} 个")
+        print(f"占用槽 {reservations} 行，耗时 {elapsed():.0f}ms")
+        print("✅ 没有重复预约")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""
+卡类型目录测试
+
+- /cards/types 带 ETag，If-None-Match 匹配时返回304；命中目录时不查询数据库
+- 并发的第一次访问只加载一次
+- 新建卡类型提交后 ETag 变化，回滚则不变
+- 卡列表、开卡、扣卡不再查询 card_types
+
+运行方式：
+cd backend
+python -m scripts.test_card_catalog
+"""
+import asyncio
+
+from scripts.common import temp_database, QueryCounter
+
+import httpx
+from sqlalchemy import insert
+
+from app.database import get_db
+from app.main import app
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.user import User, UserRole
+from app.schemas.card import CardTypeCreate
+from app.services.card import CardService
+from app.services.card_catalog import card_catalog
+
+
+async def main():
+    async with temp_database() as (engine, session_maker):
+        async with session_maker() as db:
+            customer = User(openid="customer")
+            staff = User(openid="staff", role=UserRole.STAFF)
+            db.add_all([
+                customer, staff,
+                CardType(name="洗头10次卡", service_type=ServiceType.WASH, total_times=10),
+                CardType(name="年卡", service_type=ServiceType.CARE),
+                CardType(name="已下架", service_type=ServiceType.SOAK, total_times=5, is_active=False),
+            ])
+            await db.commit()
+
+        async def override_get_db():
+            async with session_maker() as session:
+                try:
+                    yield session
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+
+        app.dependency_overrides[get_db] = override_get_db
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # 并发的第一次访问只加载一次
+            loads = card_catalog.loads
+            responses = await asyncio.gather(*(client.get("/api/cards/types") for _ in range(20)))
+            assert card_catalog.loads == loads + 1, "并发访问应只加载一次"
+            first = responses[0]
+            etag = first.headers["ETag"]
+            assert [t["name"] for t in first.json()] == ["洗头10次卡", "年卡"], "只返回有效卡类型"
+            assert all(r.headers["ETag"] == etag for r in responses)
+
+            with QueryCounter(engine) as counter:
+                again = await client.get("/api/cards/types")
+            assert again.status_code == 200 and again.json() == first.json()
+            assert counter.count == 0, f"命中目录不应查询数据库（{counter.count} 条）"
+
+            not_modified = await client.get("/api/cards/types", headers={"If-None-Match": etag})
+            assert not_modified.status_code == 304 and not_modified.content == b""
+            weak = await client.get("/api/cards/types", headers={"If-None-Match": f'"x", W/{etag}'})
+            assert weak.status_code == 304
+            print(f"卡类型列表: ETag {etag[:10]}...，未变化返回304，命中目录 0 条SQL")
+
+            # 回滚的新建不影响目录
+            async with session_maker() as db:
+                await CardService(db).create_card_type(
+                    CardTypeCreate(name="回滚的卡", service_type=ServiceType.WASH, total_times=3))
+                await db.rollback()
+            assert (await client.get("/api/cards/types", headers={"If-None-Match": etag})).status_code == 304
+
+            # 新建卡类型后 ETag 变化
+            async with session_maker() as db:
+                created = await CardService(db).create_card_type(
+                    CardTypeCreate(name="泡头5次卡", service_type=ServiceType.SOAK, total_times=5))
+                await db.commit()
+            changed = await client.get("/api/cards/types", headers={"If-None-Match": etag})
+            assert changed.status_code == 200 and changed.headers["ETag"] != etag
+            assert [t["name"] for t in changed.json()][-1] == "泡头5次卡"
+            print("新建卡类型: 提交后 ETag 变化，回滚不变")
+
+        app.dependency_overrides.clear()
+
+        # 开卡、卡列表、扣卡不查询 card_types
+        async with session_maker() as db:
+            service = CardService(db)
+            with QueryCounter(engine) as log:
+                card = await service.add_card_to_user(customer.id, created.id, staff.id)
+                cards = await service.get_user_cards(customer.id)
+                transaction = await service.deduct_card(card.id, 1, staff.id)
+            await db.commit()
+        assert card.card_type.name == "泡头5次卡" and card.remaining_times == 5
+        assert cards[0].card_name == "泡头5次卡"
+        assert transaction.service_type == ServiceType.SOAK and transaction.times_after == 4
+        assert not log.touched("card_types"), "不应查询 card_types"
+        print(f"开卡 + 卡列表 + 扣卡: {log.count} 条SQL，未查询 card_types")
+
+        # 其他进程新建卡类型并开卡（本进程目录未失效）：卡列表重新加载一次目录
+        async with session_maker() as db:
+            await card_catalog.current(db)
+            type_id = (await db.execute(insert(CardType).returning(CardType.id), [
+                {"name": "其他进程的卡", "service_type": ServiceType.CARE, "total_times": 8}
+            ])).scalar_one()
+            await db.execute(insert(UserCard), [
+                {"user_id": customer.id, "card_type_id": type_id, "remaining_times": 8}
+            ])
+            await db.commit()
+        loads = card_catalog.loads
+        async with session_maker() as db:
+            cards = await CardService(db).get_user_cards(customer.id)
+        assert "其他进程的卡" in {c.card_name for c in cards}
+        assert card_catalog.loads == loads + 1
+        print("其他进程新建的卡类型: 卡列表重新加载目录一次")
+
+        print("✅ 卡类型目录正常")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
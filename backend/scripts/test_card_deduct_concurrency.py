@@ -0,0 +1,114 @@
+"""
+并发扣卡测试
+
+多个员工同时核销同一张卡：
+- 次卡：请求数远多于剩余次数，校验只成功剩余次数那么多次、余额扣到0、
+  每条消费记录的前后次数首尾相接（没有丢失更新）
+- 无限次卡：全部成功，余额保持无限
+- 过期卡：全部失败
+
+并统计单次扣卡发出的SQL数量
+
+运行方式：
+cd backend
+python -m scripts.test_card_deduct_concurrency
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from scripts.common import temp_database, timer, QueryCounter
+
+from sqlalchemy import select
+
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.transaction import Transaction
+from app.models.user import User, UserRole
+from app.services.card import CardService
+
+
+DEDUCTIONS = 200
+CARD_TIMES = 50
+
+
+async def deduct(session_maker, user_card_id, operator_id, times=1):
+    async with session_maker() as db:
+        transaction = await CardService(db).deduct_card(
+            user_card_id=user_card_id,
+            times=times,
+            operator_id=operator_id
+        )
+        await db.commit()
+        return transaction is not None
+
+
+async def run_parallel(session_maker, user_card_id, staff):
+    tasks = [
+        deduct(session_maker, user_card_id, staff[i % len(staff)].id)
+        for i in range(DEDUCTIONS)
+    ]
+    with timer() as elapsed:
+        results = await asyncio.gather(*tasks)
+    return sum(results), elapsed()
+
+
+async def main():
+    async with temp_database() as (engine, session_maker):
+        async with session_maker() as db:
+            customer = User(openid="customer")
+            staff = [User(openid=f"staff_{i}", role=UserRole.STAFF) for i in range(5)]
+            limited = CardType(name="洗头10次卡", service_type=ServiceType.WASH, total_times=10)
+            unlimited = CardType(name="年卡", service_type=ServiceType.CARE)
+            db.add_all([customer, *staff, limited, unlimited])
+            await db.flush()
+            shared_card = UserCard(user_id=customer.id, card_type_id=limited.id,
+                                   remaining_times=CARD_TIMES)
+            unlimited_card = UserCard(user_id=customer.id, card_type_id=unlimited.id)
+            expired_card = UserCard(user_id=customer.id, card_type_id=limited.id, remaining_times=10,
+                                    expire_date=datetime.utcnow() - timedelta(days=1))
+            db.add_all([shared_card, unlimited_card, expired_card])
+            await db.commit()
+
+        # 单次扣卡的SQL数量
+        async with session_maker() as db:
+            with QueryCounter(engine) as counter:
+                transaction = await CardService(db).deduct_card(unlimited_card.id, 1, staff[0].id)
+                assert transaction is not None and transaction.times_after is None, "无限次卡应扣卡成功"
+                await db.rollback()
+        print(f"单次扣卡SQL: {counter.count} 条（含 BEGIN）")
+
+        # 次卡：并发超扣
+        succeeded, elapsed = await run_parallel(session_maker, shared_card.id, staff)
+        async with session_maker() as db:
+            remaining = await db.scalar(
+                select(UserCard.remaining_times).where(UserCard.id == shared_card.id)
+            )
+            transactions = (await db.execute(
+                select(Transaction).where(Transaction.user_card_id == shared_card.id)
+                .order_by(Transaction.times_after.desc())
+            )).scalars().all()
+
+        print(f"次卡: 并发 {DEDUCTIONS} 次，成功 {succeeded} 次，剩余 {remaining} 次，耗时 {elapsed:.0f}ms")
+        assert succeeded == CARD_TIMES, "成功次数应等于卡内次数"
+        assert remaining == 0, "卡内次数应扣到0"
+        assert len(transactions) == CARD_TIMES, "消费记录数应等于成功次数"
+        # 每次扣减的前后次数首尾相接：CARD_TIMES → ... → 0
+        assert transactions[0].times_before == CARD_TIMES
+        for prev, curr in zip(transactions, transactions[1:]):
+            assert prev.times_after == curr.times_before, "消费记录前后次数不连续（丢失更新）"
+        assert all(t.service_type == ServiceType.WASH for t in transactions), "服务类型应取自卡类型"
+
+        # 无限次卡：全部成功
+        succeeded, elapsed = await run_parallel(session_maker, unlimited_card.id, staff)
+        print(f"无限次卡: 并发 {DEDUCTIONS} 次，成功 {succeeded} 次，耗时 {elapsed:.0f}ms")
+        assert succeeded == DEDUCTIONS, "无限次卡应全部成功"
+
+        # 过期卡：全部失败
+        succeeded, _ = await run_parallel(session_maker, expired_card.id, staff)
+        print(f"过期卡: 并发 {DEDUCTIONS} 次，成功 {succeeded} 次")
+        assert succeeded == 0, "过期卡不能扣卡"
+
+        print("✅ 没有超扣或丢失更新")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
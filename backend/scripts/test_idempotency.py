@@ -0,0 +1,166 @@
+"""
+幂等键测试
+
+通过接口验证 Idempotency-Key：
+- 同一个键重试扣卡只扣一次，重试返回第一次的响应，且不查询持卡和消费记录表
+- 同一个键并发重试也只扣一次
+- 同一个键用于不同请求返回422
+- 失败的请求不保存，重试会重新执行
+- 进程内索引清空后（其他进程的重试）从数据库返回保存的响应
+- 记录过期后同一个键可以重新使用
+
+运行方式：
+cd backend
+python -m scripts.test_idempotency
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from scripts.common import temp_database, QueryCounter
+
+import httpx
+from sqlalchemy import event, func, select, update
+
+from app.database import get_db
+from app.main import app
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.idempotency import IdempotencyRecord
+from app.models.transaction import Transaction
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.idempotency import idempotency_index
+
+
+CARD_TIMES = 10
+RETRIES = 20
+
+
+class TableWatcher:
+    """记录执行的SQL是否涉及某些表"""
+
+    def __init__(self, engine, tables):
+        self.engine = engine.sync_engine
+        self.tables = tables
+        self.touched = set()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.touched.update(table for table in self.tables if table in statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+async def card_state(session_maker, card_id):
+    async with session_maker() as db:
+        remaining = await db.scalar(select(UserCard.remaining_times).where(UserCard.id == card_id))
+        transactions = await db.scalar(
+            select(func.count()).select_from(Transaction).where(Transaction.user_card_id == card_id)
+        )
+        return remaining, transactions
+
+
+async def main():
+    async with temp_database() as (engine, session_maker):
+        async with session_maker() as db:
+            customer = User(openid="customer")
+            staff = User(openid="staff", role=UserRole.STAFF)
+            card_type = CardType(name="洗头10次卡", service_type=ServiceType.WASH, total_times=CARD_TIMES)
+            db.add_all([customer, staff, card_type])
+            await db.flush()
+            card = UserCard(user_id=customer.id, card_type_id=card_type.id, remaining_times=CARD_TIMES)
+            db.add(card)
+            await db.commit()
+            token = AuthService(db)._create_access_token(staff.id, staff.openid)
+
+        async def override_get_db():
+            async with session_maker() as session:
+                try:
+                    yield session
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+
+        app.dependency_overrides[get_db] = override_get_db
+        idempotency_index.clear()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            url = f"/api/cards/{card.id}/deduct"
+
+            def deduct(key, times=1):
+                headers = {"Authorization": f"Bearer {token}"}
+                if key is not None:
+                    headers["Idempotency-Key"] = key
+                return client.post(url, params={"times": times}, headers=headers)
+
+            # 顺序重试
+            key = str(uuid.uuid4())
+            first = await deduct(key)
+            with QueryCounter(engine) as counter, TableWatcher(engine, ("user_cards", "transactions")) as watcher:
+                retry = await deduct(key)
+            assert first.status_code == 200 and retry.status_code == 200
+            assert retry.json() == first.json(), "重试应返回第一次的响应"
+            assert retry.headers.get("Idempotent-Replayed") == "true"
+            assert not watcher.touched, f"重试不应查询 {watcher.touched}"
+            assert await card_state(session_maker, card.id) == (CARD_TIMES - 1, 1), "重试不应重复扣卡"
+            print(f"顺序重试: 只扣一次，重试SQL {counter.count} 条（含 BEGIN，均为认证查询）")
+
+            # 并发重试
+            key = str(uuid.uuid4())
+            responses = await asyncio.gather(*(deduct(key) for _ in range(RETRIES)))
+            codes = sorted(response.status_code for response in responses)
+            assert codes.count(200) >= 1 and set(codes) <= {200, 409}, codes
+            assert await card_state(session_maker, card.id) == (CARD_TIMES - 2, 2), "并发重试不应重复扣卡"
+            print(f"并发重试: {RETRIES} 个请求，200 × {codes.count(200)}，409 × {codes.count(409)}，只扣一次")
+
+            # 同一个键用于不同请求
+            mismatch = await deduct(key, times=2)
+            assert mismatch.status_code == 422, mismatch.text
+            print("同键不同请求: 422")
+
+            # 失败的请求不保存
+            key = str(uuid.uuid4())
+            assert (await deduct(key, times=100)).status_code == 400
+            retry = await deduct(key, times=100)
+            assert retry.status_code == 400 and "Idempotent-Replayed" not in retry.headers
+            assert idempotency_index.stats()["pending"] == 0, "失败后应释放占用"
+            print("失败请求: 不保存，重试重新执行")
+
+            # 其他进程的重试：进程内索引没有，从数据库读取
+            key = str(uuid.uuid4())
+            first = await deduct(key)
+            idempotency_index.clear()
+            retry = await deduct(key)
+            assert retry.json() == first.json() and retry.headers.get("Idempotent-Replayed") == "true"
+            assert await card_state(session_maker, card.id) == (CARD_TIMES - 3, 3)
+            print("索引未命中: 从数据库返回保存的响应")
+
+            # 过期后重新执行
+            async with session_maker() as db:
+                await db.execute(
+                    update(IdempotencyRecord).where(IdempotencyRecord.key == key)
+                    .values(expires_at=datetime.utcnow() - timedelta(seconds=1))
+                )
+                await db.commit()
+            idempotency_index.clear()
+            again = await deduct(key)
+            assert again.status_code == 200 and "Idempotent-Replayed" not in again.headers
+            assert await card_state(session_maker, card.id) == (CARD_TIMES - 4, 4)
+            print("记录过期: 同一个键重新执行")
+
+            # 不带幂等键的请求行为不变
+            assert (await deduct(None)).status_code == 200
+            assert (await deduct(None)).status_code == 200
+            assert await card_state(session_maker, card.id) == (CARD_TIMES - 6, 6)
+
+        app.dependency_overrides.clear()
+        print("✅ 重试不会重复扣卡")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
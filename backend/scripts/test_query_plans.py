@@ -0,0 +1,200 @@
+"""
+查询计划检查
+
+在SQLite上执行热点查询，抓取实际发出的SQL并用 EXPLAIN QUERY PLAN
+确认走了对应的组合索引。新建的库和从第一版表结构（baseline_schema.sql）
+迁移上来的库各检查一遍，并确认两者的表结构一致
+
+运行方式：
+cd backend
+python -m scripts.test_query_plans
+"""
+import asyncio
+import os
+import re
+from datetime import date, timedelta
+
+from scripts.common import temp_database
+
+from sqlalchemy import event, inspect
+
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.schedule import Schedule
+from app.models.store import Store
+from app.models.transaction import Transaction, TransactionType
+from app.models.user import User, UserRole
+from app.services.availability import availability_cache
+from app.services.appointment import AppointmentService
+from app.services.ledger import LedgerService
+from app.services.card import CardService
+from app.services.card_expiry import CardExpirySweeper
+from app.services.customer_search import customer_name_index
+from app.services.ledger_reconciler import LedgerReconciler
+from app.services.schedule import ScheduleService
+from app.services.user import UserService
+
+
+WORK_DATE = date(2026, 1, 10)
+# 第一版的建表SQL
+BASELINE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_schema.sql")
+
+# (说明, 查询的表, 期望使用的索引)
+EXPECTED_PLANS = [
+    ("门店当天排班", "schedules", "ix_schedules_store_date_active"),
+    ("门店有效排班模板", "schedule_templates", "ix_schedule_templates_store_active"),
+    ("员工当天有效预约", "appointments", "ix_appointments_staff_date_status"),
+    ("客户预约列表翻页", "appointments", "ix_appointments_customer_date_start"),
+    ("卡流水翻页", "transactions", "ix_transactions_card_created"),
+    ("客户流水按月汇总", "transactions", "ix_transactions_customer_created"),
+    ("客户有效卡", "user_cards", "ix_user_cards_user_status"),
+    ("卡过期扫描", "user_cards", "ix_user_cards_expiring"),
+    ("卡流水对账（快照之后的流水）", "card_balance_snapshots", "ix_transactions_card_id"),
+    ("客户按手机尾号搜索", "users", "ix_users_phone_reversed"),
+    ("客户按手机号开头搜索", "users", "ix_users_phone"),
+    ("客户姓名索引增量同步", "users", "ix_users_updated_at"),
+]
+
+
+async def seed(session_maker):
+    async with session_maker() as db:
+        stores = [Store(name=f"门店{i}", address="测试地址") for i in range(3)]
+        customer = User(openid="customer")
+        staff = [User(openid=f"staff_{i}", role=UserRole.STAFF) for i in range(10)]
+        db.add_all([*stores, customer, *staff])
+        await db.flush()
+        for day in range(30):
+            work_date = WORK_DATE + timedelta(days=day)
+            for i, s in enumerate(staff):
+                store = stores[i % len(stores)]
+                db.add(Schedule(staff_id=s.id, store_id=store.id, work_date=work_date,
+                                start_time="09:00", end_time="21:00"))
+                db.add(Appointment(customer_id=customer.id, staff_id=s.id, store_id=store.id,
+                                   service_type=ServiceType.WASH, appointment_date=work_date,
+                                   start_time="10:00", end_time="10:30",
+                                   status=AppointmentStatus.CONFIRMED))
+        card_type = CardType(name="洗头10次卡", service_type=ServiceType.WASH, total_times=10)
+        db.add(card_type)
+        await db.flush()
+        cards = [UserCard(user_id=customer.id, card_type_id=card_type.id, remaining_times=70)
+                 for _ in range(3)]
+        db.add_all(cards)
+        await db.flush()
+        for i in range(90):
+            db.add(Transaction(customer_id=customer.id, user_card_id=cards[i % 3].id,
+                               transaction_type=TransactionType.CONSUME, service_type=ServiceType.WASH,
+                               times_changed=-1, times_before=100 - i // 3, times_after=99 - i // 3,
+                               operator_id=staff[0].id))
+        await db.commit()
+        return stores[0].id, customer.id, cards[0].id
+
+
+async def capture_selects(engine, func):
+    """执行 func，返回期间发出的 SELECT 语句（含 UPDATE ... WHERE 子查询）及参数"""
+    captured = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE")):
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        await func()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+    return captured
+
+
+async def describe_schema(engine) -> dict:
+    """表 -> (列及是否可为空, 索引及其列)，用于比较新建的库和迁移上来的库"""
+    def describe(conn):
+        inspector = inspect(conn)
+        return {
+            table: (
+                sorted((column["name"], column["nullable"]) for column in inspector.get_columns(table)),
+                sorted((index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                       for index in inspector.get_indexes(table)),
+            )
+            for table in inspector.get_table_names()
+        }
+
+    async with engine.connect() as conn:
+        return await conn.run_sync(describe)
+
+
+async def check_plans(schema=None) -> dict:
+    """在新建的库（或按 schema 建表后迁移的库）上检查查询计划，返回表结构"""
+    async with temp_database(schema) as (engine, session_maker):
+        store_id, customer_id, user_card_id = await seed(session_maker)
+        availability_cache.clear()
+
+        async with session_maker() as db:
+            statements = await capture_selects(
+                engine, lambda: ScheduleService(db).get_available_staff(store_id, WORK_DATE, 50)
+            )
+            first_page = await AppointmentService(db).list_customer_appointments(customer_id, limit=20)
+            statements += await capture_selects(
+                engine, lambda: AppointmentService(db).list_customer_appointments(
+                    customer_id, cursor=first_page.next_cursor, limit=20
+                )
+            )
+            ledger_page = await LedgerService(db).list_ledger(user_card_id=user_card_id, limit=10)
+            statements += await capture_selects(
+                engine, lambda: LedgerService(db).list_ledger(
+                    user_card_id=user_card_id, cursor=ledger_page.next_cursor, limit=10
+                )
+            )
+            statements += await capture_selects(
+                engine, lambda: LedgerService(db).monthly_consumption(customer_id=customer_id)
+            )
+            statements += await capture_selects(
+                engine, lambda: CardService(db).get_user_cards(customer_id, live_only=True)
+            )
+            # 第一次搜索姓名时全量建索引，之后按修改时间增量同步
+            await customer_name_index.refresh(db)
+            statements += await capture_selects(
+                engine, lambda: UserService(db).search_users(phone="0001", nickname="张")
+            )
+
+        sweeper = CardExpirySweeper(interval=60, chunk_size=100, session_maker=session_maker)
+        statements += await capture_selects(engine, sweeper.sweep)
+        
+        # 第一轮对账给老卡补写快照，第二轮只读快照之后的流水
+        reconciler = LedgerReconciler(interval=60, chunk_size=100, snapshot_every=20,
+                                      session_maker=session_maker)
+        await reconciler.reconcile()
+        statements += await capture_selects(engine, reconciler.reconcile)
+
+        async with engine.connect() as conn:
+            plans = []
+            for statement, parameters in statements:
+                rows = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                plans.append((statement, " | ".join(row[-1] for row in rows)))
+
+        failed = False
+        for description, table, index_name in EXPECTED_PLANS:
+            matched = [plan for statement, plan in plans if f"FROM {table}" in statement]
+            used = [plan for plan in matched if re.search(rf"\b{index_name}\b", plan)]
+            ok = bool(used)
+            failed |= not ok
+            shown = (used or matched or ["未执行"])[0]
+            print(f"{'✅' if ok else '❌'} {description}: {shown}")
+
+        assert not failed, "查询计划未使用预期索引"
+        return await describe_schema(engine)
+
+
+async def main():
+    print("新建的库：")
+    fresh = await check_plans()
+    print("\n从第一版表结构迁移上来的库：")
+    migrated = await check_plans(BASELINE_SCHEMA)
+    for table in sorted(fresh.keys() | migrated.keys()):
+        assert fresh.get(table) == migrated.get(table), (
+            f"{table} 迁移后的表结构与新建的不一致：\n新建 {fresh.get(table)}\n迁移 {migrated.get(table)}"
+        )
+    print("\n✅ 迁移上来的库与新建的库表结构（列、是否可空、索引）一致")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,269 @@
+"""
+每周排班模板测试
+
+通过接口创建、删除模板和排除日期，确认：
+- 模板只在选中的星期几、有效期内展开
+- 某天在其他门店单独排班时，当天不再按模板在本门店上班
+- 排除的日期不展开，重复排除同一天不报错
+- 与已有模板的星期几和有效期都重叠时拒绝，只重叠其一时允许
+- /my-schedules 按日期、开始时间排序，展开的日期 id 为空、template_id 为模板ID
+- 模板创建、排除日期、删除后，可预约缓存立即失效，并推送给订阅了该门店的客户端；
+  事务回滚时不推送
+
+运行方式：
+cd backend
+python -m scripts.test_schedule_templates
+"""
+import asyncio
+from datetime import date, timedelta
+
+from scripts.common import temp_database
+
+import httpx
+
+from app.database import get_db
+from app.main import app
+from app.models.store import Store
+from app.models.user import User, UserRole
+from app.schemas.schedule import ScheduleTemplateCreate
+from app.services.auth import AuthService
+from app.services.availability import availability_cache
+from app.services.live import availability_broker
+from app.services.schedule import ScheduleService
+
+
+MONDAY = date(2027, 1, 4)
+VALID_FROM = MONDAY + timedelta(days=2)  # 周三开始
+VALID_UNTIL = MONDAY + timedelta(days=20)  # 第三周的周五结束
+WEEKDAYS = [0, 2, 4]  # 周一、三、五
+
+
+def days(start: date, end: date):
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+async def working_dates(session_maker, store_id, staff_id, start, end):
+    """某员工在某门店可预约的日期"""
+    async with session_maker() as db:
+        result = await ScheduleService(db).get_available_staff_range(store_id, start, end)
+    return [
+        day.work_date for day in result
+        if any(item.staff.id == staff_id for item in day.available_staff)
+    ]
+
+
+def drain(subscription):
+    messages = []
+    while not subscription.queue.empty():
+        messages.append(subscription.queue.get_nowait())
+    return messages
+
+
+async def warm(session_maker, store_id, work_date):
+    """计算并缓存某门店某天的可预约员工"""
+    async with session_maker() as db:
+        await ScheduleService(db).get_available_staff(store_id, work_date)
+    assert availability_cache.get(store_id, work_date, 30) is not None
+
+
+async def main():
+    async with temp_database() as (engine, session_maker):
+        availability_cache.clear()
+        async with session_maker() as db:
+            store = Store(name="本店", address="测试地址")
+            other_store = Store(name="分店", address="测试地址")
+            staff = User(openid="staff", nickname="托尼", role=UserRole.STAFF)
+            db.add_all([store, other_store, staff])
+            await db.commit()
+            token = AuthService(db)._create_access_token(staff.id, staff.openid, staff.role, staff.token_version)
+
+        async def override_get_db():
+            async with session_maker() as session:
+                try:
+                    yield session
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+
+        app.dependency_overrides[get_db] = override_get_db
+        transport = httpx.ASGITransport(app=app)
+        headers = {"Authorization": f"Bearer {token}"}
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+                with availability_broker.subscription() as subscription:
+                    # 创建模板：失效整个门店的缓存并推送
+                    subscription.switch(store.id, VALID_FROM)
+                    await warm(session_maker, store.id, VALID_FROM)
+                    response = await client.post("/api/schedules/templates", json={
+                        "store_id": store.id,
+                        "weekdays": WEEKDAYS,
+                        "start_time": "09:00",
+                        "end_time": "18:00",
+                        "valid_from": VALID_FROM.isoformat(),
+                        "valid_until": VALID_UNTIL.isoformat(),
+                    })
+                    assert response.status_code == 200, response.text
+                    template = response.json()
+                    assert availability_cache.get(store.id, VALID_FROM, 30) is None
+                    assert [m["type"] for m in drain(subscription)] == ["schedule"]
+                print("创建模板后缓存失效并推送")
+
+                # 只在选中的星期几、有效期内展开
+                expected = [d for d in days(VALID_FROM, VALID_UNTIL) if d.weekday() in WEEKDAYS]
+                start, end = MONDAY - timedelta(days=7), VALID_UNTIL + timedelta(days=14)
+                assert await working_dates(session_maker, store.id, staff.id, start, end) == expected
+                assert await working_dates(session_maker, other_store.id, staff.id, start, end) == []
+                async with session_maker() as db:
+                    service = ScheduleService(db)
+                    staff_ids = [item.staff.id for item in await service.get_available_staff(store.id, VALID_FROM)]
+                    assert staff_ids == [staff.id]
+                    times = (await service.get_available_staff(store.id, VALID_FROM))[0].available_times
+                    assert (times[0], times[-1]) == ("09:00", "17:30")
+                print(f"模板展开 {len(expected)} 天：{[d.isoformat() for d in expected]}")
+
+                # 重叠检查：星期几和有效期都重叠才拒绝
+                async def create(weekdays, valid_from, valid_until=None):
+                    return await client.post("/api/schedules/templates", json={
+                        "store_id": other_store.id,
+                        "weekdays": weekdays,
+                        "start_time": "10:00",
+                        "end_time": "16:00",
+                        "valid_from": valid_from.isoformat(),
+                        "valid_until": valid_until.isoformat() if valid_until else None,
+                    })
+
+                assert (await create([2], MONDAY)).status_code == 400  # 不限结束日期，覆盖周三
+                assert (await create([4, 5], VALID_UNTIL, VALID_UNTIL + timedelta(days=7))).status_code == 400
+                assert (await create([2], VALID_FROM, VALID_FROM - timedelta(days=1))).status_code == 400
+                saturday = await create([5], MONDAY, VALID_UNTIL)  # 星期几不重叠
+                assert saturday.status_code == 200, saturday.text
+                later = await create([0], VALID_UNTIL + timedelta(days=1))  # 有效期不重叠
+                assert later.status_code == 200, later.text
+                response = await client.get("/api/schedules/templates")
+                assert {t["id"] for t in response.json()} == {
+                    template["id"], saturday.json()["id"], later.json()["id"]
+                }
+                print("重叠的模板被拒绝，只重叠星期几或有效期的允许")
+
+                # 在其他门店单独排班的那天不按模板在本门店上班
+                override_date = VALID_FROM + timedelta(days=2)  # 第一个周五
+                with availability_broker.subscription() as subscription:
+                    subscription.switch(store.id, override_date)
+                    await warm(session_maker, store.id, override_date)
+                    response = await client.post("/api/schedules", json={
+                        "staff_id": staff.id,
+                        "store_id": other_store.id,
+                        "work_date": override_date.isoformat(),
+                        "start_time": "12:00",
+                        "end_time": "15:00",
+                    })
+                    assert response.status_code == 200, response.text
+                    schedule = response.json()
+                    assert availability_cache.get(store.id, override_date, 30) is None
+                    assert [m["type"] for m in drain(subscription)] == ["schedule"]
+                expected.remove(override_date)
+                assert await working_dates(session_maker, store.id, staff.id, start, end) == expected
+                assert override_date in await working_dates(
+                    session_maker, other_store.id, staff.id, override_date, override_date
+                )
+                print(f"{override_date} 在分店单独排班，本店当天不再按模板展开")
+
+                # 排除日期：当天不展开，失效并推送当天；重复排除不报错
+                exception_date = VALID_FROM + timedelta(days=7)  # 第二个周三
+                url = f"/api/schedules/templates/{template['id']}/exceptions"
+                with availability_broker.subscription() as subscription:
+                    subscription.switch(store.id, exception_date)
+                    await warm(session_maker, store.id, exception_date)
+                    response = await client.post(url, json={"exception_date": exception_date.isoformat()})
+                    assert response.status_code == 200, response.text
+                    assert availability_cache.get(store.id, exception_date, 30) is None
+                    assert [m["type"] for m in drain(subscription)] == ["schedule"]
+                    response = await client.post(url, json={"exception_date": exception_date.isoformat()})
+                    assert response.status_code == 200, response.text
+                expected.remove(exception_date)
+                assert await working_dates(session_maker, store.id, staff.id, start, end) == expected
+                response = await client.post(
+                    f"/api/schedules/templates/{template['id'] + 100}/exceptions",
+                    json={"exception_date": exception_date.isoformat()},
+                )
+                assert response.status_code == 404
+                print(f"排除 {exception_date} 后当天不展开，重复排除不报错")
+
+                # 我的排班：按日期、开始时间排序，展开的日期 id 为空、带模板ID
+                response = await client.get("/api/schedules/my-schedules", params={
+                    "start_date": MONDAY.isoformat(),
+                    "end_date": VALID_UNTIL.isoformat(),
+                })
+                assert response.status_code == 200, response.text
+                schedules = response.json()
+                keys = [(s["work_date"], s["start_time"]) for s in schedules]
+                assert keys == sorted(keys)
+                saturdays = [d for d in days(MONDAY, VALID_UNTIL) if d.weekday() == 5]
+                assert [(date.fromisoformat(s["work_date"]), s["template_id"]) for s in schedules] == sorted(
+                    [(d, template["id"]) for d in expected]
+                    + [(d, saturday.json()["id"]) for d in saturdays]
+                    + [(override_date, None)]
+                )
+                for item in schedules:
+                    if item["template_id"] is None:
+                        assert item["id"] == schedule["id"]
+                        assert item["store"]["id"] == other_store.id
+                    else:
+                        assert item["id"] is None
+                        assert item["staff_id"] == staff.id and item["staff"]["id"] == staff.id
+                        assert item["store"]["id"] in (store.id, other_store.id)
+                print(f"我的排班 {len(schedules)} 条，顺序和 template_id 正确")
+
+                # 回滚：不推送，排除的日期仍按模板展开
+                rollback_date = expected[-1]
+                with availability_broker.subscription() as subscription:
+                    subscription.switch(store.id, rollback_date)
+                    await warm(session_maker, store.id, rollback_date)
+                    async with session_maker() as db:
+                        await ScheduleService(db).add_template_exception(template["id"], staff.id, rollback_date)
+                        await db.rollback()
+                    assert drain(subscription) == []
+                assert rollback_date in await working_dates(session_maker, store.id, staff.id, start, end)
+
+                # 删除模板：失效整个门店的缓存并推送给所有订阅的日期
+                first = expected[0]
+                with availability_broker.subscription() as first_day, availability_broker.subscription() as last_day:
+                    first_day.switch(store.id, first)
+                    last_day.switch(store.id, expected[-1])
+                    await warm(session_maker, store.id, first)
+                    await warm(session_maker, store.id, expected[-1])
+                    response = await client.delete(f"/api/schedules/templates/{template['id']}")
+                    assert response.status_code == 200, response.text
+                    assert availability_cache.get(store.id, first, 30) is None
+                    assert availability_cache.get(store.id, expected[-1], 30) is None
+                    assert [m["work_date"] for m in drain(first_day)] == [first.isoformat()]
+                    assert [m["work_date"] for m in drain(last_day)] == [expected[-1].isoformat()]
+                assert await working_dates(session_maker, store.id, staff.id, start, end) == []
+                response = await client.delete(f"/api/schedules/templates/{template['id']}")
+                assert response.status_code == 404
+                print("删除模板后整个门店缓存失效并推送，不再展开")
+
+            # 删除后可以重新创建相同的模板
+            async with session_maker() as db:
+                service = ScheduleService(db)
+                again = await service.create_template(staff.id, ScheduleTemplateCreate(
+                    store_id=store.id,
+                    weekdays=WEEKDAYS,
+                    start_time="09:00",
+                    end_time="18:00",
+                    valid_from=VALID_FROM,
+                    valid_until=VALID_UNTIL,
+                ))
+                assert again is not None
+                await db.rollback()
+        finally:
+            app.dependency_overrides.clear()
+
+        print("统计:", availability_cache.stats(), availability_broker.stats())
+
+    print("✅ 排班模板按星期几和有效期展开，单独排班和排除日期覆盖模板，修改后缓存失效并推送")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
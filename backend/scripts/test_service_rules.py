@@ -0,0 +1,151 @@
+"""
+服务规则表测试
+
+- 服务时长、扣减次数由卡类型计算，与原先写死的时长一致（初始卡类型数据）
+- 新建卡类型提交后规则表随卡类型目录一起重建
+- 预约、核销、批量核销不查询 card_types，也不为查规则额外查询卡；
+  逐个核销与批量核销按卡类型扣减的结果一致
+
+运行方式：
+cd backend
+python -m scripts.test_service_rules
+"""
+import asyncio
+from datetime import date
+
+from scripts.common import temp_database, QueryCounter
+from scripts.init_data import CARD_TYPES
+
+from sqlalchemy import insert, select
+
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.card import CardType, ServiceType, UserCard
+from app.models.store import Store
+from app.models.user import User, UserRole
+from app.schemas.appointment import AppointmentCreate, BatchCompleteItem
+from app.schemas.card import CardTypeCreate
+from app.services.appointment import AppointmentService
+from app.services.card import CardService
+from app.services.card_catalog import card_catalog
+
+
+WORK_DATE = date(2026, 1, 10)
+# 原先写死的服务时长
+LEGACY_DURATIONS = {
+    ServiceType.WASH: 30,
+    ServiceType.SOAK: 50,
+    ServiceType.CARE: 50,
+    ServiceType.COMBO: 50,
+}
+
+
+async def seed(session_maker):
+    async with session_maker() as db:
+        store = Store(name="测试门店", address="测试地址")
+        staff = User(openid="staff", role=UserRole.STAFF)
+        customer = User(openid="customer")
+        card_types = [CardType(**data) for data in CARD_TYPES]
+        db.add_all([store, staff, customer, *card_types])
+        await db.commit()
+        return store.id, staff.id, customer.id
+
+
+async def book(session_maker, store_id, staff_id, customer_id, service_type, start_time, service_count=1):
+    async with session_maker() as db:
+        appointment = await AppointmentService(db).create_appointment(customer_id, AppointmentCreate(
+            store_id=store_id, staff_id=staff_id, service_type=service_type,
+            appointment_date=WORK_DATE, start_time=start_time, service_count=service_count,
+        ))
+        await db.commit()
+        return appointment
+
+
+async def main():
+    async with temp_database() as (engine, session_maker):
+        store_id, staff_id, customer_id = await seed(session_maker)
+
+        async with session_maker() as db:
+            rules = await card_catalog.rules(db)
+        assert {s: rules.duration(s) for s in ServiceType} == LEGACY_DURATIONS, "时长应与原先一致"
+        print("服务时长:", {s.value: rules.duration(s) for s in ServiceType})
+
+        # 预约不查询 card_types，时长取规则表
+        with QueryCounter(engine) as counter:
+            wash = await book(session_maker, store_id, staff_id, customer_id, ServiceType.WASH, "09:00")
+            soak = await book(session_maker, store_id, staff_id, customer_id, ServiceType.SOAK, "10:00")
+        assert not counter.touched("card_types"), "预约不应查询 card_types"
+        assert (wash.end_time, soak.end_time) == ("09:30", "10:50")
+        print(f"预约: 洗头 {wash.start_time}-{wash.end_time}，泡头 {soak.start_time}-{soak.end_time}，"
+              f"{counter.count} 条SQL")
+
+        # 新建卡类型：每次扣2次、泡头时长80分钟，提交后规则表重建
+        async with session_maker() as db:
+            double = await CardService(db).create_card_type(CardTypeCreate(
+                name="加长泡头卡", service_type=ServiceType.SOAK, total_times=20,
+                deduct_times=2, duration_minutes=80))
+            await db.commit()
+        async with session_maker() as db:
+            rules = await card_catalog.rules(db)
+        assert rules.duration(ServiceType.SOAK) == 80
+        assert rules.duration(ServiceType.WASH, double.id) == LEGACY_DURATIONS[ServiceType.WASH]
+        assert rules.deduct_times(ServiceType.SOAK, double.id, service_count=2) == 4
+        assert rules.deduct_times(ServiceType.SOAK, None) == 1
+        longer = await book(session_maker, store_id, staff_id, customer_id, ServiceType.SOAK, "13:00")
+        assert longer.end_time == "14:20"
+        print(f"新建卡类型后: 泡头时长 {rules.duration(ServiceType.SOAK)} 分钟，"
+              f"加长泡头卡每次扣 {rules.deduct_times(ServiceType.SOAK, double.id)} 次")
+
+        # 两张普通卡、两张扣2次的卡；每组一张逐个核销、一张批量核销
+        async with session_maker() as db:
+            wash_type = (await db.scalars(select(CardType.id).where(CardType.name == "洗头卡"))).one()
+            cards = []
+            for card_type_id in (wash_type, wash_type, double.id, double.id):
+                card = UserCard(user_id=customer_id, card_type_id=card_type_id, remaining_times=20)
+                db.add(card)
+                cards.append(card)
+            await db.flush()
+            appointment_ids = (await db.scalars(insert(Appointment).returning(Appointment.id), [
+                {
+                    "customer_id": customer_id, "staff_id": staff_id, "store_id": store_id,
+                    "service_type": ServiceType.SOAK, "service_count": 1 + i % 2,
+                    "appointment_date": WORK_DATE, "start_minute": 900 + i * 60,
+                    "end_minute": 950 + i * 60, "status": AppointmentStatus.CONFIRMED,
+                }
+                for i in range(8)
+            ])).all()
+            await db.commit()
+
+        single = [(appointment_ids[i], cards[0 if i < 2 else 2].id) for i in range(4)]
+        batch = [BatchCompleteItem(appointment_id=appointment_ids[i], user_card_id=cards[1 if i < 6 else 3].id)
+                 for i in range(4, 8)]
+
+        with QueryCounter(engine) as counter:
+            for appointment_id, card_id in single:
+                async with session_maker() as db:
+                    assert await AppointmentService(db).complete_appointment(appointment_id, card_id, staff_id)
+                    await db.commit()
+        assert not counter.touched("card_types"), "核销不应查询 card_types"
+        single_count = counter.count
+
+        with QueryCounter(engine) as counter:
+            async with session_maker() as db:
+                results = await AppointmentService(db).complete_appointments_batch(batch, staff_id)
+                await db.commit()
+        assert all(result.success for result in results)
+        assert not counter.touched("card_types"), "批量核销不应查询 card_types"
+
+        async with session_maker() as db:
+            remaining = (await db.scalars(
+                select(UserCard.remaining_times).where(UserCard.id.in_([c.id for c in cards]))
+                .order_by(UserCard.id)
+            )).all()
+        # 普通卡：扣 1 + 2 次；扣2次的卡：扣 2 + 4 次
+        assert remaining == [17, 17, 14, 14], remaining
+        print(f"核销: 逐个 4 次 {single_count} 条SQL，批量 {counter.count} 条SQL，"
+              f"剩余次数 {remaining}，均未查询 card_types")
+
+        print("✅ 服务规则表正常")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+微信客户端熔断测试
+
+熔断冷却结束后放行的试探请求，无论以什么方式结束都要释放试探名额，否则半开状态下
+所有登录都被拒绝直到进程重启。用 httpx.MockTransport 模拟微信的各种异常响应，确认：
+- 返回的不是 JSON 对象（如 []）、响应体解压失败：按微信故障重试，失败后重新冷却，冷却后可再次试探
+- 试探请求中出现意外的异常、被取消：释放试探名额，下一个请求可以试探
+- 试探进行中其他请求直接拒绝
+- 微信恢复后试探成功，熔断关闭
+
+运行方式：
+cd backend
+python -m scripts.test_wechat_client
+"""
+import asyncio
+import json
+
+import httpx
+
+from app.services.wechat import WechatClient, WechatUnavailableError
+
+
+BREAKER_THRESHOLD = 2
+BREAKER_COOLDOWN = 0.05
+
+
+class Wechat:
+    """按 mode 返回 code2session 响应"""
+
+    def __init__(self):
+        self.mode = "ok"
+        self.requests = 0
+        self.release = asyncio.Event()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.mode == "list":
+            return httpx.Response(200, text="[]")
+        if self.mode == "bad_gzip":
+            return httpx.Response(200, headers={"Content-Encoding": "gzip"}, content=b"not gzip")
+        if self.mode == "crash":
+            raise RuntimeError("unexpected")
+        if self.mode == "hang":
+            await self.release.wait()
+        if self.mode == "down":
+            return httpx.Response(500)
+        code = request.url.params["js_code"]
+        return httpx.Response(200, text=json.dumps({"openid": f"stub_{code}", "session_key": "key"}))
+
+
+async def open_breaker(client: WechatClient, wechat: Wechat):
+    """连续失败到阈值打开熔断，再等冷却结束进入半开"""
+    wechat.mode = "down"
+    for _ in range(BREAKER_THRESHOLD):
+        try:
+            await client.code2session("stub", "stub", "down")
+        except WechatUnavailableError:
+            pass
+    assert client.breaker.state == "open"
+    await asyncio.sleep(BREAKER_COOLDOWN)
+    assert client.breaker.state == "half_open"
+
+
+async def main():
+    wechat = Wechat()
+    client = WechatClient(
+        base_url="https://api.weixin.qq.com", timeout=1.0, deadline=1.0, retries=1,
+        max_connections=4, max_concurrency=4,
+        breaker_threshold=BREAKER_THRESHOLD, breaker_cooldown=BREAKER_COOLDOWN,
+        transport=httpx.MockTransport(wechat.handle),
+    )
+    assert (await client.code2session("stub", "stub", "first"))["openid"] == "stub_first"
+
+    # 微信返回的不是 JSON 对象、响应体解压失败：试探失败，重新冷却后可以再次试探
+    for mode in ("list", "bad_gzip"):
+        await open_breaker(client, wechat)
+        wechat.mode = mode
+        requests = wechat.requests
+        try:
+            await client.code2session("stub", "stub", mode)
+        except WechatUnavailableError:
+            pass
+        else:
+            raise AssertionError(f"{mode}: 不应登录成功")
+        assert wechat.requests - requests == 2, "按微信故障重试"
+        assert client.breaker.state == "open", f"{mode}: 试探失败应重新冷却"
+        await asyncio.sleep(BREAKER_COOLDOWN)
+        wechat.mode = "ok"
+        assert (await client.code2session("stub", "stub", mode))["openid"] == f"stub_{mode}"
+        assert client.breaker.state == "closed"
+        print(f"{mode}: 试探失败后重新冷却，冷却后试探成功恢复")
+
+    # 试探请求中出现意外的异常：异常照常抛出，释放试探名额
+    await open_breaker(client, wechat)
+    wechat.mode = "crash"
+    try:
+        await client.code2session("stub", "stub", "crash")
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("意外的异常应抛出")
+    assert client.breaker.state == "half_open"
+    wechat.mode = "ok"
+    assert (await client.code2session("stub", "stub", "after_crash"))["openid"] == "stub_after_crash"
+    assert client.breaker.state == "closed"
+    print("意外的异常：释放试探名额，下一个请求试探成功")
+
+    # 试探进行中其他请求直接拒绝；试探请求被取消时释放试探名额
+    await open_breaker(client, wechat)
+    wechat.mode = "hang"
+    wechat.release.clear()
+    probe = asyncio.create_task(client.code2session("stub", "stub", "hang"))
+    await asyncio.sleep(0.01)
+    rejected = client.rejected
+    for _ in range(3):
+        try:
+            await client.code2session("stub", "stub", "waiting")
+        except WechatUnavailableError:
+            pass
+    assert client.rejected - rejected == 3, "试探进行中其他请求直接拒绝"
+    probe.cancel()
+    try:
+        await probe
+    except asyncio.CancelledError:
+        pass
+    wechat.mode = "ok"
+    assert client.breaker.state == "half_open"
+    assert (await client.code2session("stub", "stub", "after_cancel"))["openid"] == "stub_after_cancel"
+    assert client.breaker.state == "closed"
+    print("试探请求被取消：释放试探名额，下一个请求试探成功")
+
+    print("统计:", client.stats())
+    await client.close()
+
+    print("✅ 试探请求无论成功、失败、异常还是取消都不会让熔断一直停在半开状态")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
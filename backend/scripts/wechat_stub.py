@@ -0,0 +1,135 @@
+"""
+微信 code2session 本地桩服务
+
+只依赖标准库的最小 HTTP/1.1 服务（支持长连接），用于联调和登录压测，
+把 WECHAT_API_URL 指向它即可：
+
+- code 以 invalid 开头：返回 errcode 40029（code 无效）
+- 其他 code：返回 openid = stub_<code>
+- delay：每个请求的处理延迟（秒）；fail_rate：按比例返回 500 或 errcode -1（系统繁忙）
+- 运行中可以改 delay / fail_rate 模拟微信变慢或故障；connections 统计新建的连接数
+
+运行方式：
+cd backend
+python -m scripts.wechat_stub --port 9100 --delay 0.05 --fail-rate 0.1
+WECHAT_API_URL=http://127.0.0.1:9100 WECHAT_APP_ID=stub WECHAT_APP_SECRET=stub uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+
+class WechatStub:
+    """code2session 桩服务"""
+
+    def __init__(self, delay: float = 0.0, fail_rate: float = 0.0, seed: Optional[int] = None):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.connections = 0
+        self.requests = 0
+        self.failures = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "WechatStub":
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # 结束还在处理中的连接（如模拟微信卡住时）
+            for task in self._handlers:
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "WechatStub":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    if name.strip().lower() == "connection" and value.strip().lower() == "close":
+                        keep_alive = False
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                status, body = await self._handle(target)
+                payload = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: text/plain\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _handle(self, target: str):
+        self.requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        url = urlsplit(target)
+        if url.path != "/sns/jscode2session":
+            return 404, {"errcode": 404, "errmsg": "not found"}
+        code = parse_qs(url.query).get("js_code", [""])[0]
+        if self.fail_rate and self.rng.random() < self.fail_rate:
+            self.failures += 1
+            if self.rng.random() < 0.5:
+                return 500, {"errmsg": "internal error"}
+            return 200, {"errcode": -1, "errmsg": "system error"}
+        if not code or code.startswith("invalid"):
+            return 200, {"errcode": 40029, "errmsg": "invalid code"}
+        return 200, {"openid": f"stub_{code}", "session_key": "stub_session_key"}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="微信 code2session 本地桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--delay", type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回失败的比例")
+    args = parser.parse_args()
+
+    stub = await WechatStub(delay=args.delay, fail_rate=args.fail_rate).start(args.host, args.port)
+    print(f"微信桩服务已启动: {stub.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -20,9 +20,50 @@ App({
     }
   },
 
+  // 获取卡类型列表
+  // 本地缓存上次的结果和 ETag，卡类型没有变化时服务端返回304，直接用缓存
+  getCardTypes() {
+    const cached = wx.getStorageSync('cardTypes');
+    
+    return new Promise((resolve, reject) => {
+      wx.request({
+        url: this.globalData.baseUrl + '/cards/types',
+        method: 'GET',
+        header: cached ? { 'If-None-Match': cached.etag } : {},
+        success: (res) => {
+          if (res.statusCode === 304 && cached) {
+            resolve(cached.data);
+          } else if (res.statusCode === 200) {
+            const etag = res.header['ETag'] || res.header['etag'];
+            if (etag) {
+              wx.setStorageSync('cardTypes', { etag, data: res.data });
+            }
+            resolve(res.data);
+          } else {
+            reject(res.data || { detail: '请求失败' });
+          }
+        },
+        fail: (err) => {
+          // 网络失败时有缓存就先用缓存
+          if (cached) {
+            resolve(cached.data);
+            return;
+          }
+          reject({ detail: '网络连接失败，请检查网络', errMsg: err.errMsg });
+        }
+      });
+    });
+  },
+
+  // 生成幂等键（核销、扣卡等写请求重试时带同一个键，服务端只执行一次）
+  newIdempotencyKey() {
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+  },
+
   // 封装请求方法
+  // 传入 idempotencyKey 时，网络失败或服务端仍在处理（409）会用同一个键自动重试
   request(options) {
-    const { url, method = 'GET', data, needAuth = true } = options;
+    const { url, method = 'GET', data, needAuth = true, idempotencyKey, retries = 3 } = options;
     
     return new Promise((resolve, reject) => {
       const header = {
@@ -32,6 +73,16 @@ App({
       if (needAuth && this.globalData.token) {
         header['Authorization'] = `Bearer ${this.globalData.token}`;
       }
+      if (idempotencyKey) {
+        header['Idempotency-Key'] = idempotencyKey;
+      }
+      
+      const retry = () => {
+        setTimeout(() => {
+          this.request({ ...options, retries: retries - 1 }).then(resolve, reject);
+        }, 1000);
+      };
+      const canRetry = idempotencyKey && retries > 0;
       
       wx.request({
         url: this.globalData.baseUrl + url,
@@ -45,11 +96,17 @@ App({
             // token失效，跳转登录
             this.logout();
             reject(res.data || { detail: '登录已过期' });
+          } else if (res.statusCode === 409 && canRetry) {
+            retry();
           } else {
             reject(res.data || { detail: '请求失败' });
           }
         },
         fail: (err) => {
+          if (canRetry) {
+            retry();
+            return;
+          }
           // 网络错误统一格式，确保有detail字段
           reject({ detail: '网络连接失败，请检查网络', errMsg: err.errMsg });
         }
@@ -57,6 +114,25 @@ App({
     });
   },
 
+  // 员工端：分页拉取某天的全部预约，客户信息从对照表中取
+  async loadDayAppointments(date) {
+    const appointments = [];
+    let cursor = null;
+    do {
+      let url = `/appointments/staff-appointments/page?appointment_date=${date}&limit=100`;
+      if (cursor) {
+        url += `&cursor=${cursor}`;
+      }
+      const page = await this.request({ url });
+      page.items.forEach(apt => {
+        apt.customer = page.customers[apt.customer_id] || {};
+        appointments.push(apt);
+      });
+      cursor = page.next_cursor;
+    } while (cursor);
+    return appointments;
+  },
+
   // 登录方法（名字登录，无需微信授权）
   async login(role = 'customer', staffPassword = '', nickname = '') {
     try {
@@ -1,6 +1,12 @@
 // pages/appointment/appointment.js
 const app = getApp();
 
+// "HH:MM" 转为当天分钟数
+function toMinutes(time) {
+  const [hours, minutes] = time.split(':').map(Number);
+  return hours * 60 + minutes;
+}
+
 Page({
   data: {
     stores: [],
@@ -11,6 +17,7 @@ Page({
     selectedServices: [], // 选中的服务（多选）
     selectedDate: '',
     availableStaff: [],
+    availabilityByDate: {},  // 按日期缓存的可预约员工（一次拉取整周）
     selectedStaff: null,
     selectedTime: '',
     dates: [],
@@ -29,6 +36,10 @@ Page({
     this.generateDates();
   },
 
+  onUnload() {
+    this.closeLive();
+  },
+
   onShow() {
     // 检查是否从首页传来了选中的门店
     const selectedStore = app.globalData.selectedStore;
@@ -251,7 +262,9 @@ Page({
       });
       return;
     }
-    this.setData({ step: 4 });
+    this.setData({ step: 4, availabilityByDate: {} });
+    this.loadAvailabilityRange();
+    this.connectLive();
   },
 
   // 选择日期
@@ -264,7 +277,124 @@ Page({
       selectedTime: ''
     });
     
-    this.loadAvailableStaff();
+    // 已经拉取过整周数据时直接使用，否则单独请求这一天
+    const cached = this.data.availabilityByDate[date];
+    if (cached) {
+      this.setData({ availableStaff: cached });
+    } else {
+      this.loadAvailableStaff();
+    }
+    this.subscribeLive();
+  },
+
+  // 连接可预约时段实时推送
+  connectLive() {
+    if (this.liveSocket) return;
+    
+    const socket = wx.connectSocket({
+      url: app.globalData.baseUrl.replace(/^http/, 'ws') + '/schedules/live'
+    });
+    socket.onOpen(() => {
+      this.liveOpen = true;
+      this.subscribeLive();
+    });
+    socket.onMessage((res) => this.onLiveMessage(JSON.parse(res.data)));
+    socket.onClose(() => {
+      this.liveSocket = null;
+      this.liveOpen = false;
+    });
+    this.liveSocket = socket;
+  },
+
+  // 订阅当前选中的门店和日期
+  subscribeLive() {
+    const { selectedStore, selectedDate } = this.data;
+    if (!this.liveOpen || !selectedStore || !selectedDate) return;
+    
+    this.liveSocket.send({
+      data: JSON.stringify({ store_id: selectedStore.id, work_date: selectedDate })
+    });
+  },
+
+  closeLive() {
+    if (this.liveSocket) {
+      this.liveSocket.close();
+      this.liveSocket = null;
+      this.liveOpen = false;
+    }
+  },
+
+  // 收到时段变化：被占用的时间直接去掉，其余情况重新拉取当天
+  onLiveMessage(event) {
+    if (event.work_date !== this.data.selectedDate) return;
+    
+    if (event.type !== 'booked') {
+      this.loadAvailableStaff();
+      return;
+    }
+    
+    const duration = this.getTotalDuration();
+    const start = toMinutes(event.start_time);
+    const end = toMinutes(event.end_time);
+    const availableStaff = this.data.availableStaff.map(item => {
+      if (item.staff.id !== event.staff_id) return item;
+      return {
+        ...item,
+        available_times: item.available_times.filter(time => {
+          const t = toMinutes(time);
+          return t >= end || t + duration <= start;
+        })
+      };
+    });
+    
+    const { selectedStaff, selectedTime } = this.data;
+    const updated = selectedStaff && availableStaff.find(item => item.staff.id === selectedStaff.staff.id);
+    const timeTaken = updated && selectedTime && !updated.available_times.includes(selectedTime);
+    
+    this.setData({
+      availableStaff,
+      availabilityByDate: { ...this.data.availabilityByDate, [event.work_date]: availableStaff },
+      selectedStaff: updated || selectedStaff,
+      selectedTime: timeTaken ? '' : selectedTime
+    });
+    if (timeTaken) {
+      wx.showToast({ title: '该时段刚被预约，请重新选择', icon: 'none' });
+    }
+  },
+
+  // 计算总服务时长
+  getTotalDuration() {
+    return this.data.selectedServices.reduce((sum, s) => sum + s.duration, 0);
+  },
+
+  // 一次加载可选日期范围内每天的可用员工
+  async loadAvailabilityRange() {
+    const { selectedStore, selectedServices, dates } = this.data;
+    
+    if (!selectedStore || selectedServices.length === 0 || dates.length === 0) return;
+    
+    const startDate = dates[0].date;
+    const endDate = dates[dates.length - 1].date;
+    
+    try {
+      const days = await app.request({
+        url: `/schedules/available-range?store_id=${selectedStore.id}&start_date=${startDate}&end_date=${endDate}&service_duration=${this.getTotalDuration()}`
+      });
+      
+      const availabilityByDate = {};
+      days.forEach(day => {
+        availabilityByDate[day.work_date] = day.available_staff;
+      });
+      this.setData({ availabilityByDate });
+      
+      // 如果用户已经选了日期，刷新当天的员工列表
+      const { selectedDate } = this.data;
+      if (selectedDate && availabilityByDate[selectedDate] && this.data.availableStaff.length === 0) {
+        this.setData({ availableStaff: availabilityByDate[selectedDate] });
+      }
+    } catch (err) {
+      console.error('加载可预约时间失败:', err);
+    }
   },
 
   // 加载可用员工
@@ -274,7 +404,7 @@ Page({
     if (!selectedStore || !selectedDate || selectedServices.length === 0) return;
     
     // 计算总服务时长
-    const totalDuration = selectedServices.reduce((sum, s) => sum + s.duration, 0);
+    const totalDuration = this.getTotalDuration();
     
     this.setData({ loading: true });
     
@@ -283,7 +413,11 @@ Page({
         url: `/schedules/available-staff?store_id=${selectedStore.id}&work_date=${selectedDate}&service_duration=${totalDuration}`
       });
       
-      this.setData({ availableStaff: staff, loading: false });
+      this.setData({
+        availableStaff: staff,
+        availabilityByDate: { ...this.data.availabilityByDate, [selectedDate]: staff },
+        loading: false
+      });
     } catch (err) {
       console.error('加载员工失败:', err);
       this.setData({ loading: false, availableStaff: [] });
@@ -351,6 +485,7 @@ Page({
         }
       });
       
+      this.closeLive();
       wx.showToast({
         title: '预约成功',
         icon: 'success'
@@ -378,10 +513,12 @@ Page({
     if (step > 1) {
       if (step === 4) {
         // 从选时间返回选服务
+        this.closeLive();
         this.setData({ 
           step: 3,
           selectedDate: '',
           availableStaff: [],
+          availabilityByDate: {},
           selectedStaff: null,
           selectedTime: ''
         });
@@ -1,11 +1,20 @@
 // pages/my/my.js
 const app = getApp();
 
+const SERVICE_MAP = {
+  'wash': '洗头',
+  'soak': '泡头',
+  'care': '养发',
+  'combo': '综合'
+};
+
 Page({
   data: {
     userInfo: null,
     myCards: [],
     myAppointments: [],
+    recentTransactions: [],
+    appointmentCursor: null,  // 预约列表下一页游标，null 表示没有更多
     activeTab: 'cards',  // cards 或 appointments
     loading: false,
     showPhoneModal: false,
@@ -23,51 +32,78 @@ Page({
       userInfo: app.globalData.userInfo
     });
     
-    this.loadMyCards();
-    this.loadMyAppointments();
+    this.loadSummary();
   },
 
-  // 加载我的卡
-  async loadMyCards() {
+  // 一次请求加载我的卡、预约第一页和最近流水
+  async loadSummary() {
     try {
-      const cards = await app.request({ url: '/cards/my-cards' });
-      this.setData({ myCards: cards });
+      const summary = await app.request({ url: '/users/me/summary' });
+      this.setData({
+        myCards: summary.cards,
+        myAppointments: this.formatAppointments(summary.appointments),
+        appointmentCursor: summary.appointments.next_cursor,
+        recentTransactions: summary.recent_transactions.map(t => ({
+          ...t,
+          timesText: t.times_changed > 0 ? `+${t.times_changed}` : `${t.times_changed}`,
+          serviceText: SERVICE_MAP[t.service_type] || t.service_type,
+          date: t.created_at.slice(0, 10)
+        }))
+      });
     } catch (err) {
-      console.error('加载卡列表失败:', err);
+      console.error('加载我的信息失败:', err);
+    }
+  },
+
+  // 滚动到底部加载更多预约
+  onReachBottom() {
+    if (this.data.activeTab === 'appointments' && this.data.appointmentCursor) {
+      this.loadMyAppointments(true);
     }
   },
 
-  // 加载我的预约
-  async loadMyAppointments() {
+  // 加载我的预约（分页，more 为 true 时追加下一页）
+  async loadMyAppointments(more = false) {
+    if (this.loadingAppointments) return;
+    this.loadingAppointments = true;
+    
     try {
-      const appointments = await app.request({ url: '/appointments/my-appointments' });
-      
-      // 格式化状态显示
-      const statusMap = {
-        'pending': '待确认',
-        'confirmed': '已确认',
-        'completed': '已完成',
-        'cancelled': '已取消'
-      };
-      
-      const serviceMap = {
-        'wash': '洗头',
-        'soak': '泡头',
-        'care': '养发',
-        'combo': '综合'
-      };
+      let url = '/appointments/my-appointments/page?limit=20';
+      if (more) {
+        url += `&cursor=${this.data.appointmentCursor}`;
+      }
+      const page = await app.request({ url });
+      const appointments = this.formatAppointments(page);
       
-      appointments.forEach(apt => {
-        apt.statusText = statusMap[apt.status] || apt.status;
-        apt.serviceText = serviceMap[apt.service_type] || apt.service_type;
+      this.setData({
+        myAppointments: more ? this.data.myAppointments.concat(appointments) : appointments,
+        appointmentCursor: page.next_cursor
       });
-      
-      this.setData({ myAppointments: appointments });
     } catch (err) {
       console.error('加载预约列表失败:', err);
+    } finally {
+      this.loadingAppointments = false;
     }
   },
 
+  // 格式化一页预约的状态、服务名称，并从对照表中带上门店和员工
+  formatAppointments(page) {
+    const statusMap = {
+      'pending': '待确认',
+      'confirmed': '已确认',
+      'completed': '已完成',
+      'cancelled': '已取消'
+    };
+    
+    return page.items.map(apt => ({
+      ...apt,
+      statusText: statusMap[apt.status] || apt.status,
+      serviceText: SERVICE_MAP[apt.service_type] || apt.service_type,
+      store: page.stores[apt.store_id] || {},
+      staff: page.staff[apt.staff_id] || {}
+    }));
+  },
+
   // 切换Tab
   switchTab(e) {
     const tab = e.currentTarget.dataset.tab;
@@ -176,7 +212,7 @@ Page({
       });
       
       // 刷新卡列表
-      this.loadMyCards();
+      this.loadSummary();
     } catch (err) {
       wx.showToast({
         title: err.detail || '绑定失败',
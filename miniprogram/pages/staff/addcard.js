@@ -18,7 +18,7 @@ Page({
   // 加载卡类型
   async loadCardTypes() {
     try {
-      const cardTypes = await app.request({ url: '/cards/types' });
+      const cardTypes = await app.getCardTypes();
       
       const serviceMap = {
         'wash': '洗头',
@@ -49,15 +49,18 @@ Page({
     const { searchName } = this.data;
     
     if (!searchName) {
-      wx.showToast({ title: '请输入姓名', icon: 'none' });
+      wx.showToast({ title: '请输入姓名或手机尾号', icon: 'none' });
       return;
     }
     
     this.setData({ loading: true });
     
     try {
+      // 输入的是数字按手机号（尾号）搜索，否则按姓名搜索
+      const keyword = searchName.trim();
+      const field = /^\d+$/.test(keyword) ? 'phone' : 'nickname';
       const users = await app.request({
-        url: `/users/search?nickname=${encodeURIComponent(searchName)}`
+        url: `/users/search?${field}=${encodeURIComponent(keyword)}`
       });
       
       this.setData({
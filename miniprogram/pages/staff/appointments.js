@@ -52,9 +52,7 @@ Page({
     this.setData({ loading: true });
     
     try {
-      const appointments = await app.request({
-        url: `/appointments/staff-appointments?appointment_date=${selectedDate}`
-      });
+      const appointments = await app.loadDayAppointments(selectedDate);
       
       const serviceMap = {
         'wash': '洗头',
@@ -91,7 +89,7 @@ Page({
     
     try {
       const cards = await app.request({
-        url: `/cards/user/${apt.customer_id}`
+        url: `/cards/user/${apt.customer_id}?live_only=true`
       });
       
       wx.hideLoading();
@@ -136,6 +134,7 @@ Page({
       await app.request({
         url: `/appointments/${apt.id}/complete`,
         method: 'POST',
+        idempotencyKey: app.newIdempotencyKey(),
         data: {
           user_card_id: selectedCard.id
         }
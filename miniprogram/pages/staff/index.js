@@ -75,9 +75,7 @@ Page({
   async loadTodayAppointments() {
     try {
       const today = new Date().toISOString().split('T')[0];
-      const appointments = await app.request({
-        url: `/appointments/staff-appointments?appointment_date=${today}`
-      });
+      const appointments = await app.loadDayAppointments(today);
       
       const serviceMap = {
         'wash': '洗头',
@@ -25,7 +25,7 @@ Page({
   // 加载所有卡类型
   async loadCardTypes() {
     try {
-      const cardTypes = await app.request({ url: '/cards/types' });
+      const cardTypes = await app.getCardTypes();
       this.setData({ allCardTypes: cardTypes });
     } catch (err) {
       console.error('加载卡类型失败:', err);
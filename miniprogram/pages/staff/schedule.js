@@ -168,7 +168,7 @@ Page({
 
   // 删除排班
   async deleteSchedule(e) {
-    const id = e.currentTarget.dataset.id;
+    const { id, templateId, date } = e.currentTarget.dataset;
     
     const res = await wx.showModal({
       title: '确认删除',
@@ -178,10 +178,19 @@ Page({
     if (!res.confirm) return;
     
     try {
-      await app.request({
-        url: `/schedules/${id}`,
-        method: 'DELETE'
-      });
+      if (templateId) {
+        // 每周模板展开的排班：只排除这一天
+        await app.request({
+          url: `/schedules/templates/${templateId}/exceptions`,
+          method: 'POST',
+          data: { exception_date: date }
+        });
+      } else {
+        await app.request({
+          url: `/schedules/${id}`,
+          method: 'DELETE'
+        });
+      }
       
       wx.showToast({ title: '已删除', icon: 'success' });
       this.loadMySchedules();